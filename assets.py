@@ -0,0 +1,216 @@
+"""Fingerprinted, pre-compressed static assets.
+
+At startup every front-end asset is read once, references between them are
+rewritten to content-hashed file names (``static/js/main.js`` becomes
+``static/js/main.3f9a2c1d.js``), and gzip (plus brotli, when the ``brotli``
+package is installed) variants of compressible files are built in memory.
+Fingerprinted URLs never change meaning, so they can be cached forever;
+``index.html`` and the plain URLs are served with an ETag and revalidated.
+
+Sources are re-checked at most once per ``check_interval`` seconds, so edits
+during development are picked up without a restart.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Front-end files under static/ that are fingerprinted; data directories such as elapsed_times are not.
+ASSET_DIRS = ('css', 'js', 'images')
+ASSET_FILES = ('manifest.json', 'keymotelogo.png')
+PAGE = 'index.html'
+
+TEXT_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg')
+# Don't bother compressing tiny files.
+MIN_COMPRESS_SIZE = 512
+
+_REFERENCE_RE = re.compile(r'''(?P<prefix>['"(])(?P<path>[^'"()\s]+?\.(?:png|jpe?g|gif|svg|ico|webp|css|js|json))(?=['")?#])''')
+
+
+class Asset:
+    def __init__(self, path, url, body, mtime_ns):
+        self.path = path
+        self.url = url
+        self.body = body
+        self.mtime_ns = mtime_ns
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        # Paths of the assets this one refers to, and URLs of files on other sites (e.g. a CDN).
+        self.references = ()
+        self.external = ()
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if path.endswith('manifest.json'):
+            self.mimetype = 'application/manifest+json'
+        self.encodings = {}
+        if path.endswith(TEXT_EXTENSIONS) and len(body) >= MIN_COMPRESS_SIZE:
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=11)
+
+    def negotiate(self, accept_encodings):
+        """Pick the smallest variant the client accepts. Returns (encoding or None, body)."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accept_encodings[encoding] > 0:
+                return encoding, self.encodings[encoding]
+        return None, self.body
+
+
+def fingerprinted_name(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest[:8]}{ext}"
+
+
+class AssetManifest:
+    def __init__(self, root='.', check_interval=1.0):
+        self.root = root
+        self.check_interval = check_interval
+        self.builds = 0
+        self._by_path = {}
+        self._by_url = {}
+        self._sources = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    # --- Building ---
+
+    def _source_paths(self):
+        paths = [PAGE]
+        for name in ASSET_FILES:
+            paths.append(f"static/{name}")
+        for directory in ASSET_DIRS:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, 'static', directory)):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for filename in filenames:
+                    if not filename.startswith('.'):
+                        full = os.path.join(dirpath, filename)
+                        paths.append(os.path.relpath(full, self.root).replace(os.path.sep, '/'))
+        sources = {}
+        for path in paths:
+            try:
+                sources[path] = os.stat(os.path.join(self.root, path)).st_mtime_ns
+            except OSError:
+                continue
+        return sources
+
+    def build(self):
+        """Read, rewrite, fingerprint and compress every asset."""
+        sources = self._source_paths()
+        raw = {}
+        for path in sources:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                raw[path] = f.read()
+
+        built = {}
+
+        def resolve(reference, path):
+            # References in the page and in scripts are relative to the page; in CSS and JSON, to the file itself.
+            if reference.startswith(('http:', 'https:', '//', 'data:')):
+                return None
+            if reference.startswith('/'):
+                target = reference.lstrip('/')
+            elif path == PAGE or path.endswith('.js'):
+                target = reference
+            else:
+                target = os.path.join(os.path.dirname(path), reference)
+            target = os.path.normpath(target).replace(os.path.sep, '/')
+            return target if target in raw else None
+
+        def process(path, visiting):
+            if path in built:
+                return built[path]
+            body = raw[path]
+            references, external = [], []
+            if path.endswith(TEXT_EXTENSIONS):
+                visiting = visiting | {path}
+                text = body.decode('utf-8')
+
+                def rewrite(match):
+                    target = resolve(match.group('path'), path)
+                    if match.group('path').startswith(('http:', 'https:')):
+                        external.append(match.group('path'))
+                    if target is None or target in visiting:
+                        return match.group(0)
+                    url = process(target, visiting).url
+                    references.append(target)
+                    reference = match.group('path')
+                    return match.group('prefix') + reference[:len(reference) - len(os.path.basename(reference))] + os.path.basename(url)
+
+                body = _REFERENCE_RE.sub(rewrite, text).encode('utf-8')
+            digest = hashlib.sha256(body).hexdigest()
+            url = path if path == PAGE else fingerprinted_name(path, digest)
+            asset = Asset(path, url, body, sources[path])
+            asset.references = tuple(dict.fromkeys(references))
+            asset.external = tuple(dict.fromkeys(external))
+            built[path] = asset
+            return asset
+
+        for path in raw:
+            process(path, frozenset())
+
+        with self._lock:
+            self._by_path = built
+            self._by_url = {asset.url: asset for asset in built.values()}
+            self._sources = sources
+            self._checked_at = time.monotonic()
+            self.builds += 1
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        if self._checked_at is None or self._source_paths() != self._sources:
+            self.build()
+        else:
+            self._checked_at = now
+
+    # --- Lookup ---
+
+    def lookup(self, path):
+        """Return (asset, immutable) for a plain or fingerprinted path, or (None, False)."""
+        self._ensure_current()
+        with self._lock:
+            asset = self._by_url.get(path)
+            if asset is not None and asset.url != asset.path:
+                return asset, True
+            asset = self._by_path.get(path)
+            return asset, False
+
+    def url_for(self, path):
+        """The fingerprinted URL for a plain asset path, or the path itself if it is not an asset."""
+        asset, _ = self.lookup(path)
+        return asset.url if asset is not None else path
+
+    def precache(self):
+        """What the service worker precaches: (version, URLs of the page and every asset it loads, external URLs)."""
+        self._ensure_current()
+        with self._lock:
+            page = self._by_path.get(PAGE)
+            if page is None:
+                return None, [], []
+            seen, pending = {PAGE: page}, [page]
+            while pending:
+                for path in pending.pop().references:
+                    if path not in seen and path in self._by_path:
+                        seen[path] = self._by_path[path]
+                        pending.append(seen[path])
+        urls = ['/'] + sorted('/' + asset.url for path, asset in seen.items() if path != PAGE)
+        external = sorted({url for asset in seen.values() for url in asset.external})
+        version = hashlib.sha256(' '.join(sorted(asset.etag for asset in seen.values())).encode('utf-8')).hexdigest()[:12]
+        return version, urls, external
+
+    def stats(self):
+        with self._lock:
+            return {
+                "assets": len(self._by_path),
+                "builds": self.builds,
+                "bytes": sum(len(asset.body) for asset in self._by_path.values()),
+                "compressed_bytes": sum(len(asset.encodings.get('gzip', asset.body)) for asset in self._by_path.values()),
+                "brotli": brotli is not None,
+            }
@@ -0,0 +1,361 @@
+"""Latency and throughput benchmarks against a simulated Keynote.
+
+Runs the real Flask app in-process, with its Keynote scripts run by
+``SimulatedKeynote`` and all state in a temporary directory, and measures:
+
+- end-to-end latency of /api/next_slide, /api/goto_slide, /api/open_presentation
+  and /api/save_timings through the Flask test client;
+- the time from a slide change in Keynote to the monitor's ``slide_update``
+  reaching N Socket.IO test clients;
+- save throughput (POST /api/save_timings plus the flush to disk) for decks of
+  10 to 5,000 slides;
+- payload size and encode/decode time of the timings document as indented
+  JSON (the old file format), compact JSON and MessagePack (when installed) for
+  decks of 50 to 5,000 slides, and the size of one Socket.IO packet per format.
+
+Usage, from the repository root::
+
+    python -m benchmarks.run                               # writes benchmarks/results.json
+    python -m benchmarks.run --quick --latency-ms 5
+    python -m benchmarks.run --output new.json --compare benchmarks/results.json
+
+With ``--compare`` the run exits with status 1 if any p50 or p99 is more than
+``--threshold`` slower than the baseline file.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.simulated_keynote import LatencyModel, SimulatedKeynote
+
+DEFAULT_OUTPUT = os.path.join('benchmarks', 'results.json')
+DEFAULT_DECK_SIZES = (10, 100, 1000, 5000)
+DEFAULT_CLIENT_COUNTS = (1, 10, 100)
+DEFAULT_WIRE_SIZES = (50, 500, 5000)
+# Differences smaller than this are noise, whatever the ratio.
+MIN_REGRESSION_MS = 0.5
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples, **extra):
+    """p50/p99/mean in milliseconds for a list of durations in seconds."""
+    mean = sum(samples) / len(samples)
+    summary = {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(mean * 1000, 3),
+        "ops_per_second": round(1 / mean, 1) if mean else None,
+    }
+    summary.update(extra)
+    return summary
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+@contextlib.contextmanager
+def simulated_server(keynote, work_dir):
+    """Point the server module at the simulated Keynote and a scratch home directory, then restore it."""
+    import server
+    from keynote_scripts import ScriptLibrary
+    from recorder import SessionRecorder
+    from timings_store import TimingsStore
+
+    saved = {name: getattr(server, name) for name in ('script_library', 'timings_store', 'THUMBNAIL_PREFETCH',
+                                                      'background_task_started', 'keynote_state', 'session_recorder')}
+    saved_spawn = server.navigation_queue.spawn
+    saved_home = os.environ.get('HOME')
+    store = TimingsStore(os.path.join(work_dir, 'presentations'), legacy_path=None)
+    server.script_library = ScriptLibrary(runner=keynote)
+    server.timings_store = store
+    server.session_recorder = SessionRecorder(os.path.join(work_dir, 'sessions'))
+    server.THUMBNAIL_PREFETCH = 0
+    # The benchmark drives the monitor itself, one poll at a time.
+    server.background_task_started = True
+    server.keynote_state = {"document_open": False, "is_playing": False, "last_slide_number": -1, "document_name": None}
+    server.navigation_queue.spawn = None
+    server.navigation_queue.clear()
+    server.status_cache.invalidate()
+    server.session_clock.reset()
+    os.environ['HOME'] = work_dir
+    try:
+        yield server
+    finally:
+        store.close()
+        server.navigation_queue.clear()
+        server.navigation_queue.spawn = saved_spawn
+        server.status_cache.invalidate()
+        for name, value in saved.items():
+            setattr(server, name, value)
+        if saved_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = saved_home
+
+
+def create_deck(work_dir, slide_count):
+    filename = f"deck-{slide_count}.key"
+    with open(os.path.join(work_dir, filename), 'wb'):
+        pass
+    return filename
+
+
+def deck_document(presentation_id, slide_count):
+    slides = [{"slide": i + 1, "title": f"Slide {i + 1}", "estimated_time_seconds": 60,
+               "cumulative_time_seconds": 60 * (i + 1), "actual_time_seconds": i % 90}
+              for i in range(slide_count)]
+    return {"current_presentation_id": presentation_id, "presentations": {
+        presentation_id: {"name": presentation_id, "slides": slides}}}
+
+
+def open_deck(server, client, keynote, work_dir, slide_count):
+    keynote.slide_count = slide_count
+    filename = create_deck(work_dir, slide_count)
+    response = client.post('/api/open_presentation', json={'filename': filename})
+    if response.status_code != 200:
+        raise RuntimeError(f"Could not open {filename}: {response.get_json()}")
+    server.status_cache.invalidate()
+    return filename
+
+
+def bench_navigation(server, client, keynote, iterations):
+    results = {}
+    next_samples, confirmed_samples, goto_samples = [], [], []
+    for i in range(iterations):
+        if keynote.slide_number >= keynote.document_slides:
+            keynote.set_slide(1)
+            server.status_cache.invalidate()
+        # Acknowledged with a prediction; the queued command confirms it.
+        next_samples.append(timed(lambda: client.post('/api/next_slide')))
+        confirmed_samples.append(next_samples[-1] + timed(server.navigation_queue.drain))
+        target = 1 + (i * 7) % keynote.document_slides
+        goto_samples.append(timed(lambda: client.post(f'/api/goto_slide/{target}')))
+        server.navigation_queue.drain()
+    results["http.next_slide"] = summarize(next_samples)
+    results["http.next_slide.confirmed"] = summarize(confirmed_samples)
+    results["http.goto_slide"] = summarize(goto_samples)
+    return results
+
+
+def bench_open(server, client, keynote, work_dir, iterations, slide_count=50):
+    keynote.slide_count = slide_count
+    filename = create_deck(work_dir, slide_count)
+    samples = [timed(lambda: client.post('/api/open_presentation', json={'filename': filename}))
+               for _ in range(iterations)]
+    return {"http.open_presentation": summarize(samples)}
+
+
+def bench_save(server, client, deck_sizes, iterations):
+    results = {}
+    for slide_count in deck_sizes:
+        document = deck_document(f"save-{slide_count}.key", slide_count)
+        body = json.dumps(document)
+        samples = []
+        for _ in range(iterations):
+            samples.append(timed(lambda: (client.post('/api/save_timings', data=body, content_type='application/json'),
+                                          server.timings_store.flush())))
+        summary = summarize(samples, slides=slide_count, request_bytes=len(body))
+        summary["slides_per_second"] = round(slide_count * summary["ops_per_second"], 1)
+        results[f"http.save_timings[slides={slide_count}]"] = summary
+    return results
+
+
+def bench_fanout(server, app, keynote, client_counts, iterations):
+    results = {}
+    for count in client_counts:
+        clients = [server.socketio.test_client(app) for _ in range(count)]
+        try:
+            status = server.get_keynote_status()
+            server.process_keynote_status(status)
+            for socket_client in clients:
+                socket_client.get_received()
+            samples = []
+            for i in range(iterations):
+                keynote.set_slide(1 + (keynote.slide_number % keynote.document_slides))
+                started = time.perf_counter()
+                # One monitor poll: read Keynote, detect the change, emit.
+                status = server.read_keynote_status()
+                server.status_cache.put('status', status)
+                server.process_keynote_status(status)
+                for socket_client in clients:
+                    if not any(event['name'] == 'slide_update' for event in socket_client.get_received()):
+                        raise RuntimeError("A client missed a slide_update.")
+                samples.append(time.perf_counter() - started)
+            results[f"socketio.slide_update[clients={count}]"] = summarize(samples, clients=count)
+        finally:
+            for socket_client in clients:
+                socket_client.disconnect()
+    return results
+
+
+def wire_formats():
+    """(name, encode, decode) for each format this machine can produce."""
+    import wire
+    formats = [
+        ("json-indent", lambda payload: json.dumps(payload, indent=2).encode('utf-8'), json.loads),
+        ("json", lambda payload: wire.dumps_json(payload).encode('utf-8'), json.loads),
+    ]
+    if wire.available():
+        formats.append(("msgpack", wire.packb, wire.unpackb))
+    return formats
+
+
+def bench_wire(deck_sizes, iterations):
+    results = {}
+    formats = wire_formats()
+    for slide_count in deck_sizes:
+        document = deck_document(f"wire-{slide_count}.key", slide_count)
+        for name, encode, decode in formats:
+            body = encode(document)
+            encode_samples = [timed(lambda: encode(document)) for _ in range(iterations)]
+            decode_samples = [timed(lambda: decode(body)) for _ in range(iterations)]
+            results[f"wire.encode[format={name},slides={slide_count}]"] = summarize(encode_samples, slides=slide_count, bytes=len(body))
+            results[f"wire.decode[format={name},slides={slide_count}]"] = summarize(decode_samples, slides=slide_count, bytes=len(body))
+    # One slide_update as it goes over the socket: a text frame with the JSON parser, one binary frame with msgpack.
+    from socketio import packet
+    event = ['slide_update', {'slide_number': 42, 'seq': 1234}]
+    packets = [("json", packet.Packet)]
+    if any(name == "msgpack" for name, _, _ in formats):
+        from socketio import msgpack_packet
+        packets.append(("msgpack", msgpack_packet.MsgPackPacket))
+    for name, packet_class in packets:
+        samples = [timed(lambda: packet_class(packet.EVENT, data=event).encode()) for _ in range(iterations)]
+        encoded = packet_class(packet.EVENT, data=event).encode()
+        results[f"wire.socketio.slide_update[format={name}]"] = summarize(samples, bytes=len(encoded))
+    return results
+
+
+def run_suite(latency_ms=20.0, sigma=0.35, seed=0, iterations=50, deck_sizes=DEFAULT_DECK_SIZES,
+              client_counts=DEFAULT_CLIENT_COUNTS, wire_sizes=DEFAULT_WIRE_SIZES):
+    """Run every benchmark and return the results document."""
+    keynote = SimulatedKeynote(LatencyModel(latency_ms, sigma, seed))
+    work_dir = tempfile.mkdtemp(prefix='keymote-bench-')
+    results = {}
+    try:
+        with simulated_server(keynote, work_dir) as server:
+            client = server.app.test_client()
+            results.update(bench_open(server, client, keynote, work_dir, max(3, iterations // 5)))
+            open_deck(server, client, keynote, work_dir, 100)
+            client.post('/api/start_presentation')
+            results.update(bench_navigation(server, client, keynote, iterations))
+            results.update(bench_fanout(server, server.app, keynote, client_counts, iterations))
+            results.update(bench_save(server, client, deck_sizes, max(3, iterations // 5)))
+        results.update(bench_wire(wire_sizes, iterations))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_ms": latency_ms,
+            "sigma": sigma,
+            "seed": seed,
+            "iterations": iterations,
+            "scripts_run": keynote.scripts,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_delta_ms=MIN_REGRESSION_MS):
+    """Compare two results documents. Returns a row per shared benchmark and metric."""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            before, after = base[metric], result[metric]
+            ratio = after / before if before else None
+            regressed = after > before * (1 + threshold) and after - before > min_delta_ms
+            rows.append({"name": name, "metric": metric, "baseline": before, "current": after,
+                         "ratio": round(ratio, 3) if ratio is not None else None, "regressed": regressed})
+    return rows
+
+
+def print_results(document):
+    print(f"{'benchmark':<44} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+    for name, result in document["results"].items():
+        print(f"{name:<44} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} {result['ops_per_second'] or 0:>10.1f}")
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':<44} {'metric':<7} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+        print(f"{row['name']:<44} {row['metric']:<7} {row['baseline']:>10.3f} {row['current']:>10.3f} {ratio:>7}{flag}")
+
+
+def parse_sizes(value):
+    return tuple(int(part) for part in value.split(',') if part)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keymote latency and throughput benchmarks.")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="median simulated AppleScript latency")
+    parser.add_argument('--sigma', type=float, default=0.35, help="log-normal spread of the latency (0 for fixed)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--deck-sizes', type=parse_sizes, default=DEFAULT_DECK_SIZES)
+    parser.add_argument('--clients', type=parse_sizes, default=DEFAULT_CLIENT_COUNTS)
+    parser.add_argument('--wire-sizes', type=parse_sizes, default=DEFAULT_WIRE_SIZES)
+    parser.add_argument('--quick', action='store_true', help="few iterations and small decks, for a smoke run")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown before flagging, e.g. 0.2 for 20%%")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.iterations = min(args.iterations, 10)
+        args.deck_sizes = tuple(size for size in args.deck_sizes if size <= 1000)
+        args.clients = tuple(count for count in args.clients if count <= 10)
+        args.wire_sizes = tuple(size for size in args.wire_sizes if size <= 1000)
+
+    document = run_suite(args.latency_ms, args.sigma, args.seed, args.iterations, args.deck_sizes, args.clients,
+                         args.wire_sizes)
+    print_results(document)
+
+    baseline = None
+    if args.compare:
+        # Read the baseline first, so comparing against the default output file still works.
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        rows = compare(document, baseline, args.threshold)
+        print()
+        print_comparison(rows)
+        regressions = [row for row in rows if row['regressed']]
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
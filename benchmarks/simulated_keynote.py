@@ -0,0 +1,124 @@
+"""A simulated Keynote for benchmarks.
+
+``SimulatedKeynote`` is a runner for ``keynote_scripts.ScriptLibrary``: it runs
+the library's scripts by name against an in-memory document and answers the
+way osascript would, after sleeping for a latency drawn from ``LatencyModel``.
+"""
+import os
+import random
+import subprocess
+import threading
+import time
+
+
+class LatencyModel:
+    """Log-normal per-script latency around median_ms; sigma 0 gives a fixed latency."""
+
+    def __init__(self, median_ms=20.0, sigma=0.35, seed=0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = self._random.lognormvariate(0, self.sigma) if self.sigma > 0 else 1.0
+        return self.median_ms * factor / 1000
+
+
+class SimulatedKeynote:
+    def __init__(self, latency=None, slide_count=50):
+        self.latency = latency or LatencyModel(median_ms=0)
+        # Slide count of the next document opened.
+        self.slide_count = slide_count
+        self.document_name = None
+        self.document_path = None
+        self.document_slides = 0
+        self.slide_number = None
+        self.playing = False
+        self.scripts = 0
+        self._lock = threading.Lock()
+
+    def open_document(self, name, slide_count=None):
+        with self._lock:
+            self.document_name = name
+            self.document_path = None
+            self.document_slides = slide_count or self.slide_count
+            self.slide_number = 1
+            self.playing = False
+
+    def set_slide(self, slide_number):
+        """Move to a slide behind the server's back, as the presenter's clicker would."""
+        with self._lock:
+            self.slide_number = slide_number
+
+    # --- keynote_scripts runner interface ---
+
+    def run(self, script, args, check, timeout=None):
+        delay = self.latency.sample()
+        if delay:
+            time.sleep(delay)
+        cmd = ['osascript', script.name] + list(args)
+        with self._lock:
+            self.scripts += 1
+            try:
+                stdout = self._execute(script.name, args)
+            except RuntimeError as e:
+                if check:
+                    raise subprocess.CalledProcessError(1, cmd, output='', stderr=str(e))
+                return subprocess.CompletedProcess(cmd, 1, stdout='', stderr=str(e))
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"{stdout}\n", stderr='')
+
+    def warm(self, scripts):
+        return 0
+
+    def _require_document(self):
+        if self.document_name is None:
+            raise RuntimeError("No presentation open.")
+
+    def _execute(self, name, args):
+        if name == 'status':
+            if self.document_name is None:
+                return 'closed'
+            return f"{self.document_name}||{self.slide_number}||{'true' if self.playing else 'false'}"
+        if name == 'open':
+            self.document_name = os.path.basename(args[0])
+            self.document_path = args[0]
+            self.document_slides = self.slide_count
+            self.slide_number = 1
+            self.playing = False
+        if name in ('open', 'snapshot'):
+            if self.document_name is None:
+                return 'closed'
+            return (f"{self.document_name}||{self.document_slides}||{self.slide_number}||"
+                    f"{'true' if self.playing else 'false'}||{self.document_path or ''}")
+        if name == 'close':
+            self._require_document()
+            self.document_name = None
+            self.document_path = None
+            self.slide_number = None
+            self.playing = False
+            return ''
+        if name == 'stop':
+            self.playing = False
+            return ''
+        self._require_document()
+        if name == 'next':
+            self.slide_number = min(self.slide_number + 1, self.document_slides)
+        elif name == 'previous':
+            self.slide_number = max(self.slide_number - 1, 1)
+        elif name == 'goto':
+            target = int(args[0])
+            if not 1 <= target <= self.document_slides:
+                raise RuntimeError(f"Can't get slide {target}.")
+            self.slide_number = target
+        elif name == 'start':
+            self.playing = True
+            return ''
+        elif name == 'count':
+            return str(self.document_slides)
+        elif name != 'current':
+            raise RuntimeError(f"The simulator does not support '{name}'.")
+        return str(self.slide_number)
@@ -0,0 +1,103 @@
+"""Warm start: the work the server does once at process start, before it reports ready.
+
+Without it every expensive first (starting the scripting host, reading the
+timings shards, compressing the front end, asking Keynote for its state) was
+paid by the first client to ask for it. A ``BootSequence`` runs named steps in
+order and records, per step, its state, how long it took and what it reported,
+for ``/readyz`` and ``--profile-startup``. The server is ready once every
+required step succeeded; a failed optional step only degrades it.
+"""
+import cProfile
+import io
+import pstats
+import time
+
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class BootStep:
+    def __init__(self, name, fn, required=True):
+        self.name = name
+        self.fn = fn
+        self.required = required
+        self.state = PENDING
+        self.seconds = None
+        self.detail = None
+        self.error = None
+
+    def report(self):
+        return {"state": self.state, "required": self.required,
+                "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+                "detail": self.detail, "error": self.error}
+
+
+class BootSequence:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.steps = []
+        self.seconds = None
+
+    def add(self, name, fn, required=True):
+        """Add a step; fn() runs once and may return a JSON-serialisable detail for the report."""
+        self.steps.append(BootStep(name, fn, required))
+
+    @property
+    def done(self):
+        return all(step.state in (READY, FAILED) for step in self.steps)
+
+    @property
+    def ready(self):
+        return all(step.state == READY for step in self.steps if step.required) and self.done
+
+    def run(self):
+        """Run every pending step in order, carrying on past failures. Returns whether the server is ready."""
+        started = self.clock()
+        for step in self.steps:
+            if step.state != PENDING:
+                continue
+            step.state = RUNNING
+            step_started = self.clock()
+            try:
+                step.detail = step.fn()
+            except Exception as e:
+                step.state = FAILED
+                step.error = f"{type(e).__name__}: {e}"
+                print(f"Boot step '{step.name}' failed: {step.error}")
+            else:
+                step.state = READY
+            step.seconds = self.clock() - step_started
+        self.seconds = (self.seconds or 0.0) + self.clock() - started
+        return self.ready
+
+    def profile(self, limit=25):
+        """run() under cProfile. Returns (ready, the limit most expensive calls by cumulative time, as text)."""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            ready = self.run()
+        finally:
+            profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return ready, out.getvalue()
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "done": self.done,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "components": {step.name: step.report() for step in self.steps},
+        }
+
+    def summary(self):
+        """One line per step, slowest first, for the startup log."""
+        lines = []
+        for step in sorted(self.steps, key=lambda step: -(step.seconds or 0)):
+            seconds = f"{step.seconds * 1000:8.1f} ms" if step.seconds is not None else "       -   "
+            flag = '' if step.required else ' (optional)'
+            lines.append(f"  {step.name:<16}{seconds}  {step.state}{flag}" + (f"  {step.error}" if step.error else ''))
+        total = f"{self.seconds * 1000:.1f} ms" if self.seconds is not None else 'not run'
+        return f"Boot {'ready' if self.ready else 'not ready'} in {total}:\n" + "\n".join(lines)
@@ -0,0 +1,141 @@
+"""Serialized, coalescing queue for Keynote navigation commands.
+
+A presenter tapping "next" five times quickly would otherwise start five
+concurrent Keynote scripts that can interleave or land out of order. Commands
+are instead merged into a single pending move that one worker executes:
+
+* a lone ``next``/``previous`` runs as-is, so Keynote still steps through builds;
+* several queued moves collapse into one absolute ``goto`` (five nexts become
+  current + 5, clamped to the slide count);
+* a new ``goto`` supersedes whatever was still queued.
+
+Callers get the predicted slide number back immediately; the worker reports the
+slide Keynote actually landed on through ``on_done``.
+"""
+import threading
+
+
+class NavigationError(Exception):
+    """Raised when a navigation command cannot be queued."""
+
+
+class NavigationQueue:
+    def __init__(self, execute, position, on_done=None, on_error=None,
+                 spawn=None, event_factory=threading.Event):
+        """
+        execute(command, target) runs one command in Keynote and returns the new slide number.
+        position() returns (current_slide_number, slide_count) for the open presentation,
+        with a current slide of None when nothing is open.
+        """
+        self.execute = execute
+        self.position = position
+        self.on_done = on_done
+        self.on_error = on_error
+        self.spawn = spawn
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0
+        self._pending = None
+        self._predicted = None
+        self._busy = False
+        self._worker_started = False
+        self._lock = threading.Lock()
+        self._work = event_factory()
+        self._idle = event_factory()
+        self._idle.set()
+
+    def submit(self, command, slide_number=None):
+        """Queue 'next', 'previous' or 'goto' and return the predicted slide number."""
+        if command not in ('next', 'previous', 'goto'):
+            raise ValueError(f"Unknown navigation command: {command}")
+
+        # position() may ask Keynote, so it runs before taking the lock; the prediction is then
+        # read, advanced and stored in one critical section so concurrent taps each move one slide.
+        current, slide_count = self.position()
+        with self._lock:
+            if self._predicted is not None:
+                # Build on top of moves that are still queued.
+                current = self._predicted
+            elif current is None:
+                raise NavigationError("No presentation open.")
+
+            if command == 'goto':
+                if slide_count and not 1 <= slide_number <= slide_count:
+                    raise NavigationError(f"Slide {slide_number} is out of range (1-{slide_count}).")
+                target = slide_number
+            else:
+                target = current + (1 if command == 'next' else -1)
+                target = max(1, min(target, slide_count or target))
+
+            self.submitted += 1
+            if self._pending is None:
+                self._pending = {"command": command, "target": target}
+            else:
+                self.coalesced += 1
+                self._pending = {"command": 'goto', "target": target}
+            self._predicted = target
+            self._idle.clear()
+        self._work.set()
+        self._ensure_worker()
+        return target
+
+    def _ensure_worker(self):
+        if self.spawn is None or self._worker_started:
+            return
+        self._worker_started = True
+        self.spawn(self.run)
+
+    def run(self):
+        """Worker loop: execute queued commands one at a time, forever."""
+        while True:
+            self._work.wait()
+            self._work.clear()
+            self.drain()
+
+    def drain(self):
+        """Execute everything queued so far. Safe to call directly, e.g. from tests."""
+        while True:
+            with self._lock:
+                pending = self._pending
+                self._pending = None
+                if pending is None:
+                    self._busy = False
+                    self._predicted = None
+                    self._idle.set()
+                    return
+                self._busy = True
+
+            try:
+                actual = self.execute(pending["command"], pending["target"])
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(pending, e)
+                continue
+
+            self.executed += 1
+            if self.on_done:
+                self.on_done(pending, actual)
+
+    def clear(self):
+        """Drop queued commands without running them, e.g. when the presentation closes."""
+        with self._lock:
+            self._pending = None
+            self._predicted = None
+            if not self._busy:
+                self._idle.set()
+
+    @property
+    def busy(self):
+        return self._busy or self._pending is not None
+
+    def wait_idle(self, timeout=None):
+        """Wait until no navigation is queued or running. Status reads call this to yield priority."""
+        return self._idle.wait(timeout)
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "busy": self.busy,
+        }
@@ -0,0 +1,222 @@
+"""Cached directory listings and a background index of Keynote files.
+
+The file browser used to ``os.scandir`` the requested directory on every
+request, which stalls on network home directories and folders with thousands
+of entries. ``DirectoryIndex`` keeps recent listings keyed by absolute path and
+revalidates them with a single ``stat``: adding, removing or renaming an entry
+changes the directory's mtime, so an unchanged mtime means the cached listing
+is still exact. Listings are paginated with opaque cursors that encode the sort
+key of the last item returned, so pages stay consistent while entries come and
+go.
+
+``PresentationCrawler`` walks the home directory in a background thread and
+keeps a name index of every ``.key`` file for search. Re-crawls reuse the
+listing of every directory whose mtime has not changed, so only the parts of
+the tree that changed are rescanned.
+"""
+import base64
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _sort_key(item):
+    # Folders first, then files, all alphabetically.
+    return (item['type'] != 'directory', item['name'].lower(), item['name'])
+
+
+def encode_cursor(item):
+    return base64.urlsafe_b64encode(json.dumps(_sort_key(item)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the sort key a cursor points after. Raises ValueError for a malformed cursor."""
+    try:
+        is_file, lower, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    return (bool(is_file), str(lower), str(name))
+
+
+def scan_directory(path):
+    """List the visible subdirectories and .key files of path, sorted folders first."""
+    items = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                items.append({'name': entry.name, 'type': 'directory'})
+            elif entry.is_file() and entry.name.endswith('.key'):
+                items.append({'name': entry.name, 'type': 'file'})
+    items.sort(key=_sort_key)
+    return items
+
+
+class DirectoryIndex:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list(self, path):
+        """Return the sorted items of path, from cache when the directory is unchanged."""
+        return self._listing(path)[0]
+
+    def _listing(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            # Cannot validate a cached copy; let scandir report the problem (or succeed) uncached.
+            mtime = None
+
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is not None and mtime is not None and cached[0] == mtime:
+                self._listings.move_to_end(path)
+                self.hits += 1
+                return cached[1], cached[2]
+            self.misses += 1
+
+        items = scan_directory(path)
+        keys = [_sort_key(item) for item in items]
+        if mtime is not None:
+            with self._lock:
+                self._listings[path] = (mtime, items, keys)
+                self._listings.move_to_end(path)
+                while len(self._listings) > self.max_entries:
+                    self._listings.popitem(last=False)
+        return items, keys
+
+    def page(self, path, cursor=None, limit=None):
+        """Return (items, next_cursor) for one page of path's listing; next_cursor is None on the last page."""
+        items, keys = self._listing(path)
+        start = bisect.bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+        if limit is None:
+            return items[start:], None
+        page = items[start:start + limit]
+        next_cursor = encode_cursor(page[-1]) if start + limit < len(items) else None
+        return page, next_cursor
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(path, None)
+
+    def stats(self):
+        return {"entries": len(self._listings), "hits": self.hits, "misses": self.misses}
+
+
+class PresentationCrawler:
+    def __init__(self, root, recrawl_interval=300.0, max_depth=12):
+        self.root = root
+        self.recrawl_interval = recrawl_interval
+        self.max_depth = max_depth
+        self.crawls = 0
+        self.last_crawl_seconds = None
+        self.complete = False
+        self._dirs = {}
+        self._names = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start crawling in the background. Safe to call more than once."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='presentation-crawler', daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Ask for a re-crawl soon, e.g. after the user saved a new presentation."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.crawl()
+            except Exception as e:
+                print(f"Error indexing presentations: {e}")
+            self._wake.wait(self.recrawl_interval)
+            self._wake.clear()
+
+    def crawl(self):
+        """Walk the tree once, rescanning only directories whose mtime changed."""
+        started = time.monotonic()
+        seen = {}
+        names = []
+        stack = [('', 0)]
+        while stack:
+            relative, depth = stack.pop()
+            path = os.path.join(self.root, relative) if relative else self.root
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._dirs.get(relative)
+            if cached is not None and cached[0] == mtime:
+                files, subdirs = cached[1], cached[2]
+            else:
+                files, subdirs = [], []
+                try:
+                    with os.scandir(path) as it:
+                        for entry in it:
+                            if entry.name.startswith('.'):
+                                continue
+                            try:
+                                # Never follow symlinks out of (or in circles within) the root.
+                                if entry.name.endswith('.key'):
+                                    # Keynote documents may be package directories; never descend into them.
+                                    if entry.is_file(follow_symlinks=False) or entry.is_dir(follow_symlinks=False):
+                                        files.append(entry.name)
+                                elif entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+            seen[relative] = (mtime, files, subdirs)
+            for name in files:
+                file_path = f"{relative}/{name}" if relative else name
+                names.append((name.lower(), file_path))
+            if depth < self.max_depth:
+                stack.extend((f"{relative}/{name}" if relative else name, depth + 1) for name in subdirs)
+
+        names.sort()
+        with self._lock:
+            self._dirs = seen
+            self._names = names
+            self.complete = True
+        self.crawls += 1
+        self.last_crawl_seconds = time.monotonic() - started
+
+    def search(self, query, limit=50):
+        """Return up to limit relative paths of .key files whose name contains query (case-insensitive)."""
+        query = query.lower()
+        with self._lock:
+            names = self._names
+        matches = []
+        for lower, path in names:
+            if query in lower:
+                matches.append({'name': os.path.basename(path), 'type': 'file', 'path': path})
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def stats(self):
+        return {
+            "complete": self.complete,
+            "crawls": self.crawls,
+            "directories": len(self._dirs),
+            "presentations": len(self._names),
+            "last_crawl_seconds": self.last_crawl_seconds,
+        }
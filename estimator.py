@@ -0,0 +1,121 @@
+"""Timing estimates from slide content, calibrated on rehearsal history.
+
+A slide's estimate is linear in its content: a base time plus seconds per word
+of title, body and presenter notes and per image and media clip. The weights
+start from ``PRIOR`` (roughly speaking pace for notes, a slower pace for
+bullets the presenter talks around) and are fitted to the median actual times
+of past rehearsals, for decks whose content is known. The fit is a ridge
+regression pulled towards the prior, so a short history nudges the weights
+rather than replacing them; it is solved once per change in the history, from
+normal equations accumulated in one pass. A whole deck is then estimated at
+once from its feature matrix.
+"""
+import math
+
+FEATURES = ('title_words', 'body_words', 'notes_words', 'images', 'media')
+# Seconds for the base and per unit of each feature.
+PRIOR = (15.0, 0.5, 1.0, 0.4, 5.0, 10.0)
+# How many slides' worth of evidence the prior counts for.
+PRIOR_STRENGTH = 20.0
+MIN_SECONDS = 10
+MAX_SECONDS = 900
+# Estimates are rounded like a person would write them.
+ROUND_TO = 5
+
+
+def feature_row(slide):
+    """The feature vector of one slide's content, with a leading 1 for the base time."""
+    return (1.0,
+            float(len(slide.get("title", '').split())),
+            float(len(slide.get("body", '').split())),
+            float(len(slide.get("notes", '').split())),
+            float(slide.get("images", 0)),
+            float(slide.get("media", 0)))
+
+
+def solve(matrix, vector):
+    """Solve a small dense linear system by Gaussian elimination with partial pivoting. Raises ValueError if singular."""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            raise ValueError("Singular system.")
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, n):
+            factor = rows[row][column] / rows[column][column]
+            if factor:
+                for k in range(column, n + 1):
+                    rows[row][k] -= factor * rows[column][k]
+    solution = [0.0] * n
+    for row in reversed(range(n)):
+        solution[row] = (rows[row][n] - math.fsum(rows[row][k] * solution[k] for k in range(row + 1, n))) / rows[row][row]
+    return solution
+
+
+class TimingEstimator:
+    def __init__(self, prior=PRIOR, prior_strength=PRIOR_STRENGTH):
+        self.prior = tuple(prior)
+        self.prior_strength = prior_strength
+        self.weights = tuple(prior)
+        self.samples = 0
+        self.calibrations = 0
+
+    def fit(self, samples):
+        """Fit the weights to (content, seconds) samples, pulled towards the prior. Returns the number of samples used."""
+        size = len(self.prior)
+        gram = [[0.0] * size for _ in range(size)]
+        moment = [0.0] * size
+        count = 0
+        for slide, seconds in samples:
+            row = feature_row(slide)
+            for i in range(size):
+                moment[i] += row[i] * seconds
+                for j in range(size):
+                    gram[i][j] += row[i] * row[j]
+            count += 1
+        self.calibrations += 1
+        self.samples = count
+        if not count:
+            self.weights = self.prior
+            return 0
+        # Each weight's pull is scaled by its feature's own magnitude, so the prior counts for
+        # prior_strength slides whatever the units; features never seen keep their prior weight.
+        for i in range(size):
+            pull = self.prior_strength * max(gram[i][i] / count, 1e-6)
+            gram[i][i] += pull
+            moment[i] += pull * self.prior[i]
+        try:
+            self.weights = tuple(solve(gram, moment))
+        except ValueError:
+            self.weights = self.prior
+        return count
+
+    def estimate(self, slides):
+        """Estimated seconds for every slide at once; skipped slides get 0."""
+        rows = [feature_row(slide) for slide in slides]
+        raw = [math.fsum(map(float.__mul__, row, self.weights)) for row in rows]
+        return [0 if slide.get("skipped") else
+                int(min(MAX_SECONDS, max(MIN_SECONDS, ROUND_TO * round(seconds / ROUND_TO))))
+                for slide, seconds in zip(slides, raw)]
+
+    def stats(self):
+        return {"weights": dict(zip(('base',) + FEATURES, (round(w, 3) for w in self.weights))),
+                "samples": self.samples, "calibrations": self.calibrations}
+
+
+def calibration_samples(history, contents, presentation_ids):
+    """(content, median actual seconds) of every rehearsed slide whose content is known.
+
+    contents(presentation_id) returns a deck's cached slide content, or None.
+    """
+    for presentation_id in presentation_ids:
+        slides = contents(presentation_id)
+        stats = history.stats(presentation_id) if slides else None
+        if not stats:
+            continue
+        by_number = {slide["slide"]: slide for slide in slides}
+        for slide_stats in stats["slides"]:
+            slide = by_number.get(slide_stats["slide"])
+            if slide is not None and not slide.get("skipped") and slide_stats["median"] is not None:
+                yield slide, slide_stats["median"]
@@ -0,0 +1,60 @@
+"""A bounded log of the state events sent to clients, for resyncing after a reconnect.
+
+Every state event (slide changes, presentation started/stopped/closed/opened,
+clock transitions) gets the next sequence number, which clients receive as
+``seq`` in the event's payload. The latest events are kept in a ring buffer. A
+client that reconnects sends the epoch and the last seq it saw and gets back
+only the events it missed, which is a few hundred bytes after a short Wi-Fi
+drop. When those events are no longer all in the buffer, or the server was
+restarted (a new epoch), ``since()`` returns None and the client needs a full
+snapshot instead.
+"""
+import collections
+import os
+import threading
+import time
+
+DEFAULT_CAPACITY = 256
+
+
+class EventLog:
+    def __init__(self, capacity=DEFAULT_CAPACITY, epoch=None):
+        self.capacity = capacity
+        # Tells clients whether their seq numbers belong to this log at all.
+        self.epoch = epoch or f"{os.getpid()}-{int(time.time() * 1000)}"
+        self.seq = 0
+        self._events = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def append(self, event, data=None, room=None):
+        """Record an event sent to room (None for everyone) and return its payload, with its seq added."""
+        with self._lock:
+            self.seq += 1
+            payload = dict(data or {}, seq=self.seq)
+            self._events.append((self.seq, event, payload, room))
+        return payload
+
+    def since(self, epoch, seq, rooms=(None,)):
+        """The events after seq that were sent to any of rooms, oldest first, as {"event", "data"} dicts.
+
+        Returns None when the client cannot catch up from the log: another epoch,
+        a seq from the future, or events after seq that have already been dropped.
+        """
+        with self._lock:
+            if epoch != self.epoch or seq < 0 or seq > self.seq:
+                return None
+            oldest = self._events[0][0] if self._events else self.seq + 1
+            if seq + 1 < oldest:
+                return None
+            return [{"event": event, "data": payload}
+                    for event_seq, event, payload, room in self._events
+                    if event_seq > seq and room in rooms]
+
+    def position(self):
+        """Where a client that just loaded the full state starts from."""
+        with self._lock:
+            return {"epoch": self.epoch, "seq": self.seq}
+
+    def stats(self):
+        with self._lock:
+            return {"epoch": self.epoch, "seq": self.seq, "buffered": len(self._events), "capacity": self.capacity}
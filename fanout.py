@@ -0,0 +1,130 @@
+"""Socket.IO fan-out to the clients following a presentation.
+
+Events are scoped to one room per presentation, so a workshop with hundreds of
+follower devices only wakes up the clients watching that deck. With
+``KEYMOTE_MESSAGE_QUEUE`` set, emits go through a shared message queue, so
+other processes (e.g. a write-only ``SocketIO``) can reach the server's clients:
+
+- unset: no queue (the default);
+- ``local``: ``LocalPubSubManager``, an in-process stand-in that connects the
+  Socket.IO servers of one process, for tests and offline development;
+- any other value is handed to Flask-SocketIO as a message queue URL
+  (``redis://...``, ``kafka://...``, ...), which needs that backend's package.
+
+Only one server process is supported. The timings store's write-behind
+buffer, the session clock, the status cache, the navigation queue, the event
+log and the session recorder all live in its memory, and it alone drives
+Keynote. ``LeaderLock`` is an exclusive, non-blocking file lock the server
+takes at startup; a second server exits instead of overwriting the first one's
+files.
+"""
+import json
+import os
+import queue
+import threading
+
+import socketio
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def presentation_room(presentation_id):
+    return f"presentation:{presentation_id}"
+
+
+def message_queue_options(url):
+    """Keyword arguments for SocketIO() for a KEYMOTE_MESSAGE_QUEUE value."""
+    if not url:
+        return {}
+    if url == 'local':
+        return {"client_manager": LocalPubSubManager()}
+    return {"message_queue": url}
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Message queue stand-in connecting the Socket.IO servers that live in this process.
+
+    Messages are serialized to JSON on the way through, like a real broker would.
+    """
+    name = 'local'
+
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='keymote', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox = None
+
+    def initialize(self):
+        if not self.write_only:
+            # A green queue under eventlet, so the listener does not block the hub.
+            self.subscribe(self.server.eio.create_queue())
+        super().initialize()
+
+    def subscribe(self, inbox=None):
+        """Start receiving this channel's messages into inbox (a queue.Queue by default)."""
+        self._inbox = queue.Queue() if inbox is None else inbox
+        with self._channels_lock:
+            self._channels.setdefault(self.channel, []).append(self._inbox)
+        return self._inbox
+
+    def unsubscribe(self):
+        with self._channels_lock:
+            inboxes = self._channels.get(self.channel, [])
+            if self._inbox in inboxes:
+                inboxes.remove(self._inbox)
+        self._inbox = None
+
+    def _publish(self, data):
+        message = json.dumps(data)
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+class LeaderLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def is_leader(self):
+        return self._file is not None
+
+    def acquire(self):
+        """Try to become the leader without waiting. Returns whether this worker is the leader."""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            # No file locking on this platform: assume a single worker.
+            self._file = True
+            return True
+        f = open(self.path, 'a+')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # Record who holds the lock, for whoever is debugging a stuck deployment.
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+        self._file = None
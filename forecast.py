@@ -0,0 +1,277 @@
+"""Pace and finish-time forecasts for the presentation being given.
+
+``Forecast`` keeps one presentation's estimated and actual slide times in
+Fenwick trees (binary indexed trees), so a slide transition or a timing edit
+costs O(log n) whatever the size of the deck: every quantity a projection needs
+is a prefix sum. Only structural changes (adding or removing a break) rebuild
+the trees, in O(n).
+
+A projection scales the remaining estimates by the pace so far (actual over
+estimated time of the slides already timed), optionally blended with the mean
+times of past rehearsals from ``history.RehearsalHistory``. Breaks split the
+deck into sections, each reported as ahead or behind.
+
+``ForecastEngine`` holds the forecast of the current presentation and decides
+when a projection moved enough to be worth pushing to clients.
+"""
+import bisect
+import threading
+import time
+
+# Pace is clamped to this range, so one badly timed slide cannot project a three-hour talk.
+MIN_PACE = 0.25
+MAX_PACE = 4.0
+
+
+class FenwickTree:
+    """Prefix sums over n values, with O(log n) point updates and queries."""
+
+    def __init__(self, values=()):
+        self.values = [float(value) for value in values]
+        n = len(self.values)
+        self._tree = [0.0] * (n + 1)
+        # O(n) construction: push each node's sum to its parent.
+        for i in range(1, n + 1):
+            self._tree[i] += self.values[i - 1]
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self.values)
+
+    def set(self, index, value):
+        value = float(value)
+        delta = value - self.values[index]
+        self.values[index] = value
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count):
+        """Sum of the first count values."""
+        total = 0.0
+        i = min(count, len(self.values))
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def range(self, start, end):
+        """Sum of values[start:end]."""
+        return self.prefix(end) - self.prefix(start)
+
+    def total(self):
+        return self.prefix(len(self.values))
+
+    def find(self, target):
+        """The smallest index whose prefix sum (inclusive) reaches target, for non-negative values; len() if none."""
+        index = 0
+        step = 1 << len(self.values).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] < target:
+                index = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return index
+
+
+def _is_break(slide):
+    return slide.get("slide") == 'BREAK'
+
+
+def _seconds(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return float(value)
+
+
+class Forecast:
+    """Incremental prefix sums over one presentation's rows (slides and breaks)."""
+
+    def __init__(self, slides, history=None, history_weight=0.5):
+        """history: the per-slide list from RehearsalHistory.stats(), or None."""
+        means = {}
+        self.history_sessions = 0
+        if history:
+            self.history_sessions = history.get("sessions", 0)
+            means = {entry["slide"]: entry["mean"] for entry in history.get("slides", []) if entry.get("mean") is not None}
+        self.history_weight = history_weight if means else 0.0
+
+        self.slide_numbers = [slide.get("slide") for slide in slides]
+        estimates = [_seconds(slide.get("estimated_time_seconds")) or 0.0 for slide in slides]
+        actuals = [_seconds(slide.get("actual_time_seconds")) for slide in slides]
+        self.estimates = FenwickTree(estimates)
+        self.actuals = FenwickTree(actual or 0.0 for actual in actuals)
+        # Estimates of the rows that have an actual time, to compare like with like.
+        self.timed_estimates = FenwickTree(estimate if actual is not None else 0.0 for estimate, actual in zip(estimates, actuals))
+        # Past rehearsals' mean per slide, or the estimate where there is none (always for breaks).
+        self.expected = FenwickTree(means.get(number, estimate) for number, estimate in zip(self.slide_numbers, estimates))
+        # 1 per Keynote slide, 0 per break: maps slide numbers to rows.
+        self.slide_rows = FenwickTree(0 if _is_break(slide) else 1 for slide in slides)
+        self._means = means
+        # Every break starts a new section.
+        self.section_starts = [0] + [row for row, slide in enumerate(slides) if _is_break(slide) and row > 0]
+
+    def __len__(self):
+        return len(self.estimates)
+
+    def update_row(self, row, slide):
+        """Apply an edit to one row's estimate or actual time, in O(log n)."""
+        estimate = _seconds(slide.get("estimated_time_seconds")) or 0.0
+        actual = _seconds(slide.get("actual_time_seconds"))
+        self.estimates.set(row, estimate)
+        self.actuals.set(row, actual or 0.0)
+        self.timed_estimates.set(row, estimate if actual is not None else 0.0)
+        self.expected.set(row, self._means.get(self.slide_numbers[row], estimate))
+
+    def row_for_slide(self, slide_number):
+        """The row of a Keynote slide number, skipping breaks, or None past the end."""
+        if slide_number < 1:
+            return None
+        row = self.slide_rows.find(slide_number)
+        return row if row < len(self) else None
+
+    def pace(self, row):
+        """Actual over estimated time of the timed rows before row, 1.0 before anything was timed."""
+        planned = self.timed_estimates.prefix(row)
+        if planned <= 0:
+            return 1.0
+        return min(MAX_PACE, max(MIN_PACE, self.actuals.prefix(row) / planned))
+
+    def project(self, slide_number, elapsed, slide_elapsed, now=None, sections=True):
+        """Project the finish from the current slide and the session clock, or None for an unknown slide.
+
+        O(log n); the per-section report adds O(sections * log n) and can be left out.
+        """
+        row = self.row_for_slide(slide_number)
+        if row is None:
+            return None
+        now = time.time() if now is None else now
+        pace = self.pace(row)
+        on_slide = self.estimates.values[row]
+        # Time still planned from here on, at the pace so far; the current slide is partly done.
+        remaining = (self.estimates.total() - self.estimates.prefix(row + 1)) * pace + max(0.0, on_slide * pace - slide_elapsed)
+        if self.history_weight:
+            from_history = (self.expected.total() - self.expected.prefix(row + 1)) + max(0.0, self.expected.values[row] - slide_elapsed)
+            remaining = (1 - self.history_weight) * remaining + self.history_weight * from_history
+        planned_total = self.estimates.total()
+        projected_total = elapsed + remaining
+        section = bisect.bisect_right(self.section_starts, row) - 1
+        return {
+            "slide_number": slide_number,
+            "pace": round(pace, 3),
+            "planned_total_seconds": round(planned_total, 1),
+            "projected_total_seconds": round(projected_total, 1),
+            "projected_remaining_seconds": round(remaining, 1),
+            "projected_finish_at": round(now + remaining, 1),
+            # Against the plan when this slide started; positive is behind.
+            "behind_seconds": round(elapsed - slide_elapsed - self.estimates.prefix(row), 1),
+            "finish_delta_seconds": round(projected_total - planned_total, 1),
+            "history_sessions": self.history_sessions if self.history_weight else 0,
+            "section": section,
+            "sections": self.sections(row) if sections else None,
+        }
+
+    def sections(self, row):
+        """Each section's planned and actual time so far and how far ahead (negative) or behind it is."""
+        result = []
+        ends = self.section_starts[1:] + [len(self)]
+        for index, (start, end) in enumerate(zip(self.section_starts, ends)):
+            if end <= row:
+                state = "done"
+            elif start <= row:
+                state = "current"
+            else:
+                state = "upcoming"
+            timed_until = min(end, row)
+            actual = self.actuals.range(start, timed_until) if state != "upcoming" else 0.0
+            timed_planned = self.timed_estimates.range(start, timed_until) if state != "upcoming" else 0.0
+            result.append({
+                "index": index,
+                "first_row": start,
+                "last_row": end - 1,
+                "state": state,
+                "planned_seconds": round(self.estimates.range(start, end), 1),
+                "actual_seconds": round(actual, 1),
+                "delta_seconds": round(actual - timed_planned, 1) if state != "upcoming" else None,
+            })
+        return result
+
+
+class ForecastEngine:
+    """The current presentation's forecast, loaded lazily and kept up to date incrementally.
+
+    load(presentation_id) returns the presentation's timings (or None) and
+    history(presentation_id) its RehearsalHistory stats (or None). A projection
+    is worth pushing when the projected finish moved by threshold seconds or
+    more since the last push, or the presenter entered another section.
+    """
+
+    def __init__(self, load, history=None, threshold=15.0, history_weight=0.5):
+        self.load = load
+        self.history = history
+        self.threshold = threshold
+        self.history_weight = history_weight
+        self.rebuilds = 0
+        self._presentation_id = None
+        self._forecast = None
+        self._pushed = None
+        self._lock = threading.Lock()
+
+    def _forecast_for(self, presentation_id):
+        if self._forecast is None or self._presentation_id != presentation_id:
+            presentation = self.load(presentation_id)
+            if presentation is None:
+                return None
+            history = self.history(presentation_id) if self.history else None
+            self._forecast = Forecast(presentation.get("slides", []), history, self.history_weight)
+            self._presentation_id = presentation_id
+            self.rebuilds += 1
+        return self._forecast
+
+    def invalidate(self, presentation_id=None):
+        """Rebuild on next use, e.g. after breaks were added or removed. Without an ID, also forget the last push."""
+        with self._lock:
+            if presentation_id is None or presentation_id == self._presentation_id:
+                self._forecast = None
+            if presentation_id is None:
+                self._pushed = None
+
+    def update_row(self, presentation_id, row, slide):
+        """Apply one slide edit if that presentation's forecast is loaded."""
+        with self._lock:
+            if self._forecast is not None and self._presentation_id == presentation_id and 0 <= row < len(self._forecast):
+                self._forecast.update_row(row, slide)
+
+    def project(self, presentation_id, slide_number, elapsed, slide_elapsed, now=None):
+        """The full projection for a slide of the presentation, or None."""
+        with self._lock:
+            forecast = self._forecast_for(presentation_id)
+            if forecast is None:
+                return None
+            projection = forecast.project(slide_number, elapsed, slide_elapsed, now)
+        if projection is not None:
+            projection["presentation_id"] = presentation_id
+        return projection
+
+    def changed_projection(self, presentation_id, slide_number, elapsed, slide_elapsed, now=None):
+        """The full projection if it is worth pushing, recording it as pushed; None otherwise."""
+        with self._lock:
+            forecast = self._forecast_for(presentation_id)
+            if forecast is None:
+                return None
+            projection = forecast.project(slide_number, elapsed, slide_elapsed, now, sections=False)
+            if projection is None:
+                return None
+            key = (presentation_id, projection["section"])
+            if (self._pushed is not None and self._pushed[0] == key
+                    and abs(projection["projected_total_seconds"] - self._pushed[1]) < self.threshold):
+                return None
+            self._pushed = (key, projection["projected_total_seconds"])
+            row = forecast.row_for_slide(slide_number)
+            projection["sections"] = forecast.sections(row)
+        projection["presentation_id"] = presentation_id
+        return projection
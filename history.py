@@ -0,0 +1,280 @@
+"""Rehearsal history: per-slide statistics across elapsed-time exports.
+
+Every closed session leaves one ``static/elapsed_times/*_elapsed_*.json`` file
+behind. ``RehearsalHistory`` ingests those files incrementally into a columnar
+store, one set of columns per presentation: a session timestamp column plus,
+per slide, an ``array('d')`` of actual and estimated seconds aligned with it
+(NaN where a slide was not timed). Each export is parsed once; the columns are
+cached next to the exports so a restart does not re-parse the whole history
+either. Aggregation then works on contiguous float arrays instead of JSON.
+"""
+import datetime
+import json
+import math
+import operator
+import os
+import re
+import statistics
+import threading
+from array import array
+
+from timings_store import write_json_atomic
+
+ELAPSED_DIR = os.path.join('static', 'elapsed_times')
+CACHE_NAME = '.history_cache.json'
+CACHE_VERSION = 1
+NAN = float('nan')
+
+_TIMESTAMP_RE = re.compile(r'_elapsed_(\d{8}-\d{6})\.json$')
+
+
+def _session_timestamp(filename, export, mtime):
+    """Seconds since the epoch for a session, from its file name, its contents or its mtime."""
+    match = _TIMESTAMP_RE.search(filename)
+    candidates = [(match.group(1), "%Y%m%d-%H%M%S")] if match else []
+    if export.get("exported_at"):
+        candidates.append((export["exported_at"], "%Y-%m-%d %H:%M:%S"))
+    for value, fmt in candidates:
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return mtime
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return NAN
+    return float(value)
+
+
+def _percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _slope(values):
+    """Least-squares change per session of values (in session order), or None for fewer than two."""
+    n = len(values)
+    if n < 2:
+        return None
+    # Sessions are evenly spaced at x = 0..n-1, so the x moments have closed forms.
+    mean_x = (n - 1) / 2
+    covariance = math.fsum(map(operator.mul, range(n), values)) - n * mean_x * (math.fsum(values) / n)
+    return covariance / (n * (n * n - 1) / 12)
+
+
+class PresentationColumns:
+    """Columnar session data for one presentation."""
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.actual = {}
+        self.estimated = {}
+        # Sessions are kept in chronological order so "last N" is a plain slice.
+        self.in_order = True
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp, slides):
+        size = len(self.timestamps)
+        if size and timestamp < self.timestamps[-1]:
+            self.in_order = False
+        self.timestamps.append(timestamp)
+        for slide in slides:
+            number = slide.get("slide")
+            if not isinstance(number, int) or isinstance(number, bool):
+                # Breaks have no stable identity across sessions.
+                continue
+            if number not in self.actual:
+                self.actual[number] = array('d', [NAN]) * size
+                self.estimated[number] = array('d', [NAN]) * size
+            elif len(self.actual[number]) > size:
+                continue
+            self.actual[number].append(_number(slide.get("actual_time_seconds")))
+            self.estimated[number].append(_number(slide.get("estimated_time_seconds")))
+        for column in (self.actual, self.estimated):
+            for values in column.values():
+                if len(values) == size:
+                    values.append(NAN)
+
+    def sort(self):
+        """Restore chronological order after an older export was ingested late."""
+        order = sorted(range(len(self.timestamps)), key=self.timestamps.__getitem__)
+        self.timestamps = array('d', (self.timestamps[i] for i in order))
+        for column in (self.actual, self.estimated):
+            for number, values in column.items():
+                column[number] = array('d', (values[i] for i in order))
+        self.in_order = True
+
+    def to_json(self):
+        return {
+            "timestamps": self.timestamps.tolist(),
+            "actual": {str(k): v.tolist() for k, v in self.actual.items()},
+            "estimated": {str(k): v.tolist() for k, v in self.estimated.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        columns = cls()
+        columns.timestamps = array('d', data["timestamps"])
+        columns.actual = {int(k): array('d', v) for k, v in data["actual"].items()}
+        columns.estimated = {int(k): array('d', v) for k, v in data["estimated"].items()}
+        columns.in_order = all(a <= b for a, b in zip(columns.timestamps, columns.timestamps[1:]))
+        return columns
+
+
+class RehearsalHistory:
+    def __init__(self, directory=ELAPSED_DIR):
+        self.directory = directory
+        self.cache_path = os.path.join(directory, CACHE_NAME)
+        self.files_ingested = 0
+        self._columns = {}
+        self._seen = set()
+        self._dir_mtime = None
+        self._loaded = False
+        # Aggregates only change when a session is ingested.
+        self._stats_cache = {}
+        self._lock = threading.Lock()
+
+    # --- Ingestion ---
+
+    def _load_cache(self):
+        self._loaded = True
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get("version") != CACHE_VERSION:
+            return
+        self._seen = set(cache["seen"])
+        self._columns = {key: PresentationColumns.from_json(data) for key, data in cache["presentations"].items()}
+
+    def _save_cache(self):
+        cache = {
+            "version": CACHE_VERSION,
+            "seen": sorted(self._seen),
+            "presentations": {key: columns.to_json() for key, columns in self._columns.items()},
+        }
+        try:
+            write_json_atomic(self.cache_path, cache)
+        except OSError as e:
+            print(f"Error saving rehearsal history cache: {e}")
+
+    def refresh(self):
+        """Ingest export files that appeared since the last call. Returns how many were added."""
+        with self._lock:
+            if not self._loaded:
+                self._load_cache()
+            try:
+                dir_mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                return 0
+            if dir_mtime == self._dir_mtime:
+                # No file was added or removed since the last scan.
+                return 0
+
+            new_files = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and '_elapsed_' in entry.name and entry.name not in self._seen:
+                        new_files.append(entry)
+            added = 0
+            # Ingest oldest first so columns usually stay in order without re-sorting.
+            new_files.sort(key=lambda entry: entry.name.rsplit('_elapsed_', 1)[-1])
+            for entry in new_files:
+                if self._ingest(entry):
+                    added += 1
+            self._dir_mtime = dir_mtime
+            if added:
+                self._stats_cache.clear()
+            if new_files:
+                self._save_cache()
+            return added
+
+    def _ingest(self, entry):
+        self._seen.add(entry.name)
+        try:
+            with open(entry.path) as f:
+                export = json.load(f)
+            mtime = entry.stat().st_mtime
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable elapsed-time export {entry.name}: {e}")
+            return False
+        if not isinstance(export, dict) or not isinstance(export.get("slides"), list):
+            return False
+
+        name = export.get("presentation_name") or export.get("name") or entry.name.split('_elapsed_')[0]
+        key = export.get("presentation_id") or name
+        self._columns.setdefault(key, PresentationColumns()).append(
+            _session_timestamp(entry.name, export, mtime), export["slides"])
+        self.files_ingested += 1
+        return True
+
+    # --- Queries ---
+
+    def presentations(self):
+        """Every presentation with history, by presentation ID (or file name, for older exports)."""
+        self.refresh()
+        with self._lock:
+            return list(self._columns)
+
+    def _columns_for(self, presentation_id):
+        columns = self._columns.get(presentation_id)
+        if columns is None:
+            # Older exports only recorded the presentation's file name.
+            columns = self._columns.get(os.path.basename(presentation_id))
+        return columns
+
+    def stats(self, presentation_id, last=None):
+        """Per-slide statistics over the last sessions of a presentation, or None if it has no history.
+
+        The result is shared between callers and must not be modified.
+        """
+        self.refresh()
+        with self._lock:
+            cached = self._stats_cache.get((presentation_id, last))
+            if cached is not None:
+                return cached
+            columns = self._columns_for(presentation_id)
+            if columns is None or not len(columns):
+                return None
+            if not columns.in_order:
+                columns.sort()
+            window = slice(-last if last else 0, None)
+            timestamps = columns.timestamps[window]
+            slides = [self._slide_stats(number, columns.actual[number][window], columns.estimated[number][window])
+                      for number in sorted(columns.actual)]
+            stats = {
+                "presentation_id": presentation_id,
+                "sessions": len(timestamps),
+                "first_session": datetime.datetime.fromtimestamp(timestamps[0]).isoformat(timespec='seconds'),
+                "last_session": datetime.datetime.fromtimestamp(timestamps[-1]).isoformat(timespec='seconds'),
+                "slides": slides,
+            }
+            self._stats_cache[(presentation_id, last)] = stats
+            return stats
+
+    @staticmethod
+    def _slide_stats(number, actual, estimated):
+        # NaN marks an untimed slide and is the only value not equal to itself.
+        timed = [value for value in actual if value == value]
+        estimate = next((value for value in reversed(estimated) if value == value), None)
+        stats = {"slide": number, "sessions": len(timed), "estimated_time_seconds": estimate,
+                 "mean": None, "median": None, "p90": None, "trend_per_session": None,
+                 "drift_seconds": None, "drift_ratio": None}
+        if not timed:
+            return stats
+        ordered = sorted(timed)
+        mean = math.fsum(timed) / len(timed)
+        stats.update(mean=mean, median=statistics.median(ordered), p90=_percentile(ordered, 0.9),
+                     trend_per_session=_slope(timed))
+        if estimate is not None:
+            stats["drift_seconds"] = mean - estimate
+            stats["drift_ratio"] = (mean - estimate) / estimate if estimate else None
+        return stats
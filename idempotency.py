@@ -0,0 +1,83 @@
+"""Deduplication of retried writes by their ``Idempotency-Key`` header.
+
+The client's outbox replays timing writes that may already have reached the
+server before the connection dropped. Each write carries a key that stays the
+same across retries. The first request with a key runs, and its response is
+kept; a retry gets the kept response back instead of applying the write a
+second time. A key reused for a different request (another method, path or
+body) is refused, and so is a retry that arrives while the first attempt is
+still running.
+
+Responses are kept in memory, per process, for ``ttl`` seconds and at most
+``capacity`` keys. Server errors are not kept, so the client can retry them.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+DEFAULT_CAPACITY = 1000
+DEFAULT_TTL = 24 * 3600
+
+NEW = 'new'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+
+def request_fingerprint(method, path, body):
+    return f"{method} {path} {hashlib.sha256(body).hexdigest()}"
+
+
+class IdempotencyStore:
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.replays = 0
+        # key -> [fingerprint, stored response or None while running, stored_at]
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now, room=0):
+        """Drop expired entries, then the oldest ones until there is room for room more."""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[2] < self.ttl and len(self._entries) + room <= self.capacity:
+                break
+            del self._entries[key]
+
+    def begin(self, key, fingerprint):
+        """Claim key for a request. Returns (state, stored response): NEW, REPLAY, IN_PROGRESS or MISMATCH."""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._expire(now, room=1)
+                self._entries[key] = [fingerprint, None, now]
+                return NEW, None
+            if entry[0] != fingerprint:
+                return MISMATCH, None
+            if entry[1] is None:
+                return IN_PROGRESS, None
+            self.replays += 1
+            return REPLAY, entry[1]
+
+    def complete(self, key, response):
+        """Keep the response of the request that claimed key, for its retries."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = response
+                entry[2] = self.clock()
+                self._entries.move_to_end(key)
+
+    def release(self, key):
+        """Forget a claim whose request failed, so a retry runs again."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._entries), "replays": self.replays, "capacity": self.capacity}
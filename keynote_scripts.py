@@ -0,0 +1,404 @@
+"""The Keynote AppleScript library.
+
+Every script the server runs is defined once here, by name, and takes its
+parameters through ``on run argv`` instead of having values spliced into the
+source. The source of each script therefore never changes, so it is compiled
+once and reused, and a file path containing a quote cannot break it.
+
+``ScriptLibrary.run(name, args)`` hands the script to a runner:
+
+- ``PoolRunner``: the persistent scripting host, whose workers keep compiled
+  scripts cached by source hash for their lifetime;
+- ``SubprocessRunner``: ``osascript``, using ``.scpt`` files compiled with
+  ``osacompile`` by ``warm()`` when available, or the source otherwise;
+- ``RecordingRunner``: records the script names and arguments and answers
+  with canned output, for tests and for running without Keynote.
+
+``warm()`` compiles every script up front, so the first command of a talk
+does not pay for it.
+
+Every call has a timeout (``SCRIPT_TIMEOUTS``, ``DEFAULT_TIMEOUT`` otherwise)
+after which the child process is killed and ``ScriptTimeout`` is raised, e.g.
+when a "Save changes?" dialog leaves Keynote unresponsive. Calls also wait for a
+slot in a ``ConcurrencyGate``, so only a few scripts talk to Keynote at once;
+each lane has its own gate, which keeps the monitor's status polls from queueing
+behind stuck commands. The blocking part of a call goes through ``offload``, which
+the server points at a thread pool so it does not stall the event loop.
+"""
+import contextlib
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from script_host import ScriptHostError, ScriptTimeout
+
+COMPILED_DIR = os.path.join(tempfile.gettempdir(), 'keymote-scripts')
+
+# Seconds a script may run before it is killed. Opening or exporting a large deck takes longer;
+# status polls are kept short so the monitor notices a stuck Keynote quickly.
+DEFAULT_TIMEOUT = 10.0
+SCRIPT_TIMEOUTS = {'status': 5.0, 'open': 60.0, 'snapshot': 60.0, 'slides': 120.0, 'export': 300.0}
+# How many scripts may run at once in each lane. The monitor gets a lane of its own.
+DEFAULT_LIMITS = {'default': 2, 'monitor': 1}
+
+KEYNOTE_SCRIPTS = {
+    # Everything the monitor needs in one call: "closed" or "name||slide||playing".
+    'status': '''
+on run argv
+    tell application "Keynote"
+        if not (exists front document) then
+            return "closed"
+        end if
+        tell front document
+            set doc_name to its name
+            set slide_num to slide number of its current slide
+            set is_playing to playing of application "Keynote"
+            return doc_name & "||" & slide_num & "||" & is_playing
+        end tell
+    end tell
+end run
+''',
+    # Opens and activates a document, then answers like 'snapshot', so opening a deck is a single call.
+    # argv: POSIX path of the document.
+    'open': '''
+on run argv
+    tell application "Keynote"
+        open (POSIX file (item 1 of argv))
+        activate
+        if not (exists front document) then
+            return "closed"
+        end if
+        set is_playing to playing
+        tell front document
+            set doc_name to its name
+            set slide_total to count of slides
+            set slide_num to slide number of its current slide
+            set doc_path to ""
+            try
+                set doc_path to POSIX path of (its file as alias)
+            end try
+        end tell
+        return doc_name & "||" & slide_total & "||" & slide_num & "||" & is_playing & "||" & doc_path
+    end tell
+end run
+''',
+    # Everything a client needs to show a deck, in one call: "closed" or
+    # "name||slide count||slide||playing||path".
+    'snapshot': '''
+on run argv
+    tell application "Keynote"
+        if not (exists front document) then
+            return "closed"
+        end if
+        set is_playing to playing
+        tell front document
+            set doc_name to its name
+            set slide_total to count of slides
+            set slide_num to slide number of its current slide
+            set doc_path to ""
+            try
+                set doc_path to POSIX path of (its file as alias)
+            end try
+        end tell
+        return doc_name & "||" & slide_total & "||" & slide_num & "||" & is_playing & "||" & doc_path
+    end tell
+end run
+''',
+    'count': '''
+on run argv
+    tell application "Keynote" to get count of slides of the front document
+end run
+''',
+    'current': '''
+on run argv
+    tell application "Keynote" to get slide number of the current slide of the front document
+end run
+''',
+    'start': '''
+on run argv
+    tell application "Keynote" to start slideshow of the front document
+end run
+''',
+    'stop': '''
+on run argv
+    tell application "Keynote" to stop slideshow
+end run
+''',
+    'close': '''
+on run argv
+    tell application "Keynote" to close front document
+end run
+''',
+    # Advance by one slide (or build) and return the new slide number.
+    'next': '''
+on run argv
+    tell application "Keynote"
+        if playing is true then
+            show next
+        else
+            if not (exists front document) then error "No presentation open."
+            tell front document
+                set current_slide_number to get slide number of current slide
+                if current_slide_number < (count of slides) then
+                    set current slide to slide (current_slide_number + 1)
+                end if
+            end tell
+        end if
+        return get slide number of the current slide of the front document
+    end tell
+end run
+''',
+    # Go back by one slide (or build) and return the new slide number.
+    'previous': '''
+on run argv
+    tell application "Keynote"
+        if playing is true then
+            show previous
+        else
+            if not (exists front document) then error "No presentation open."
+            tell front document
+                set current_slide_number to get slide number of current slide
+                if current_slide_number > 1 then
+                    set current slide to slide (current_slide_number - 1)
+                end if
+            end tell
+        end if
+        return get slide number of the current slide of the front document
+    end tell
+end run
+''',
+    # argv: slide number. Works both while playing and in edit mode.
+    'goto': '''
+on run argv
+    set slideNumber to (item 1 of argv) as integer
+    tell application "Keynote"
+        if not (exists front document) then error "No presentation open."
+        if playing is true then
+            show slide slideNumber of the front document
+        else
+            set current slide of front document to slide slideNumber of front document
+        end if
+        return get slide number of the current slide of the front document
+    end tell
+end run
+''',
+    # Every slide's content in one call, for timing estimates: one record per slide, separated by
+    # ASCII 30, of "number, skipped, images, movies and audio clips, title, body, presenter notes"
+    # separated by ASCII 31, which slide text does not contain. Reads the front document only, so
+    # it never brings another deck to the front.
+    'slides': '''
+on run argv
+    set fieldSep to character id 31
+    set recordSep to character id 30
+    set output to ""
+    tell application "Keynote"
+        if not (exists front document) then error "No presentation open."
+        tell front document
+            repeat with theSlide in slides
+                set slideTitle to ""
+                set slideBody to ""
+                try
+                    if title showing of theSlide then set slideTitle to object text of default title item of theSlide
+                end try
+                try
+                    if body showing of theSlide then set slideBody to object text of default body item of theSlide
+                end try
+                set slideNotes to presenter notes of theSlide
+                set mediaCount to (count of movies of theSlide) + (count of audio clips of theSlide)
+                if output is not "" then set output to output & recordSep
+                set output to output & (slide number of theSlide as text) & fieldSep & (skipped of theSlide as text) & fieldSep & (count of images of theSlide) & fieldSep & mediaCount & fieldSep & slideTitle & fieldSep & slideBody & fieldSep & slideNotes
+            end repeat
+        end tell
+    end tell
+    return output
+end run
+''',
+    # argv: POSIX path of the document, POSIX path of the output folder.
+    'export': '''
+on run argv
+    set documentPath to item 1 of argv
+    set outputPath to item 2 of argv
+    tell application "Keynote"
+        set theDocument to open (POSIX file documentPath)
+        export theDocument to (POSIX file outputPath) as slide images with properties {image format:PNG, skipped slides:true}
+    end tell
+end run
+''',
+}
+
+
+class KeynoteBusy(Exception):
+    """Raised instead of running a script that would disturb the presenter, e.g. during a slideshow."""
+
+
+class Script:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+class SubprocessRunner:
+    """Runs scripts with osascript, from files precompiled by warm() when osacompile is available."""
+
+    def __init__(self, command=('osascript',), compiled_dir=COMPILED_DIR):
+        self.command = list(command)
+        self.compiled_dir = compiled_dir
+        self._compiled = {}
+
+    def run(self, script, args, check, timeout=None):
+        path = self._compiled.get(script.digest)
+        cmd = self.command + ([path] if path else ['-e', script.source]) + list(args)
+        try:
+            return subprocess.run(cmd, check=check, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # subprocess.run has already killed the child.
+            raise ScriptTimeout(f"Script '{script.name}' did not finish within {timeout} seconds.", script.name, timeout)
+
+    def warm(self, scripts):
+        if shutil.which('osacompile') is None:
+            return 0
+        os.makedirs(self.compiled_dir, exist_ok=True)
+        compiled = 0
+        for script in scripts:
+            path = os.path.join(self.compiled_dir, f"{script.name}-{script.digest}.scpt")
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp.scpt"
+                subprocess.run(['osacompile', '-o', tmp_path, '-e', script.source], check=True, capture_output=True, text=True)
+                os.replace(tmp_path, path)
+            self._compiled[script.digest] = path
+            compiled += 1
+        return compiled
+
+
+class PoolRunner:
+    """Runs scripts on the persistent scripting host."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def run(self, script, args, check, timeout=None):
+        return self.pool.run(script.source, args=args, timeout=timeout, check=check)
+
+    def warm(self, scripts):
+        return self.pool.compile([script.source for script in scripts])
+
+
+class RecordingRunner:
+    """Records (name, args) for every call and answers from responses.
+
+    A response is a string, a callable taking the argument list, or an exception
+    to raise; scripts without one succeed with empty output.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = dict(responses or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, script, args, check, timeout=None):
+        with self._lock:
+            self.calls.append((script.name, list(args)))
+        response = self.responses.get(script.name, '')
+        if isinstance(response, BaseException):
+            raise response
+        if callable(response):
+            response = response(list(args))
+        return subprocess.CompletedProcess(['osascript', script.name] + list(args), 0, stdout=f"{response}\n", stderr='')
+
+    def warm(self, scripts):
+        return 0
+
+
+class ConcurrencyGate:
+    """Lets at most limit callers through at a time.
+
+    Slots are tokens in a queue from queue_factory, so waiting is cooperative when
+    the server passes its async mode's queue.
+    """
+
+    def __init__(self, limit, queue_factory=queue.Queue):
+        self.limit = limit
+        self.in_use = 0
+        self.waited = 0
+        self._slots = queue_factory()
+        for _ in range(limit):
+            self._slots.put(None)
+
+    @contextlib.contextmanager
+    def hold(self, timeout=None):
+        """Hold a slot for the with block. Raises ScriptTimeout if none frees up within timeout seconds."""
+        if self.in_use >= self.limit:
+            self.waited += 1
+        try:
+            self._slots.get(timeout=timeout)
+        except queue.Empty:
+            raise ScriptTimeout(f"Keynote is busy: no script slot freed up within {timeout} seconds.", timeout=timeout)
+        self.in_use += 1
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self._slots.put(None)
+
+
+def run_inline(fn, *args):
+    """The default offload: just call fn."""
+    return fn(*args)
+
+
+class ScriptLibrary:
+    def __init__(self, scripts=None, runner=None, timeouts=None, default_timeout=DEFAULT_TIMEOUT,
+                 limits=None, queue_factory=queue.Queue, offload=run_inline):
+        self.scripts = {name: Script(name, source) for name, source in (scripts or KEYNOTE_SCRIPTS).items()}
+        self.runner = runner or SubprocessRunner()
+        self.timeouts = dict(SCRIPT_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout
+        self.gates = {lane: ConcurrencyGate(limit, queue_factory) for lane, limit in (limits or DEFAULT_LIMITS).items()}
+        self.offload = offload
+        self.compiled = 0
+        self.timed_out = 0
+
+    def timeout_for(self, name):
+        return self.timeouts.get(name, self.default_timeout)
+
+    def run(self, name, args=(), check=True, lane='default'):
+        """Run a script by name with string arguments. Raises KeyError for an unknown script or lane.
+
+        Returns a subprocess.CompletedProcess and raises subprocess.CalledProcessError
+        on failure when check is true, just like subprocess.run. Raises ScriptTimeout,
+        with the script's name as its operation, when no slot in the lane frees up or
+        the script does not finish within its timeout.
+        """
+        script = self.scripts[name]
+        gate = self.gates[lane]
+        timeout = self.timeout_for(name)
+        try:
+            with gate.hold(timeout):
+                return self.offload(self.runner.run, script, [str(arg) for arg in args], check, timeout)
+        except ScriptTimeout as e:
+            self.timed_out += 1
+            e.operation = e.operation or name
+            e.timeout = e.timeout or timeout
+            raise
+
+    def warm(self):
+        """Compile every script now. Returns how many were compiled; failures are only logged."""
+        try:
+            self.compiled = self.runner.warm(list(self.scripts.values()))
+        except (subprocess.CalledProcessError, ScriptHostError, OSError) as e:
+            print(f"Could not precompile Keynote scripts: {e}")
+        return self.compiled
+
+    def stats(self):
+        return {
+            "scripts": len(self.scripts),
+            "compiled": self.compiled,
+            "runner": type(self.runner).__name__,
+            "timed_out": self.timed_out,
+            "lanes": {lane: {"limit": gate.limit, "in_use": gate.in_use, "waited": gate.waited} for lane, gate in self.gates.items()},
+        }
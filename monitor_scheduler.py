@@ -0,0 +1,129 @@
+"""Adaptive polling schedule for the Keynote monitor.
+
+Polling Keynote at a fixed rate is either too slow (a slide change made on the
+Mac keyboard takes up to a full interval to reach the remote) or too wasteful
+(the server keeps running AppleScript all day while nobody is presenting). The
+scheduler polls fast right after a navigation command or a detected change,
+backs off exponentially while nothing happens, and pauses completely while no
+Socket.IO clients are connected and nothing else holds it (such as a session
+being recorded).
+"""
+import threading
+import time
+
+
+class AdaptiveScheduler:
+    def __init__(self, fast_interval=0.15, fast_window=3.0, base_interval=0.5,
+                 playing_max_interval=1.0, idle_max_interval=3.0, closed_max_interval=10.0,
+                 backoff=2.0, event_factory=threading.Event, clock=time.monotonic):
+        self.fast_interval = fast_interval
+        self.fast_window = fast_window
+        self.base_interval = base_interval
+        self.playing_max_interval = playing_max_interval
+        self.idle_max_interval = idle_max_interval
+        self.closed_max_interval = closed_max_interval
+        self.backoff = backoff
+        self.clock = clock
+
+        self.clients = 0
+        self.holds = 0
+        self.polls = 0
+        self.changes_detected = 0
+        self.last_detection_lag = None
+        self.max_detection_lag = 0.0
+        self._total_detection_lag = 0.0
+        self._lag_samples = 0
+        self._quiet_polls = 0
+        self._fast_until = 0.0
+        self._last_poll_at = None
+        self._interval = base_interval
+        self._wake = event_factory()
+        self._clients_present = event_factory()
+
+    # --- Clients ---
+
+    def client_connected(self):
+        self.clients += 1
+        self._clients_present.set()
+
+    def client_disconnected(self):
+        self.clients = max(0, self.clients - 1)
+        if self.clients == 0 and self.holds == 0:
+            self._clients_present.clear()
+
+    def hold(self):
+        """Keep polling without clients until release(), e.g. while a session is being recorded."""
+        self.holds += 1
+        self._clients_present.set()
+
+    def release(self):
+        self.holds = max(0, self.holds - 1)
+        if self.clients == 0 and self.holds == 0:
+            self._clients_present.clear()
+
+    def wait_for_clients(self):
+        """Block while nobody is connected and nothing holds the monitor. Returns True if it was paused."""
+        if self._clients_present.is_set():
+            return False
+        self._clients_present.wait()
+        # Whatever we knew before the pause is stale; start over at full speed.
+        self._last_poll_at = None
+        self.notify_activity()
+        return True
+
+    # --- Scheduling ---
+
+    def notify_activity(self):
+        """Poll fast for a while, e.g. after a navigation command. Wakes a sleeping monitor."""
+        self._fast_until = self.clock() + self.fast_window
+        self._quiet_polls = 0
+        self._wake.set()
+
+    def record_poll(self, status, changed):
+        """Account for one poll and compute the interval until the next one."""
+        now = self.clock()
+        self.polls += 1
+        if changed:
+            self.changes_detected += 1
+            if self._last_poll_at is not None:
+                # The change happened at some point since the previous poll; this is the worst case.
+                lag = now - self._last_poll_at
+                self.last_detection_lag = lag
+                self.max_detection_lag = max(self.max_detection_lag, lag)
+                self._total_detection_lag += lag
+                self._lag_samples += 1
+            self._fast_until = now + self.fast_window
+            self._quiet_polls = 0
+        else:
+            self._quiet_polls += 1
+        self._last_poll_at = now
+
+        if now < self._fast_until:
+            self._interval = self.fast_interval
+        else:
+            if not status.get("document_open"):
+                cap = self.closed_max_interval
+            elif status.get("is_playing"):
+                cap = self.playing_max_interval
+            else:
+                cap = self.idle_max_interval
+            self._interval = min(cap, self.base_interval * self.backoff ** max(0, self._quiet_polls - 1))
+        return self._interval
+
+    def sleep(self, interval=None):
+        """Wait until the next poll is due, or until notify_activity() wakes us up."""
+        self._wake.wait(self._interval if interval is None else interval)
+        self._wake.clear()
+
+    def stats(self):
+        return {
+            "clients": self.clients,
+            "holds": self.holds,
+            "paused": self.clients == 0 and self.holds == 0,
+            "polls": self.polls,
+            "changes_detected": self.changes_detected,
+            "current_interval_seconds": self._interval,
+            "last_detection_lag_seconds": self.last_detection_lag,
+            "max_detection_lag_seconds": self.max_detection_lag,
+            "mean_detection_lag_seconds": self._total_detection_lag / self._lag_samples if self._lag_samples else None,
+        }
@@ -0,0 +1,373 @@
+"""Server-side session recorder: an append-only log of slide transitions.
+
+The Keynote monitor reports every transition it detects (open, play, slide
+change, stop, close), whether or not a browser is connected. Each one is
+appended to the current session's log as one compact JSON line,
+``[milliseconds since the session started, kind, slide number]``, after a
+header line with the presentation, the start time and the recording process.
+Lines are buffered and written every ``flush_records`` records or
+``flush_interval`` seconds, whichever comes first. When the session ends the log is rotated: it is
+gzip-compressed, and new transitions start a new log. Logs live under
+``data/``, outside the static folder the server serves files from.
+
+``SessionAggregates`` replays a log into per-slide totals and visit counts.
+It does this incrementally for the live session and from the file for past
+sessions. Time only counts while the slideshow is playing. Revisits and back
+navigation are visible in the log and counted in the aggregates.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+SESSIONS_DIR = os.path.join('data', 'sessions')
+LOG_VERSION = 1
+
+OPEN = 'o'
+PLAY = 'p'
+SLIDE = 's'
+STOP = 'x'
+CLOSE = 'c'
+KINDS = {OPEN: 'open', PLAY: 'play', SLIDE: 'slide', STOP: 'stop', CLOSE: 'close'}
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+def _slug(presentation_id):
+    stem = os.path.splitext(os.path.basename(presentation_id or 'session'))[0]
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', stem).strip('-.') or 'session'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SessionAggregates:
+    """Per-slide played time and visit counts, built by applying log records in order."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.visits = {}
+        self.back_navigations = 0
+        self.transitions = 0
+        self.duration_ms = 0
+        self._playing = False
+        self._slide = None
+        self._entered_ms = None
+        self._last_visited = None
+
+    def _leave(self, t):
+        if self._playing and self._slide is not None:
+            self.seconds[self._slide] = self.seconds.get(self._slide, 0.0) + (t - self._entered_ms) / 1000
+
+    def _visit(self, slide, t):
+        if slide is not None and slide != self._last_visited:
+            self.visits[slide] = self.visits.get(slide, 0) + 1
+            self._last_visited = slide
+        self._entered_ms = t
+
+    def apply(self, t, kind, slide=None):
+        self.duration_ms = max(self.duration_ms, t)
+        if kind == OPEN:
+            self._slide = slide
+        elif kind == PLAY:
+            self._leave(t)
+            self._playing = True
+            self._slide = slide if slide is not None else self._slide
+            self._visit(self._slide, t)
+        elif kind == SLIDE:
+            self.transitions += 1
+            if self._playing:
+                self._leave(t)
+                if self._slide is not None and slide is not None and slide < self._slide:
+                    self.back_navigations += 1
+                self._slide = slide
+                self._visit(slide, t)
+            else:
+                self._slide = slide
+        elif kind in (STOP, CLOSE):
+            self._leave(t)
+            self._playing = False
+
+    def snapshot(self, now_ms=None):
+        """The aggregates as a dict, counting the slide on screen up to now_ms if the session is still playing."""
+        seconds = dict(self.seconds)
+        if now_ms is not None and self._playing and self._slide is not None:
+            seconds[self._slide] = seconds.get(self._slide, 0.0) + max(0, now_ms - self._entered_ms) / 1000
+        slides = sorted(set(seconds) | set(self.visits))
+        return {
+            "slides": [{"slide": slide, "seconds": round(seconds.get(slide, 0.0), 3), "visits": self.visits.get(slide, 0)}
+                       for slide in slides],
+            "played_seconds": round(sum(seconds.values()), 3),
+            "back_navigations": self.back_navigations,
+            "transitions": self.transitions,
+            "duration_seconds": round(max(self.duration_ms, now_ms or 0) / 1000, 3),
+            "playing": self._playing,
+        }
+
+
+def merge_into_slides(slides, aggregates):
+    """A copy of a presentation's slides with actual times and visit counts from a session's aggregates.
+
+    Slides that were never on screen while playing get no actual time; breaks are kept as they are.
+    """
+    by_slide = {entry["slide"]: entry for entry in aggregates["slides"]}
+    merged = []
+    for slide in slides:
+        slide = dict(slide)
+        if slide.get("slide") != 'BREAK':
+            entry = by_slide.get(slide.get("slide"))
+            slide["actual_time_seconds"] = round(entry["seconds"]) if entry and entry["seconds"] else None
+            slide["visits"] = entry["visits"] if entry else 0
+        merged.append(slide)
+    return merged
+
+
+class SessionRecorder:
+    def __init__(self, directory=SESSIONS_DIR, flush_records=32, flush_interval=2.0, clock=time.time):
+        self.directory = directory
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.pid = os.getpid()
+        self.session_id = None
+        self.presentation_id = None
+        self.records_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self._started_at = None
+        self._aggregates = None
+        self._buffer = []
+        self._buffered_since = None
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.session_id is not None
+
+    def _path(self, session_id, compressed=False):
+        return os.path.join(self.directory, f"{session_id}.log" + (".gz" if compressed else ""))
+
+    # --- Recording ---
+
+    def begin(self, presentation_id, slide_number=None):
+        """Start a session log for a presentation, ending any session in progress. Returns the session ID."""
+        with self._lock:
+            if self.session_id is not None:
+                self._end_locked()
+            self._recover_locked()
+            os.makedirs(self.directory, exist_ok=True)
+            now = self.clock()
+            base = f"{_slug(presentation_id)}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            session_id, n = base, 1
+            while os.path.exists(self._path(session_id)) or os.path.exists(self._path(session_id, True)):
+                n += 1
+                session_id = f"{base}-{n}"
+            self.session_id = session_id
+            self.presentation_id = presentation_id
+            self._started_at = now
+            self._aggregates = SessionAggregates()
+            header = {"v": LOG_VERSION, "session": session_id, "presentation_id": presentation_id,
+                      "started_at": round(now, 3), "pid": self.pid}
+            self._buffer.append(json.dumps(header, separators=(',', ':')) + "\n")
+            self._buffered_since = now
+            self._record_locked(OPEN, slide_number)
+            return session_id
+
+    def record(self, kind, slide_number=None):
+        """Append a transition to the current session; ignored when no session is being recorded."""
+        with self._lock:
+            if self.session_id is None:
+                return False
+            self._record_locked(kind, slide_number)
+            return True
+
+    def _record_locked(self, kind, slide_number):
+        now = self.clock()
+        t = int(round((now - self._started_at) * 1000))
+        self._aggregates.apply(t, kind, slide_number)
+        self._buffer.append(json.dumps([t, kind, slide_number], separators=(',', ':')) + "\n")
+        if self._buffered_since is None:
+            self._buffered_since = now
+        if len(self._buffer) >= self.flush_records or now - self._buffered_since >= self.flush_interval:
+            self._flush_locked()
+
+    def flush_if_due(self):
+        """Write buffered records that have waited flush_interval seconds; the monitor calls this every poll."""
+        with self._lock:
+            if self._buffer and self.clock() - self._buffered_since >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self.session_id is None:
+            return
+        with open(self._path(self.session_id), 'a') as f:
+            f.write(''.join(self._buffer))
+        self.records_written += len(self._buffer)
+        self.flushes += 1
+        self._buffer = []
+        self._buffered_since = None
+
+    def end(self):
+        """Record the close, write and compress the log. Returns (session ID, aggregates), or (None, None)."""
+        with self._lock:
+            if self.session_id is None:
+                return None, None
+            return self._end_locked()
+
+    def _end_locked(self):
+        self._record_locked(CLOSE, None)
+        self._flush_locked()
+        session_id, aggregates = self.session_id, self._aggregates.snapshot()
+        self.session_id = None
+        self.presentation_id = None
+        self._aggregates = None
+        self._rotate(session_id)
+        return session_id, aggregates
+
+    def _rotate(self, session_id):
+        """Compress a finished log next to it, then remove the plain one."""
+        path = self._path(session_id)
+        tmp_path = f"{self._path(session_id, True)}.tmp"
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, self._path(session_id, True))
+        os.remove(path)
+        self.rotations += 1
+
+    def _recover_locked(self):
+        """Compress logs left uncompressed by a server that stopped mid-session.
+
+        A log whose header names another process that is still running is that process's live session; it is left alone.
+        """
+        if self._recovered:
+            return
+        self._recovered = True
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.log'):
+                try:
+                    pid = self._header(os.path.join(self.directory, name), False).get("pid")
+                except (OSError, ValueError):
+                    pid = None
+                if isinstance(pid, int) and pid != self.pid and _process_alive(pid):
+                    continue
+                try:
+                    self._rotate(name[:-len('.log')])
+                except OSError as e:
+                    print(f"Could not compress session log {name}: {e}")
+
+    # --- Reading ---
+
+    def current(self):
+        """The live session's ID, presentation and aggregates so far, or None."""
+        with self._lock:
+            if self.session_id is None:
+                return None
+            now_ms = int(round((self.clock() - self._started_at) * 1000))
+            return {"session": self.session_id, "presentation_id": self.presentation_id,
+                    "started_at": self._started_at, "aggregates": self._aggregates.snapshot(now_ms)}
+
+    def locate(self, session_id):
+        """(path, compressed) of a session's log, or None for an unknown or invalid ID."""
+        if not isinstance(session_id, str) or not _SESSION_ID_RE.match(session_id):
+            return None
+        for compressed in (True, False):
+            path = self._path(session_id, compressed)
+            if os.path.exists(path):
+                return path, compressed
+        return None
+
+    def stream(self, session_id, chunk_size=64 * 1024):
+        """Yield a session's log as uncompressed bytes, in chunks. Buffered records of the live session are written first."""
+        if session_id == self.session_id:
+            self.flush()
+        located = self.locate(session_id)
+        if located is None:
+            raise KeyError(session_id)
+        path, compressed = located
+        with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read(self, session_id):
+        """(header, records) of a session's log, the records as (t, kind, slide) tuples."""
+        lines = b''.join(self.stream(session_id)).decode('utf-8').splitlines()
+        header, records = {}, []
+        for line in lines:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash.
+                continue
+            if isinstance(item, dict):
+                header = item
+            elif isinstance(item, list) and len(item) == 3:
+                records.append(tuple(item))
+        return header, records
+
+    def aggregates(self, session_id):
+        """Per-slide totals and visit counts of a session, recomputed from its log."""
+        if session_id == self.session_id:
+            return self.current()["aggregates"]
+        header, records = self.read(session_id)
+        aggregates = SessionAggregates()
+        for t, kind, slide in records:
+            aggregates.apply(t, kind, slide)
+        return aggregates.snapshot()
+
+    def sessions(self, presentation_id=None):
+        """Recorded sessions, newest first, optionally of one presentation."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        result = []
+        for name in names:
+            if not (name.endswith('.log') or name.endswith('.log.gz')):
+                continue
+            session_id = name[:-len('.log.gz')] if name.endswith('.gz') else name[:-len('.log')]
+            path = os.path.join(self.directory, name)
+            try:
+                header = self._header(path, name.endswith('.gz'))
+                size = os.path.getsize(path)
+            except (OSError, ValueError, EOFError):
+                continue
+            if presentation_id is not None and header.get("presentation_id") != presentation_id:
+                continue
+            result.append({"session": session_id, "presentation_id": header.get("presentation_id"),
+                           "started_at": header.get("started_at"), "compressed": name.endswith('.gz'),
+                           "bytes": size, "live": session_id == self.session_id})
+        result.sort(key=lambda entry: entry["started_at"] or 0, reverse=True)
+        return result
+
+    @staticmethod
+    def _header(path, compressed):
+        with (gzip.open(path, 'rt') if compressed else open(path)) as f:
+            header = json.loads(f.readline() or '{}')
+        return header if isinstance(header, dict) else {}
+
+    def stats(self):
+        with self._lock:
+            return {"session": self.session_id, "buffered": len(self._buffer), "records_written": self.records_written,
+                    "flushes": self.flushes, "rotations": self.rotations}
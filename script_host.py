@@ -0,0 +1,381 @@
+"""Persistent scripting host for Keynote AppleScript calls.
+
+Spawning ``osascript`` for every request pays for a fork/exec and a fresh
+compile of the script source. The pool below keeps a few long-lived worker
+processes around instead. Each worker reads one JSON request per line on
+stdin and answers with one JSON response per line on stdout:
+
+    {"id": 1, "script": "...", "args": [], "timeout": 5.0}
+    {"id": 1, "returncode": 0, "stdout": "...", "stderr": ""}
+
+On macOS the worker compiles scripts once through ``NSAppleScript`` (when
+PyObjC is available) and keeps them cached by source hash for its lifetime; a
+request with ``"compile": true`` only compiles, to warm that cache. Everywhere
+else, or when a custom runner is configured, it falls back to running the runner
+command (``osascript`` by default) for each script. That runner is what lets a
+local stand-in executable replace ``osascript`` for tests and benchmarks.
+"""
+import hashlib
+import itertools
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_RUNNER = ['osascript']
+DEFAULT_TIMEOUT = 10.0
+# Extra time the host waits beyond the per-call timeout before it gives up on
+# a worker, so the worker gets the first chance to kill its own child.
+TIMEOUT_GRACE = 1.0
+
+
+class ScriptHostError(Exception):
+    """Raised when a worker cannot run a script (crash, bad response...)."""
+
+
+class ScriptTimeout(ScriptHostError):
+    """Raised when a script does not finish within its timeout.
+
+    ``operation`` and ``timeout`` say which script timed out after how many seconds, when known.
+    """
+
+    def __init__(self, message, operation=None, timeout=None):
+        super().__init__(message)
+        self.operation = operation
+        self.timeout = timeout
+
+
+def runner_from_env():
+    """Return the runner command configured by ``KEYMOTE_SCRIPT_RUNNER``."""
+    runner = os.environ.get('KEYMOTE_SCRIPT_RUNNER')
+    return shlex.split(runner) if runner else list(DEFAULT_RUNNER)
+
+
+class ScriptWorker:
+    """A single persistent worker process speaking the JSON-lines protocol."""
+
+    def __init__(self, command, env=None):
+        self.command = list(command)
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.calls = 0
+        self._responses = None
+        self._ids = itertools.count(1)
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            env=self.env,
+        )
+        self.started_at = time.monotonic()
+        self.calls = 0
+        self._responses = queue.Queue()
+        reader = threading.Thread(target=self._read_responses, args=(self.process, self._responses), daemon=True)
+        reader.start()
+
+    @staticmethod
+    def _read_responses(process, responses):
+        for line in process.stdout:
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                continue
+        # EOF: the worker exited or crashed.
+        responses.put(None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def call(self, script, args=(), timeout=DEFAULT_TIMEOUT, compile_only=False):
+        """Send one script to the worker and wait for its response."""
+        if not self.alive():
+            raise ScriptHostError("Script worker is not running.")
+
+        request_id = next(self._ids)
+        request = {"id": request_id, "script": script, "args": [str(a) for a in args], "timeout": timeout}
+        if compile_only:
+            request["compile"] = True
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise ScriptHostError(f"Script worker pipe closed: {e}")
+
+        deadline = time.monotonic() + (timeout + TIMEOUT_GRACE if timeout else DEFAULT_TIMEOUT)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ScriptTimeout(f"Script did not finish within {timeout} seconds.", timeout=timeout)
+            try:
+                response = self._responses.get(timeout=remaining)
+            except queue.Empty:
+                raise ScriptTimeout(f"Script did not finish within {timeout} seconds.", timeout=timeout)
+            if response is None:
+                raise ScriptHostError("Script worker exited unexpectedly.")
+            # Stale responses belong to calls that already timed out on our side.
+            if response.get("id") == request_id:
+                self.calls += 1
+                return response
+
+    def ping(self, timeout=2.0):
+        try:
+            response = self.call('', timeout=timeout)
+        except ScriptHostError:
+            return False
+        return response.get("returncode") == 0
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class ScriptHostPool:
+    """A small pool of persistent script workers.
+
+    ``run()`` has the same contract as ``subprocess.run(['osascript', '-e', script])``
+    so callers can keep their existing error handling: it returns a
+    ``subprocess.CompletedProcess`` and raises ``subprocess.CalledProcessError``
+    when ``check`` is true and the script failed. ``FileNotFoundError`` is raised
+    if the runner executable does not exist.
+    """
+
+    def __init__(self, size=2, command=None, runner=None, timeout=DEFAULT_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.runner = list(runner) if runner else runner_from_env()
+        self.command = list(command) if command else [sys.executable, os.path.abspath(__file__)]
+        self.restarts = 0
+        self._env = dict(os.environ, KEYMOTE_SCRIPT_RUNNER=shlex.join(self.runner))
+        self._workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                worker = ScriptWorker(self.command, env=self._env)
+                worker.start()
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self._started = True
+
+    def _restart(self, worker):
+        if worker.alive():
+            worker.process.kill()
+            worker.process.wait()
+        worker.start()
+        self.restarts += 1
+
+    def run(self, script, args=(), timeout=None, check=True):
+        if not self._started:
+            self.start()
+        timeout = timeout or self.timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ScriptTimeout(f"No script worker became free within {timeout} seconds.", timeout=timeout)
+        try:
+            if not worker.alive():
+                self._restart(worker)
+            try:
+                response = worker.call(script, args, timeout=timeout)
+            except ScriptHostError:
+                # The worker crashed or may still be busy with a hung script.
+                self._restart(worker)
+                raise
+        finally:
+            self._idle.put(worker)
+
+        if response.get("error") == "runner_not_found":
+            raise FileNotFoundError(response.get("stderr", "Script runner not found."))
+        if response.get("error") == "timeout":
+            raise ScriptTimeout(f"Script did not finish within {timeout} seconds.", timeout=timeout)
+
+        cmd = self.runner + ['-e', script] + [str(a) for a in args]
+        result = subprocess.CompletedProcess(cmd, response.get("returncode", 1), response.get("stdout", ""), response.get("stderr", ""))
+        if check:
+            result.check_returncode()
+        return result
+
+    def compile(self, scripts):
+        """Compile scripts ahead of time on every worker. Returns how many scripts compiled everywhere."""
+        if not self._started:
+            self.start()
+        # Hold every worker, so each one gets the whole list.
+        workers = [self._idle.get() for _ in range(self.size)]
+        compiled = set(scripts)
+        try:
+            for worker in workers:
+                for script in scripts:
+                    response = worker.call(script, timeout=self.timeout, compile_only=True)
+                    if response.get("returncode") != 0:
+                        compiled.discard(script)
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+        return len(compiled)
+
+    def check_health(self):
+        """Ping idle workers and restart any that are dead or unresponsive."""
+        if not self._started:
+            return
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not worker.alive() or not worker.ping():
+                    self._restart(worker)
+            finally:
+                self._idle.put(worker)
+
+    def health(self):
+        now = time.monotonic()
+        return {
+            "size": self.size,
+            "restarts": self.restarts,
+            "workers": [
+                {
+                    "alive": worker.alive(),
+                    "calls": worker.calls,
+                    "uptime_seconds": round(now - worker.started_at, 1) if worker.started_at else None,
+                }
+                for worker in self._workers
+            ],
+        }
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._started = False
+
+
+# --- Worker process side ---
+
+def _load_nsapplescript():
+    """Return the PyObjC classes needed to run compiled scripts, or None."""
+    try:
+        from Foundation import NSAppleScript, NSAppleEventDescriptor
+    except ImportError:
+        return None
+    return NSAppleScript, NSAppleEventDescriptor
+
+
+def _fourcc(code):
+    return int.from_bytes(code.encode('ascii'), 'big')
+
+
+class _CompiledScripts:
+    """Runs scripts in-process through NSAppleScript, compiling each source once."""
+
+    def __init__(self, classes):
+        self.NSAppleScript, self.NSAppleEventDescriptor = classes
+        self._cache = {}
+
+    def _compiled(self, script):
+        """Return (compiled script, None) or (None, error response)."""
+        key = hashlib.sha256(script.encode('utf-8')).hexdigest()
+        compiled = self._cache.get(key)
+        if compiled is None:
+            compiled = self.NSAppleScript.alloc().initWithSource_(script)
+            ok, error = compiled.compileAndReturnError_(None)
+            if not ok:
+                return None, {"returncode": 1, "stdout": "", "stderr": str(error)}
+            self._cache[key] = compiled
+        return compiled, None
+
+    def compile(self, script):
+        _, error = self._compiled(script)
+        return error or {"returncode": 0, "stdout": "", "stderr": ""}
+
+    def run(self, script, args):
+        compiled, error = self._compiled(script)
+        if error:
+            return error
+
+        descriptors = self.NSAppleEventDescriptor
+        event = descriptors.appleEventWithEventClass_eventID_targetDescriptor_returnID_transactionID_(
+            _fourcc('aevt'), _fourcc('oapp'), descriptors.nullDescriptor(), -1, 0)
+        argv = descriptors.listDescriptor()
+        for index, arg in enumerate(args, 1):
+            argv.insertDescriptor_atIndex_(descriptors.descriptorWithString_(arg), index)
+        event.setParamDescriptor_forKeyword_(argv, _fourcc('----'))
+
+        result, error = compiled.executeAppleEvent_error_(event, None)
+        if result is None:
+            message = error.get('NSAppleScriptErrorMessage', str(error)) if error else 'Script failed.'
+            return {"returncode": 1, "stdout": "", "stderr": str(message)}
+        return {"returncode": 0, "stdout": (result.stringValue() or '') + "\n", "stderr": ""}
+
+
+def _run_with_runner(runner, script, args, timeout):
+    try:
+        result = subprocess.run(runner + ['-e', script] + list(args), capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError as e:
+        return {"returncode": 127, "stdout": "", "stderr": str(e), "error": "runner_not_found"}
+    except subprocess.TimeoutExpired:
+        return {"returncode": -9, "stdout": "", "stderr": "Script timed out.", "error": "timeout"}
+    return {"returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
+
+
+def serve(stdin=None, stdout=None):
+    """Worker main loop: answer JSON-lines requests until stdin closes."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    runner = runner_from_env()
+    compiled = None
+    if runner == DEFAULT_RUNNER:
+        classes = _load_nsapplescript()
+        compiled = _CompiledScripts(classes) if classes else None
+
+    for line in stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        script = request.get("script", "")
+        args = request.get("args", [])
+        if not script:
+            # Empty scripts are health-check pings.
+            response = {"returncode": 0, "stdout": "", "stderr": ""}
+        elif request.get("compile"):
+            # Runners other than NSAppleScript compile on every call; there is nothing to cache.
+            response = compiled.compile(script) if compiled is not None else {"returncode": 0, "stdout": "", "stderr": ""}
+        elif compiled is not None:
+            response = compiled.run(script, args)
+        else:
+            response = _run_with_runner(runner, script, args, request.get("timeout"))
+        response["id"] = request.get("id")
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    serve()
@@ -1,12 +1,193 @@
+import argparse
 import json
 import subprocess
 import os
-from flask import Flask, request, jsonify, send_from_directory
-from flask_socketio import SocketIO
+import sys
+from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 import datetime
+import atexit
+import functools
+import tempfile
+import time
+from script_host import ScriptHostPool, ScriptHostError, ScriptTimeout
+from keynote_scripts import ScriptLibrary, PoolRunner, SubprocessRunner, RecordingRunner, KeynoteBusy
+from status_cache import StatusCache
+from monitor_scheduler import AdaptiveScheduler
+from command_queue import NavigationQueue, NavigationError
+from timings_store import TimingsStore, write_json_atomic
+from history import RehearsalHistory
+from forecast import ForecastEngine
+from slide_content import SlideContentExtractor
+from estimator import TimingEstimator, calibration_samples
+from directory_index import DirectoryIndex, PresentationCrawler
+from assets import AssetManifest
+from boot import BootSequence
+from session_clock import SessionClock
+from event_log import EventLog
+from recorder import SessionRecorder, merge_into_slides, PLAY, SLIDE, STOP
+from idempotency import IdempotencyStore, request_fingerprint, NEW, REPLAY, IN_PROGRESS
+import wire
+from fanout import LeaderLock, message_queue_options, presentation_room
+from metrics import REGISTRY
+from thumbnails import ThumbnailService, ThumbnailCache, KeynoteRenderer, PlaceholderRenderer, VARIANTS, DEFAULT_VARIANT, document_version
 
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Static files are served by send_static below, from the asset pipeline.
+app = Flask(__name__, static_folder=None)
+# A message queue lets other processes (e.g. a write-only SocketIO) emit to this server's clients ('local' for the in-process stand-in).
+MESSAGE_QUEUE = os.environ.get('KEYMOTE_MESSAGE_QUEUE')
+# 'msgpack' encodes every Socket.IO packet as MessagePack; the page tells clients to use the matching parser.
+SOCKETIO_SERIALIZER = os.environ.get('KEYMOTE_SOCKETIO_SERIALIZER', 'json')
+SOCKETIO_OPTIONS = wire.socketio_options(SOCKETIO_SERIALIZER)
+socketio = SocketIO(app, cors_allowed_origins="*", **message_queue_options(MESSAGE_QUEUE), **SOCKETIO_OPTIONS)
+
+# Only one server process may run; it takes this lock at startup (see claim_single_worker).
+LEADER_LOCK_PATH = os.environ.get('KEYMOTE_LEADER_LOCK', os.path.join(tempfile.gettempdir(), 'keymote-monitor.lock'))
+leader_lock = LeaderLock(LEADER_LOCK_PATH)
+
+# Keynote scripts run through a pool of persistent scripting-host workers on macOS.
+# Set KEYMOTE_SCRIPT_HOST=subprocess to spawn one osascript process per call instead, or
+# KEYMOTE_SCRIPT_HOST=record to only record the scripts, e.g. to work on the web app without Keynote.
+SCRIPT_HOST_MODE = os.environ.get('KEYMOTE_SCRIPT_HOST', 'pool' if sys.platform == 'darwin' else 'subprocess')
+SCRIPT_HOST_HEALTH_INTERVAL = 30
+# Every script is defined once in keynote_scripts.py and takes its values as arguments. At most
+# KEYMOTE_SCRIPT_CONCURRENCY scripts talk to Keynote at once, plus one status poll from the monitor,
+# and each is killed after its timeout (KEYMOTE_SCRIPT_TIMEOUT seconds unless keynote_scripts says otherwise).
+SCRIPT_CONCURRENCY = int(os.environ.get('KEYMOTE_SCRIPT_CONCURRENCY', 2))
+SCRIPT_TIMEOUT = float(os.environ.get('KEYMOTE_SCRIPT_TIMEOUT', 10))
+SCRIPT_LANES = {'default': SCRIPT_CONCURRENCY, 'monitor': 1}
+# One worker per lane slot, so slow commands holding every 'default' slot never keep the monitor waiting for a worker.
+SCRIPT_WORKERS = int(os.environ.get('KEYMOTE_SCRIPT_WORKERS', sum(SCRIPT_LANES.values())))
+script_host = ScriptHostPool(size=SCRIPT_WORKERS) if SCRIPT_HOST_MODE == 'pool' else None
+
+def offload_blocking(fn, *args):
+    """Run a blocking call without stalling the server: in eventlet's thread pool, or directly under real threads."""
+    if socketio.async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+if script_host is not None:
+    script_runner = PoolRunner(script_host)
+elif SCRIPT_HOST_MODE == 'record':
+    script_runner = RecordingRunner()
+else:
+    script_runner = SubprocessRunner()
+script_library = ScriptLibrary(runner=script_runner, default_timeout=SCRIPT_TIMEOUT,
+                               limits=SCRIPT_LANES,
+                               queue_factory=socketio.server.eio.create_queue, offload=offload_blocking)
+
+# Read endpoints share the monitor's latest Keynote snapshot while it is younger than this many seconds.
+STATUS_MAX_AGE = float(os.environ.get('KEYMOTE_STATUS_MAX_AGE', 1.0))
+status_cache = StatusCache(max_age=STATUS_MAX_AGE, event_factory=socketio.server.eio.create_event)
+
+# The Keynote monitor polls fast right after activity and backs off while nothing changes (seconds).
+monitor_scheduler = AdaptiveScheduler(
+    fast_interval=float(os.environ.get('KEYMOTE_MONITOR_FAST_INTERVAL', 0.15)),
+    fast_window=float(os.environ.get('KEYMOTE_MONITOR_FAST_WINDOW', 3.0)),
+    playing_max_interval=float(os.environ.get('KEYMOTE_MONITOR_PLAYING_MAX_INTERVAL', 1.0)),
+    idle_max_interval=float(os.environ.get('KEYMOTE_MONITOR_IDLE_MAX_INTERVAL', 3.0)),
+    closed_max_interval=float(os.environ.get('KEYMOTE_MONITOR_CLOSED_MAX_INTERVAL', 10.0)),
+    event_factory=socketio.server.eio.create_event,
+)
+
+# Slide counts only change when slides are added or removed, so predictions can use an older snapshot.
+SLIDE_COUNT_MAX_AGE = 30
+# A client's first snapshot may be the boot's or the monitor's latest while both are younger than this many
+# seconds; the monitor wakes up for the client and pushes whatever changed since.
+WARM_SNAPSHOT_MAX_AGE = float(os.environ.get('KEYMOTE_WARM_SNAPSHOT_MAX_AGE', SLIDE_COUNT_MAX_AGE))
+# How long status reads wait for queued navigation commands before reading anyway (seconds).
+NAVIGATION_READ_WAIT = 2
+
+# Slide timings are held in memory and written behind; this bounds how many seconds of changes a crash can lose.
+TIMINGS_MAX_DATA_LOSS = float(os.environ.get('KEYMOTE_TIMINGS_MAX_DATA_LOSS', 2.0))
+timings_store = TimingsStore(max_data_loss=TIMINGS_MAX_DATA_LOSS)
+# Flush pending timings on shutdown.
+atexit.register(lambda: timings_store.close())
+
+# Directory listings for the file browser, revalidated by mtime, and a background index of .key files for search.
+directory_index = DirectoryIndex()
+PRESENTATION_RECRAWL_INTERVAL = float(os.environ.get('KEYMOTE_PRESENTATION_RECRAWL_INTERVAL', 300))
+presentation_crawler = PresentationCrawler(os.path.expanduser('~'), recrawl_interval=PRESENTATION_RECRAWL_INTERVAL)
+# Largest page the file browser may ask for.
+LIST_PAGE_MAX = 1000
+
+# The presentation clock every client renders from; clients get 'clock' events on transitions only.
+session_clock = SessionClock()
+
+# The latest state events, numbered, so a reconnecting client only fetches what it missed.
+EVENT_LOG_SIZE = int(os.environ.get('KEYMOTE_EVENT_LOG_SIZE', 256))
+event_log = EventLog(capacity=EVENT_LOG_SIZE)
+
+# Every slide transition the monitor sees, per session, for exports that do not depend on a browser being open.
+session_recorder = SessionRecorder(flush_interval=float(os.environ.get('KEYMOTE_RECORDER_FLUSH_INTERVAL', 2.0)))
+# (presentation ID, session ID, aggregates) of the last session that ended, until a close exports it.
+ended_session = None
+
+# Responses to recent timing writes, so a write the client's outbox replays is applied only once.
+idempotency_store = IdempotencyStore(ttl=float(os.environ.get('KEYMOTE_IDEMPOTENCY_TTL', 24 * 3600)))
+
+# Front-end assets, fingerprinted and pre-compressed; fingerprinted URLs are cached by clients for a year.
+asset_manifest = AssetManifest(os.path.dirname(os.path.abspath(__file__)))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Slide thumbnails. Set KEYMOTE_THUMBNAIL_RENDERER=placeholder to serve grey stand-ins without Keynote.
+THUMBNAIL_RENDERER = os.environ.get('KEYMOTE_THUMBNAIL_RENDERER', 'keynote')
+# How many slides ahead of the current one to render in the background.
+THUMBNAIL_PREFETCH = int(os.environ.get('KEYMOTE_THUMBNAIL_PREFETCH', 3))
+THUMBNAIL_CACHE_MB = int(os.environ.get('KEYMOTE_THUMBNAIL_CACHE_MB', 200))
+# Thumbnail URLs carry the document version, so a matching one can be cached for good.
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+thumbnail_service = ThumbnailService(
+    PlaceholderRenderer() if THUMBNAIL_RENDERER == 'placeholder' else KeynoteRenderer(
+        lambda document_path, out_dir: run_applescript('export', require_quiet_front_document(document_path), out_dir),
+        queue_factory=socketio.server.eio.create_queue, offload=offload_blocking),
+    ThumbnailCache(max_bytes=THUMBNAIL_CACHE_MB * 1024 * 1024),
+    spawn=socketio.start_background_task,
+    queue_factory=socketio.server.eio.create_queue,
+)
+
+# Per-slide statistics across the elapsed-time exports written when a presentation closes.
+rehearsal_history = RehearsalHistory()
+
+# Estimated timings for new decks, from their content: read from Keynote in one call per deck, cached per
+# document version, and calibrated on the rehearsal history.
+# Keynote is only asked about the deck it shows, outside slideshows; cached content is served either way.
+# A new deck is registered with NEW_SLIDE_SECONDS per slide and estimated in the background after it opens.
+NEW_SLIDE_SECONDS = 60
+slide_content = SlideContentExtractor(lambda document_path: read_slide_content(document_path))
+timing_estimator = TimingEstimator()
+estimator_calibrated_for = None
+
+# Pace and finish-time projections for the current presentation, blended with the rehearsal history. Clients get
+# a 'forecast' event when the projected total moves by KEYMOTE_FORECAST_THRESHOLD seconds or a new section starts.
+FORECAST_THRESHOLD = float(os.environ.get('KEYMOTE_FORECAST_THRESHOLD', 15))
+FORECAST_HISTORY_WEIGHT = float(os.environ.get('KEYMOTE_FORECAST_HISTORY_WEIGHT', 0.5))
+forecast_engine = ForecastEngine(
+    load=lambda presentation_id: timings_store.get_presentation(presentation_id),
+    history=lambda presentation_id: rehearsal_history.stats(presentation_id),
+    threshold=FORECAST_THRESHOLD,
+    history_weight=FORECAST_HISTORY_WEIGHT,
+)
+
+# Metrics, served at /metrics. Set KEYMOTE_SLOW_CALL_MS to also log every slower Keynote script or timings write.
+if os.environ.get('KEYMOTE_SLOW_CALL_MS'):
+    REGISTRY.slow_call_seconds = float(os.environ['KEYMOTE_SLOW_CALL_MS']) / 1000
+KEYNOTE_SCRIPT_SECONDS = REGISTRY.histogram('keymote_keynote_script_seconds', 'Time spent running Keynote scripts.',
+                                            labels=('operation',), log_slow=True)
+KEYNOTE_SCRIPT_ERRORS = REGISTRY.counter('keymote_keynote_script_errors_total', 'Keynote scripts that failed.',
+                                         labels=('operation',))
+KEYNOTE_SCRIPT_TIMEOUTS = REGISTRY.counter('keymote_keynote_script_timeouts_total',
+                                           'Keynote scripts killed after their timeout or refused while Keynote was busy.',
+                                           labels=('operation',))
+MONITOR_POLLS = REGISTRY.counter('keymote_monitor_polls_total', 'Keynote status polls made by the monitor.')
+MONITOR_LAG = REGISTRY.histogram('keymote_monitor_loop_lag_seconds', 'How late the monitor woke up for its next poll.')
+SOCKETIO_EMITS = REGISTRY.counter('keymote_socketio_emits_total', 'Socket.IO events emitted.', labels=('event',))
+REGISTRY.gauge('keymote_connected_clients', 'Socket.IO clients connected to this worker.', fn=lambda: monitor_scheduler.clients)
+
+# Everything the server warms up at process start, reported by /readyz.
+SERVER_STARTED = time.monotonic()
+boot_sequence = BootSequence()
 
 # To store the background task state
 background_task_started = False
@@ -18,25 +199,49 @@ keynote_state = {
     "document_name": None
 }
 
-def get_keynote_status():
-    """Helper function to get current Keynote status using a single AppleScript call."""
-    script = '''
-    tell application "Keynote"
-        if not (exists front document) then
-            return "closed"
-        end if
-        
-        tell front document
-            set doc_name to its name
-            set slide_num to slide number of its current slide
-            set is_playing to playing of application "Keynote"
-            
-            return doc_name & "||" & slide_num & "||" & is_playing
-        end tell
-    end tell
-    '''
+def run_applescript(name, *args, check=True, lane='default'):
+    """Run a script from the library by name and return a subprocess.CompletedProcess.
+
+    Uses the persistent scripting host when it is enabled, otherwise spawns osascript.
+    Raises subprocess.CalledProcessError on failure when check is true, just like subprocess.run,
+    and ScriptTimeout when the script was killed after its timeout or Keynote was too busy.
+    The call is timed in the keymote_keynote_script_seconds histogram under the script's name.
+    """
+    with KEYNOTE_SCRIPT_SECONDS.time(operation=name):
+        try:
+            result = execute_applescript(name, args, check, lane)
+        except ScriptTimeout:
+            KEYNOTE_SCRIPT_ERRORS.inc(operation=name)
+            KEYNOTE_SCRIPT_TIMEOUTS.inc(operation=name)
+            raise
+        except Exception:
+            KEYNOTE_SCRIPT_ERRORS.inc(operation=name)
+            raise
+    if result.returncode != 0:
+        KEYNOTE_SCRIPT_ERRORS.inc(operation=name)
+    return result
+
+def execute_applescript(name, args=(), check=True, lane='default'):
+    """run_applescript() without the metrics."""
+    return script_library.run(name, args, check=check, lane=lane)
+
+def script_timeout_response(error):
+    """The structured 504 for a Keynote script that timed out, or never got a turn."""
+    return jsonify({
+        "status": "error",
+        "error": "timeout",
+        "operation": error.operation,
+        "timeout_seconds": error.timeout,
+        "message": f"Keynote did not answer within {error.timeout} seconds. Is a dialog open in Keynote?"
+    }), 504
+
+def get_keynote_status(lane='default'):
+    """Helper function to get current Keynote status using a single AppleScript call.
+
+    Raises ScriptTimeout when Keynote does not answer, which does not mean it is closed.
+    """
     try:
-        result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
+        result = run_applescript('status', lane=lane)
         output = result.stdout.strip()
 
         if output == "closed":
@@ -52,16 +257,380 @@ def get_keynote_status():
         is_playing = is_playing_str == 'true'
         
         return {"document_open": True, "is_playing": is_playing, "slide_number": slide_num, "document_name": doc_name}
-    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+    except ScriptTimeout:
+        raise
+    except (subprocess.CalledProcessError, ScriptHostError, ValueError, FileNotFoundError):
         # Keynote not open, or some other error. Treat as closed.
         return {"document_open": False, "is_playing": False, "slide_number": None, "document_name": None}
 
+def parse_keynote_snapshot(output):
+    """Parse the output of the 'snapshot' script: a status dict plus the slide count and document path."""
+    output = output.strip()
+    parts = output.split("||", 4)
+    if output == "closed" or len(parts) < 5:
+        return {"document_open": False, "is_playing": False, "slide_number": None, "document_name": None,
+                "slide_count": None, "document_path": None}
+    doc_name, slide_count_str, slide_num_str, is_playing_str, doc_path = parts
+    return {
+        "document_open": True,
+        "is_playing": is_playing_str == 'true',
+        "slide_number": int(slide_num_str),
+        "document_name": doc_name,
+        "slide_count": int(slide_count_str),
+        # Keynote packages are folders, whose POSIX paths end with a slash; unsaved documents have no path.
+        "document_path": doc_path.rstrip('/') or None,
+    }
+
+def get_keynote_snapshot(document_path=None):
+    """Query the front document's status, slide count and path in a single Keynote call.
+
+    When document_path is given, that document is opened and activated first, in the same call (the 'open' script).
+    Raises like run_applescript, and ValueError if Keynote's answer cannot be parsed.
+    """
+    result = run_applescript('open', document_path) if document_path else run_applescript('snapshot')
+    return parse_keynote_snapshot(result.stdout)
+
+def cache_keynote_snapshot(snapshot):
+    """Share a fresh snapshot with the status and slide count reads, which it answers too."""
+    status_cache.put('snapshot', snapshot)
+    status_cache.put('status', {key: snapshot[key] for key in ("document_open", "is_playing", "slide_number", "document_name")})
+    status_cache.put('slide_count', snapshot["slide_count"])
+
+def read_keynote_snapshot():
+    """get_keynote_snapshot() for reads, treating errors as no open document like get_keynote_status()."""
+    navigation_queue.wait_idle(NAVIGATION_READ_WAIT)
+    try:
+        snapshot = get_keynote_snapshot()
+    except ScriptTimeout:
+        raise
+    except (subprocess.CalledProcessError, ScriptHostError, ValueError, FileNotFoundError):
+        return parse_keynote_snapshot("closed")
+    cache_keynote_snapshot(snapshot)
+    return snapshot
+
+def warm_snapshot():
+    """The latest snapshot with the monitor's latest status on top, or (None, None) when either is too old.
+
+    Only used while the monitor runs, so a client served from here gets any change since as an event.
+    """
+    if not background_task_started:
+        return None, None
+    snapshot, snapshot_age = status_cache.peek('snapshot')
+    status, status_age = status_cache.peek('status')
+    if snapshot is None or status is None or max(snapshot_age, status_age) > WARM_SNAPSHOT_MAX_AGE:
+        return None, None
+    if (status["document_open"], status["document_name"]) != (snapshot["document_open"], snapshot["document_name"]):
+        # Another document since: its slide count and path are unknown.
+        return None, None
+    return dict(snapshot, **status), status_age
+
+def calibrate_estimator():
+    """Refit the timing estimator if the rehearsal history or the known slide content changed since."""
+    global estimator_calibrated_for
+    presentation_ids = rehearsal_history.presentations()
+    token = (rehearsal_history.files_ingested, slide_content.cache.writes)
+    if token == estimator_calibrated_for:
+        return
+
+    def contents(presentation_id):
+        path = resolve_presentation_path(presentation_id)
+        entry = slide_content.cache.latest(path) if path else None
+        return entry["slides"] if entry else None
+
+    timing_estimator.fit(calibration_samples(rehearsal_history, contents, presentation_ids))
+    estimator_calibrated_for = token
+
+def read_slide_content(document_path):
+    """The 'slides' script's output for document_path, which has to be the deck Keynote shows."""
+    require_quiet_front_document(document_path)
+    return run_applescript('slides').stdout
+
+def estimate_slide_timings(document_path):
+    """(slide content, estimated seconds per slide) of a deck.
+
+    Raises KeynoteBusy when the content is not cached and Keynote cannot be asked now, otherwise like run_applescript.
+    """
+    slides = slide_content.extract(document_path)
+    calibrate_estimator()
+    return slides, timing_estimator.estimate(slides)
+
+def apply_slide_estimates(presentation_id, estimates, only_if=None):
+    """Store estimates (slide number -> seconds) in a presentation's timings and tell its clients.
+
+    With only_if, a slide only gets its estimate while its current one is still only_if, so edits made
+    meanwhile are kept. Returns False if the presentation has no timings.
+    """
+    presentation = timings_store.get_presentation(presentation_id)
+    if presentation is None:
+        return False
+    for slide in presentation["slides"]:
+        number = slide.get("slide")
+        if number in estimates and (only_if is None or slide.get("estimated_time_seconds") == only_if):
+            slide["estimated_time_seconds"] = estimates[number]
+    timings_store.put_presentation(presentation_id, presentation)
+    forecast_engine.invalidate(presentation_id)
+    emit_event('timings_updated', {'presentation_id': presentation_id}, presentation_room(presentation_id))
+    if presentation_id == timings_store.current_presentation_id:
+        push_forecast()
+    return True
+
+def estimate_new_presentation(presentation_id, document_path):
+    """A background task that replaces a newly registered deck's default timings with estimates from its content."""
+    try:
+        slides, seconds = estimate_slide_timings(document_path)
+    except (KeynoteBusy, ScriptTimeout, subprocess.CalledProcessError, ScriptHostError, ValueError, OSError) as e:
+        print(f"Could not estimate slide timings for {presentation_id}: {e}")
+        return
+    apply_slide_estimates(presentation_id, {slide["slide"]: estimate for slide, estimate in zip(slides, seconds)},
+                          only_if=NEW_SLIDE_SECONDS)
+
+def require_quiet_front_document(document_path):
+    """Return document_path if it is the deck open in Keynote and no slideshow is playing; raise KeynoteBusy otherwise.
+
+    Guards the scripts that read a whole deck: they hold a script slot for a long time, and pointing them
+    at another deck would bring it to the front in the middle of a talk.
+    """
+    snapshot, _ = status_cache.get('snapshot', read_keynote_snapshot)
+    if snapshot["is_playing"]:
+        raise KeynoteBusy("Keynote is playing a slideshow; try again after it.")
+    if not snapshot["document_path"] or os.path.realpath(snapshot["document_path"]) != os.path.realpath(document_path):
+        raise KeynoteBusy("Open the presentation in Keynote first.")
+    return document_path
+
+def presentation_id_for_path(document_path):
+    """The presentation ID of an absolute document path, or None if it is not under the home directory."""
+    project_root = os.path.expanduser('~')
+    if not document_path or not document_path.startswith(project_root + os.sep):
+        return None
+    return os.path.relpath(document_path, project_root).replace(os.path.sep, '/')
+
+def snapshot_payload(snapshot, presentation_id=None):
+    """The snapshot with the stored timings and clock of its deck, as served by /api/snapshot."""
+    # Taken first, so a client that resyncs from here replays rather than misses events sent meanwhile.
+    position = event_log.position()
+    if presentation_id is None:
+        # Prefer the deck Keynote has open if we know it, e.g. one opened on the Mac itself.
+        presentation_id = presentation_id_for_path(snapshot["document_path"])
+        presentation = timings_store.get_presentation(presentation_id) if presentation_id else None
+        if presentation is None:
+            presentation_id = timings_store.current_presentation_id
+            presentation = timings_store.get_presentation(presentation_id) if presentation_id else None
+    else:
+        presentation = timings_store.get_presentation(presentation_id)
+    return {
+        "status": "success",
+        "keynote": snapshot,
+        "presentation_id": presentation_id,
+        "presentation": presentation,
+        "clock": session_clock.snapshot(),
+        "sync": position
+    }
+
+def session_state():
+    """The clock, Keynote's last known status and the current presentation ID, with the event log position."""
+    position = event_log.position()
+    status, _ = status_cache.peek('status')
+    return {
+        "clock": session_clock.snapshot(),
+        "keynote": status or {"document_open": keynote_state["document_open"],
+                              "is_playing": keynote_state["is_playing"],
+                              "slide_number": keynote_state["last_slide_number"],
+                              "document_name": keynote_state["document_name"]},
+        "presentation_id": timings_store.current_presentation_id,
+        "sync": position
+    }
+
+def resolve_presentation_path(presentation_id):
+    """Absolute path of a presentation ID (relative to the home directory), or None if it escapes it."""
+    project_root = os.path.expanduser('~')
+    if os.path.isabs(presentation_id):
+        return None
+    file_path = os.path.abspath(os.path.join(project_root, presentation_id))
+    if not file_path.startswith(project_root):
+        return None
+    return file_path
+
+def current_room():
+    """The Socket.IO room of the current presentation, or None when there is none."""
+    presentation_id = timings_store.current_presentation_id
+    return presentation_room(presentation_id) if presentation_id else None
+
+def emit_event(event, data=None, room=None):
+    """Number a state event, keep it in the event log and emit it to room (everyone when None)."""
+    SOCKETIO_EMITS.inc(event=event)
+    socketio.emit(event, event_log.append(event, data, room), to=room)
+
+def emit_to_presentation(event, data=None, room=None):
+    """Emit to the clients following the current presentation (everyone if no presentation is current)."""
+    emit_event(event, data, room or current_room())
+
+def emit_clock(changed=True, room=None):
+    """Send the session clock to the presentation's clients after a transition."""
+    if changed:
+        emit_to_presentation('clock', session_clock.snapshot(), room=room)
+
+def emit_slide_update(slide_number):
+    """Tell clients about a new slide and start rendering the thumbnails that come after it."""
+    emit_to_presentation('slide_update', {'slide_number': slide_number})
+    emit_clock(session_clock.slide_changed(slide_number))
+    push_forecast(slide_number)
+    if not THUMBNAIL_PREFETCH or not slide_number:
+        return
+    presentation_id = timings_store.current_presentation_id
+    document_path = resolve_presentation_path(presentation_id) if presentation_id else None
+    if not document_path:
+        return
+    # A deck that still has to be exported waits until the slideshow ends; the export would hold a
+    # script slot for minutes, with navigation queued behind it.
+    status, _ = status_cache.peek('status')
+    try:
+        if status and status["is_playing"] and thumbnail_service.renderer.needs_keynote(document_path):
+            return
+    except OSError:
+        return
+    slide_count, _ = status_cache.peek('slide_count')
+    thumbnail_service.prefetch(document_path, slide_number, THUMBNAIL_PREFETCH, slide_count)
+
+def push_forecast(slide_number=None):
+    """Send the presentation's clients its forecast, when the projection moved enough to matter."""
+    presentation_id = timings_store.current_presentation_id
+    slide_number = slide_number or keynote_state["last_slide_number"]
+    if not presentation_id or not slide_number or slide_number < 1:
+        return
+    try:
+        projection = forecast_engine.changed_projection(presentation_id, slide_number,
+                                                        session_clock.elapsed(), session_clock.slide_elapsed())
+    except Exception as e:
+        print(f"Error projecting the finish time: {e}")
+        return
+    if projection is not None:
+        emit_to_presentation('forecast', projection)
+
+def begin_recording(presentation_id, slide_number=None):
+    """Start a session log; the monitor keeps polling while it records, even with no client connected."""
+    was_recording = session_recorder.active
+    try:
+        session_recorder.begin(presentation_id, slide_number)
+    except OSError as e:
+        print(f"Error starting the session log: {e}")
+        return
+    if not was_recording:
+        monitor_scheduler.hold()
+
+def end_recording():
+    """Close and compress the session log, keeping its aggregates for take_ended_session().
+
+    Returns (session ID, aggregates), or (None, None) if none was recorded.
+    """
+    global ended_session
+    if not session_recorder.active:
+        return None, None
+    presentation_id = session_recorder.presentation_id
+    try:
+        session_id, aggregates = session_recorder.end()
+    except OSError as e:
+        print(f"Error closing the session log: {e}")
+        return None, None
+    finally:
+        monitor_scheduler.release()
+    ended_session = (presentation_id, session_id, aggregates)
+    return session_id, aggregates
+
+def take_ended_session(presentation_id):
+    """(session ID, aggregates) of the last ended session if it recorded presentation_id, else (None, None).
+
+    The monitor ends the session when the deck is closed on the Mac; a later close from a client still merges it.
+    """
+    global ended_session
+    if ended_session is None or ended_session[0] != presentation_id:
+        return None, None
+    _, session_id, aggregates = ended_session
+    ended_session = None
+    return session_id, aggregates
+
+def presentation_id_for_status(status):
+    """The presentation ID of the deck a Keynote status reports.
+
+    That is the current presentation if Keynote shows it, else the deck at the cached snapshot's path, else the
+    document name, for decks outside the home directory.
+    """
+    name = status["document_name"]
+    current = timings_store.current_presentation_id
+    if current and os.path.basename(current) == name:
+        return current
+    snapshot, _ = status_cache.peek('snapshot')
+    if snapshot and snapshot["document_name"] == name:
+        presentation_id = presentation_id_for_path(snapshot["document_path"])
+        if presentation_id:
+            return presentation_id
+    return name
+
+def record_transition(kind, status):
+    """Log a transition the monitor detected in status, starting a session for decks opened outside Keymote."""
+    presentation_id = presentation_id_for_status(status)
+    if session_recorder.active and session_recorder.presentation_id != presentation_id:
+        # Another deck is in front now: its transitions belong to a session of its own.
+        end_recording()
+    if not session_recorder.active:
+        begin_recording(presentation_id, status["slide_number"])
+    try:
+        session_recorder.record(kind, status["slide_number"])
+    except OSError as e:
+        print(f"Error writing the session log: {e}")
+
+def process_keynote_status(status):
+    """Compare a fresh status with the last known state, emit any change and return whether anything changed."""
+    global keynote_state
+
+    # Check if document was closed
+    if keynote_state["document_open"] and not status["document_open"]:
+        print("Keynote presentation closed.")
+        end_recording()
+        emit_to_presentation('presentation_closed')
+        emit_clock(session_clock.reset())
+
+    # Check if presentation was stopped (exited slideshow mode)
+    elif keynote_state["document_open"] and status["document_open"] and keynote_state["is_playing"] and not status["is_playing"]:
+        print("Keynote presentation stopped.")
+        record_transition(STOP, status)
+        emit_to_presentation('presentation_stopped')
+        emit_clock(session_clock.pause())
+
+    # Check if presentation was started (entered play mode)
+    elif keynote_state["document_open"] and status["document_open"] and not keynote_state["is_playing"] and status["is_playing"]:
+        print("Keynote presentation started.")
+        record_transition(PLAY, status)
+        emit_to_presentation('presentation_started')
+        emit_clock(session_clock.start(status['slide_number']))
+
+    # Check for slide change
+    elif status["document_open"] and status["slide_number"] != keynote_state["last_slide_number"]:
+        print(f"Slide changed from {keynote_state['last_slide_number']} to {status['slide_number']}")
+        record_transition(SLIDE, status)
+        emit_slide_update(status['slide_number'])
+
+    new_state = {
+        "document_open": status["document_open"],
+        "is_playing": status["is_playing"],
+        "last_slide_number": status["slide_number"],
+        "document_name": status["document_name"]
+    }
+    changed = new_state != keynote_state
+    keynote_state = new_state
+    return changed
+
 def monitor_keynote_slides():
     """A background task that checks for Keynote state changes and emits updates."""
     global keynote_state
     
-    # Initialize state on first run
-    status = get_keynote_status()
+    # Initialize state on first run, from the boot's snapshot if it is still fresh
+    status, age = status_cache.peek('status')
+    if status is None or age > STATUS_MAX_AGE:
+        try:
+            status = get_keynote_status(lane='monitor')
+        except ScriptTimeout:
+            status = {"document_open": False, "is_playing": False, "slide_number": None, "document_name": None}
+        status_cache.put('status', status)
     keynote_state = {
         "document_open": status["document_open"],
         "is_playing": status["is_playing"],
@@ -70,62 +639,229 @@ def monitor_keynote_slides():
     }
 
     while True:
-        status = get_keynote_status()
-        
-        # Check if document was closed
-        if keynote_state["document_open"] and not status["document_open"]:
-            print("Keynote presentation closed.")
-            socketio.emit('presentation_closed')
-            
-        # Check if presentation was stopped (exited slideshow mode)
-        elif keynote_state["document_open"] and status["document_open"] and keynote_state["is_playing"] and not status["is_playing"]:
-            print("Keynote presentation stopped.")
-            socketio.emit('presentation_stopped')
-
-        # Check if presentation was started (entered play mode)
-        elif keynote_state["document_open"] and status["document_open"] and not keynote_state["is_playing"] and status["is_playing"]:
-            print("Keynote presentation started.")
-            socketio.emit('presentation_started')
-
-        # Check for slide change
-        elif status["document_open"] and status["slide_number"] != keynote_state["last_slide_number"]:
-            print(f"Slide changed from {keynote_state['last_slide_number']} to {status['slide_number']}")
-            socketio.emit('slide_update', {'slide_number': status['slide_number']})
-
-        # Update state for next iteration
-        keynote_state = {
-            "document_open": status["document_open"],
-            "is_playing": status["is_playing"],
-            "last_slide_number": status["slide_number"],
-            "document_name": status["document_name"]
-        }
-        
-        socketio.sleep(1) # Poll every second, as state changes are less frequent than slide advances
+        # Stop polling Keynote entirely while nobody is watching and no session is being recorded.
+        if monitor_scheduler.clients == 0 and monitor_scheduler.holds == 0:
+            print("No clients connected, pausing Keynote monitoring.")
+        monitor_scheduler.wait_for_clients()
+
+        try:
+            # The monitor has a lane of its own, so stuck commands cannot hold up its polls.
+            polled = read_keynote_status(lane='monitor')
+        except ScriptTimeout as e:
+            # Keynote is not answering, e.g. behind a dialog: keep the last known state rather than report it closed.
+            print(f"Keynote status poll timed out after {e.timeout} seconds.")
+            changed = False
+        else:
+            status = polled
+            status_cache.put('status', status)
+            changed = process_keynote_status(status)
+        session_recorder.flush_if_due()
+        MONITOR_POLLS.inc()
+
+        # Poll fast right after activity and back off while the presentation is idle or closed.
+        interval = monitor_scheduler.record_poll(status, changed)
+        slept_at = time.monotonic()
+        monitor_scheduler.sleep()
+        # Waking early for activity is not lag; waking late means the server was too busy to run us.
+        MONITOR_LAG.observe(max(0.0, time.monotonic() - slept_at - interval))
+
+def after_keynote_command(*cache_keys):
+    """Drop stale status snapshots and speed up the monitor after a command changed Keynote's state."""
+    status_cache.invalidate(*cache_keys)
+    monitor_scheduler.notify_activity()
 
 # Route to serve the main HTML file
+def asset_response(asset, immutable):
+    """Serve a built asset in the best encoding the client accepts, answering 304 when its copy is current."""
+    encoding, body = asset.negotiate(request.accept_encodings)
+    response = app.response_class(body, mimetype=asset.mimetype)
+    # Each encoding is a different byte sequence, so it gets its own strong ETag.
+    response.set_etag(f"{asset.etag}-{encoding}" if encoding else asset.etag)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    asset, _ = asset_manifest.lookup('index.html')
+    if asset is None:
+        response = send_from_directory('.', 'index.html')
+    else:
+        response = asset_response(asset, immutable=False)
+    # The Socket.IO parser has to be chosen before connecting, so the page carries it in a cookie.
+    if SOCKETIO_OPTIONS.get('serializer') == 'msgpack':
+        response.set_cookie('keymote_socketio', 'msgpack', samesite='Lax')
+    elif 'keymote_socketio' in request.cookies:
+        response.delete_cookie('keymote_socketio')
+    return response
+
+# Route to serve the service worker, from the root so it controls the whole app
+@app.route('/sw.js')
+def service_worker():
+    version, urls, external = asset_manifest.precache()
+    with open(os.path.join(asset_manifest.root, 'sw.js'), 'rb') as f:
+        source = f.read()
+    # A new build changes these bytes, which makes browsers install the new worker.
+    precache = {"version": version, "urls": urls, "external": external}
+    header = f"self.KEYMOTE_PRECACHE = {json.dumps(precache)};\n".encode('utf-8')
+    response = app.response_class(header + source, mimetype='application/javascript')
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # Route to serve static files (CSS, JS, images)
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
+    asset, immutable = asset_manifest.lookup(f"static/{path}")
+    if asset is None:
+        # Not a front-end asset (e.g. elapsed-time exports); serve it as-is, revalidated by ETag.
+        return send_from_directory('static', path)
+    return asset_response(asset, immutable)
+
+def check_script_host_health():
+    """A background task that restarts crashed or unresponsive scripting-host workers."""
+    while True:
+        socketio.sleep(SCRIPT_HOST_HEALTH_INTERVAL)
+        # Pings wait on the workers' pipes, which would otherwise block every green thread.
+        offload_blocking(script_host.check_health)
+
+def start_background_tasks():
+    """Start the Keynote monitor (and the scripting-host health check) once. Returns True if they were started now."""
+    global background_task_started
+    if background_task_started:
+        return False
+    socketio.start_background_task(target=monitor_keynote_slides)
+    if script_host is not None:
+        socketio.start_background_task(target=check_script_host_health)
+    background_task_started = True
+    return True
 
 @socketio.on('connect')
 def handle_connect():
-    global background_task_started
-    if not background_task_started:
-        socketio.start_background_task(target=monitor_keynote_slides)
-        background_task_started = True
+    monitor_scheduler.client_connected()
+    if start_background_tasks():
         print('Client connected, starting Keynote monitoring.')
     else:
         print('Client connected.')
+    room = current_room()
+    if room:
+        join_room(room)
+    # Late joiners start from the current clock instead of waiting for the next transition.
+    SOCKETIO_EMITS.inc(event='clock')
+    emit('clock', session_clock.snapshot())
+
+@socketio.on('join_presentation')
+def handle_join_presentation(data):
+    """Follow one presentation's events, leaving any other presentation room."""
+    presentation_id = data.get('presentation_id') if isinstance(data, dict) else None
+    if not isinstance(presentation_id, str) or not presentation_id:
+        return {"status": "error", "message": "'presentation_id' is required."}
+    room = presentation_room(presentation_id)
+    for joined in rooms():
+        if joined != room and joined.startswith(presentation_room('')):
+            leave_room(joined)
+    join_room(room)
+    return {"status": "success", "room": room}
+
+@socketio.on('resync')
+def handle_resync(data):
+    """Answer a reconnecting client with the events it missed, or with a snapshot when the log cannot say."""
+    data = data if isinstance(data, dict) else {}
+    seq = data.get('seq')
+    presentation_id = data.get('presentation_id')
+    rooms = (None, presentation_room(presentation_id)) if presentation_id else (None,)
+    events = None
+    if isinstance(seq, int) and not isinstance(seq, bool):
+        events = event_log.since(data.get('epoch'), seq, rooms)
+    if events is not None:
+        return {"status": "success", "sync": event_log.position(), "events": events}
+    # The session state without the slides: the client only reloads those if the presentation changed.
+    return dict(session_state(), status="snapshot")
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    monitor_scheduler.client_disconnected()
     print('Client disconnected')
 
+# API endpoint to get everything a client needs to render the current session in one request
+@app.route('/api/session', methods=['GET'])
+def get_session():
+    try:
+        state = session_state()
+        presentation_id = state["presentation_id"]
+        presentation = timings_store.get_presentation(presentation_id) if presentation_id else None
+        return api_response(dict(state, status="success", presentation=presentation))
+    except Exception as e:
+        print(f"Error loading session: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+# API endpoint to get the open deck and its stored timings in one request, with at most one Keynote call
+@app.route('/api/snapshot', methods=['GET'])
+def get_snapshot():
+    try:
+        snapshot, age = warm_snapshot()
+        if snapshot is None:
+            snapshot, age = status_cache.get('snapshot', read_keynote_snapshot)
+        return api_response(dict(snapshot_payload(snapshot), snapshot_age_ms=int(age * 1000)))
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except Exception as e:
+        print(f"Error loading snapshot: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+# API endpoint to pause the session clock without stopping the slideshow
+@app.route('/api/session/pause', methods=['POST'])
+def pause_session():
+    emit_clock(session_clock.pause())
+    return jsonify({"status": "success", "clock": session_clock.snapshot()})
+
+# API endpoint to correct the session's elapsed time
+@app.route('/api/save_elapsed_time', methods=['POST'])
+def save_elapsed_time():
+    data = request.get_json(silent=True)
+    seconds = data.get('elapsed_seconds') if isinstance(data, dict) else None
+    if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+        return jsonify({"status": "error", "message": "'elapsed_seconds' must be a non-negative number."}), 400
+    emit_clock(session_clock.set_elapsed(seconds))
+    return jsonify({"status": "success", "clock": session_clock.snapshot()})
+
+# API endpoint to export metrics in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# API endpoint to tell a supervisor the process is alive, booted or not
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok", "uptime_seconds": round(time.monotonic() - SERVER_STARTED, 3)})
+
+# API endpoint to tell whether the boot finished, with how long each component took
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    report = boot_sequence.report()
+    if report["ready"]:
+        state = "ready"
+    elif report["done"]:
+        state = "failed"
+    else:
+        state = "starting"
+    return jsonify(dict(report, status=state, monitor=background_task_started)), 200 if report["ready"] else 503
+
+# API endpoint to get the Keynote monitor's polling counters
+@app.route('/api/monitor_stats', methods=['GET'])
+def get_monitor_stats():
+    return jsonify({"status": "success", "monitor": monitor_scheduler.stats(), "navigation": navigation_queue.stats(),
+                    "scripts": script_library.stats(), "events": event_log.stats(), "idempotency": idempotency_store.stats(),
+                    "recorder": session_recorder.stats(), "slide_content": slide_content.stats(),
+                    "worker": {"pid": os.getpid()}})
+
 # API endpoint to list Keynote presentations in the current directory
 @app.route('/api/list_presentations', methods=['GET'])
 def list_presentations():
@@ -143,25 +879,21 @@ def list_presentations():
         if relative_path == '.':
             relative_path = ''
 
-        items = []
-        with os.scandir(current_path) as it:
-            for entry in it:
-                if entry.name.startswith('.'):
-                    continue
-                
-                entry_path = os.path.join(relative_path, entry.name).replace(os.path.sep, '/')
-                if entry.is_dir():
-                    items.append({'name': entry.name, 'type': 'directory', 'path': entry_path})
-                elif entry.is_file() and entry.name.endswith('.key'):
-                    items.append({'name': entry.name, 'type': 'file', 'path': entry_path})
-        
-        # Sort folders first, then files, all alphabetically
-        items.sort(key=lambda x: (x['type'] != 'directory', x['name'].lower()))
-        
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= LIST_PAGE_MAX:
+            return jsonify({"status": "error", "message": f"'limit' must be between 1 and {LIST_PAGE_MAX}."}), 400
+        try:
+            entries, next_cursor = directory_index.page(current_path, request.args.get('cursor'), limit)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        items = [dict(entry, path=os.path.join(relative_path, entry['name']).replace(os.path.sep, '/')) for entry in entries]
+
         return jsonify({
             "status": "success",
             "path": relative_path,
-            "items": items
+            "items": items,
+            "next_cursor": next_cursor
         })
     except FileNotFoundError:
         return jsonify({"status": "error", "message": "Directory not found."}), 404
@@ -169,6 +901,22 @@ def list_presentations():
         print(f"Error listing presentations: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+# API endpoint to search for Keynote files anywhere under the home directory by name
+@app.route('/api/search_presentations', methods=['GET'])
+def search_presentations():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"status": "error", "message": "Search query not provided."}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), LIST_PAGE_MAX)
+
+    presentation_crawler.start()
+    return jsonify({
+        "status": "success",
+        "items": presentation_crawler.search(query, limit),
+        # False until the first crawl has finished; results may be incomplete until then.
+        "complete": presentation_crawler.complete
+    })
+
 # API endpoint to open a Keynote presentation
 @app.route('/api/open_presentation', methods=['POST'])
 def open_presentation():
@@ -195,57 +943,40 @@ def open_presentation():
         return jsonify({"status": "error", "message": f"File '{filename}' not found."}), 404
 
     try:
-        # Step 1: Open the presentation
-        open_script = f'''
-        tell application "Keynote"
-            open "{file_path}"
-            activate
-        end tell
-        '''
-        subprocess.run(['osascript', '-e', open_script], check=True, capture_output=True, text=True)
-
-        # Step 2: Get the slide count of the newly opened presentation
-        count_script = 'tell application "Keynote" to get count of slides of the front document'
-        result = subprocess.run(['osascript', '-e', count_script], check=True, capture_output=True, text=True)
-        slide_count = int(result.stdout.strip())
-
-        # Step 3: Update slide_timings.json
-        timings_path = 'static/slide_timings.json'
-        with open(timings_path, 'r+') as f:
-            timings_data = json.load(f)
-            
-            # Use the relative filename as the presentation ID
-            presentation_id = filename
-            
-            # If the presentation is not already in the file, add it.
-            if presentation_id not in timings_data.get('presentations', {}):
-                timings_data['presentations'][presentation_id] = {
-                    "name": os.path.basename(filename),
-                    "slides": [{"slide": i, "estimated_time_seconds": 60, "actual_time_seconds": None} for i in range(1, slide_count + 1)]
-                }
-            
-            # Update the current presentation ID
-            timings_data['current_presentation_id'] = presentation_id
-            
-            # Go to the beginning of the file to overwrite
-            f.seek(0)
-            json.dump(timings_data, f, indent=2)
-            f.truncate()
+        # Step 1: Open the presentation and read its slide count and current slide, in one Keynote call
+        snapshot = get_keynote_snapshot(file_path)
+        if not snapshot["document_open"]:
+            raise ValueError("Keynote has no document open after opening the presentation.")
+        status_cache.invalidate()
+        cache_keynote_snapshot(snapshot)
+        monitor_scheduler.notify_activity()
 
-        # Step 4: Get the current slide number
-        current_slide_script = 'tell application "Keynote" to get slide number of the current slide of the front document'
-        try:
-            result = subprocess.run(['osascript', '-e', current_slide_script], check=True, capture_output=True, text=True)
-            current_slide_number = int(result.stdout.strip())
-        except Exception:
-            current_slide_number = 1  # Fallback to 1 if unable to get
+        # Step 2: Register the presentation and make it current
+        # Use the relative filename as the presentation ID
+        presentation_id = filename
+        is_new = presentation_id not in timings_store
+        timings_store.open_presentation(presentation_id, os.path.basename(filename), snapshot["slide_count"],
+                                        estimated_time_seconds=NEW_SLIDE_SECONDS)
+        if is_new:
+            # Reading the deck's content can take a while; a new deck opens with defaults and gets its estimates after.
+            socketio.start_background_task(estimate_new_presentation, presentation_id, file_path)
+        forecast_engine.invalidate()
+        begin_recording(presentation_id, snapshot["slide_number"])
+        start_background_tasks()
+        # Tell every device, so followers of the previous presentation can switch rooms.
+        emit_event('presentation_opened', {'presentation_id': presentation_id})
+        # A newly opened presentation starts a new session.
+        emit_clock(session_clock.reset())
 
-        return jsonify({
-            "status": "success",
-            "message": f"Presentation '{filename}' opened and configured successfully.",
-            "current_slide_number": current_slide_number
-        })
+        # The response carries everything the client renders, so it needs no further request.
+        return jsonify(dict(
+            snapshot_payload(snapshot, presentation_id),
+            message=f"Presentation '{filename}' opened and configured successfully.",
+            current_slide_number=snapshot["slide_number"] or 1
+        ))
 
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except subprocess.CalledProcessError as e:
         # This can happen if Keynote is not installed or another issue occurs.
         return jsonify({"status": "error", "message": f"Failed to open or get info from presentation. Is Keynote installed? Error: {e.stderr.strip()}"}), 500
@@ -259,32 +990,339 @@ def open_presentation():
         print(f"Error opening presentation: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+def request_payload():
+    """The request body, from MessagePack or JSON depending on its Content-Type; None if it cannot be decoded."""
+    if wire.is_msgpack(request.mimetype):
+        if not wire.available():
+            return None
+        try:
+            return wire.unpackb(request.get_data())
+        except Exception:
+            return None
+    return request.get_json(silent=True)
+
+def api_response(payload, status=200):
+    """payload as MessagePack if the client prefers it and we can, as JSON otherwise."""
+    if wire.prefers_msgpack(request.accept_mimetypes):
+        response = app.response_class(wire.packb(payload), status=status, mimetype=wire.MSGPACK)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
+
+def idempotent(view):
+    """Answer a retried write (same Idempotency-Key) with the first attempt's response instead of running it again."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        state, stored = idempotency_store.begin(key, request_fingerprint(request.method, request.path, request.get_data()))
+        if state == REPLAY:
+            body, status, mimetype = stored
+            response = app.response_class(body, status=status, mimetype=mimetype)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        if state == IN_PROGRESS:
+            return jsonify({"status": "error", "message": "A request with this Idempotency-Key is still being processed."}), 409
+        if state != NEW:
+            return jsonify({"status": "error", "message": "This Idempotency-Key was already used for a different request."}), 422
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(key)
+            raise
+        if response.status_code >= 500:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, (response.get_data(), response.status_code, response.mimetype))
+        return response
+    return wrapper
+
 # API endpoint to save slide timings
 @app.route('/api/save_timings', methods=['POST'])
+@idempotent
 def save_timings():
     try:
-        data = request.get_json()
+        data = request_payload()
         # Basic validation
         if not isinstance(data, dict):
             return jsonify({"status": "error", "message": "Invalid data format. Expected a dictionary."}), 400
         
-        with open('static/slide_timings.json', 'w') as f:
-            json.dump(data, f, indent=2)
+        timings_store.save(data)
+        forecast_engine.invalidate()
             
         return jsonify({"status": "success", "message": "Timings saved successfully."})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         # Log the error for debugging
         print(f"Error saving timings: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+# API endpoint to get every presentation's timings in one document (reads every shard)
+@app.route('/api/timings', methods=['GET'])
+def get_timings():
+    try:
+        response = api_response(timings_store.load())
+        response.add_etag()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Error loading timings: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+def conditional_response(payload, etag):
+    """api_response with an ETag, answering 304 Not Modified when the client's copy is current."""
+    response = api_response(payload)
+    # Each representation needs its own validator.
+    response.set_etag(f"{etag}-mp" if response.mimetype == wire.MSGPACK else etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# API endpoint to list presentations without loading their slides
+@app.route('/api/presentations', methods=['GET'])
+def list_presentation_timings():
+    try:
+        etag = timings_store.index_etag()
+        index = timings_store.index()
+        return conditional_response(dict(index, status="success"), etag)
+    except Exception as e:
+        print(f"Error loading presentation index: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+# API endpoint to get one presentation's slide timings
+@app.route('/api/presentations/<path:presentation_id>', methods=['GET'])
+def get_presentation_timings(presentation_id):
+    try:
+        etag = timings_store.presentation_etag(presentation_id)
+        presentation = timings_store.get_presentation(presentation_id)
+    except Exception as e:
+        print(f"Error loading presentation timings: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+    if presentation is None:
+        return jsonify({"status": "error", "message": f"Presentation '{presentation_id}' not found."}), 404
+    return conditional_response({"status": "success", "id": presentation_id, "presentation": presentation}, etag)
+
+# API endpoint to replace one presentation's slide timings, e.g. after adding or removing breaks
+@app.route('/api/presentations/<path:presentation_id>', methods=['PUT'])
+@idempotent
+def put_presentation_timings(presentation_id):
+    presentation = request_payload()
+    if not isinstance(presentation, dict) or not isinstance(presentation.get('slides'), list):
+        return jsonify({"status": "error", "message": "Invalid data format. Expected a presentation with a list of slides."}), 400
+
+    try:
+        timings_store.put_presentation(presentation_id, presentation)
+        # Adding or removing a break changes the rows, so the forecast is rebuilt.
+        forecast_engine.invalidate(presentation_id)
+        if presentation_id == timings_store.current_presentation_id:
+            push_forecast()
+        return jsonify({"status": "success", "message": "Timings saved successfully."})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error saving presentation timings: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+# API endpoint to list the sessions the recorder logged, newest first
+@app.route('/api/sessions', methods=['GET'])
+def list_recorded_sessions():
+    try:
+        sessions = session_recorder.sessions(request.args.get('presentation_id'))
+        return jsonify({"status": "success", "sessions": sessions, "current": session_recorder.current()})
+    except Exception as e:
+        print(f"Error listing recorded sessions: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+def resolve_session_id(session_id):
+    """'current' names the session being recorded."""
+    return session_recorder.session_id if session_id == 'current' else session_id
+
+# API endpoint to get a recorded session's per-slide totals, visit counts and back navigations
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_recorded_session(session_id):
+    session_id = resolve_session_id(session_id)
+    if session_recorder.locate(session_id) is None and session_id != session_recorder.session_id:
+        return jsonify({"status": "error", "message": "Session not found."}), 404
+    try:
+        return jsonify({"status": "success", "session": session_id, "aggregates": session_recorder.aggregates(session_id)})
+    except Exception as e:
+        print(f"Error reading session log: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+# API endpoint to replay a session: its transition log as newline-delimited JSON, streamed
+@app.route('/api/sessions/<session_id>/log', methods=['GET'])
+def stream_session_log(session_id):
+    session_id = resolve_session_id(session_id)
+    if session_id == session_recorder.session_id:
+        session_recorder.flush()
+    located = session_recorder.locate(session_id)
+    if located is None:
+        return jsonify({"status": "error", "message": "Session not found."}), 404
+    path, compressed = located
+    if compressed and request.accept_encodings['gzip'] > 0:
+        # Finished logs are already gzipped: send them as they are.
+        response = send_file(os.path.abspath(path), mimetype='application/x-ndjson', conditional=True)
+        response.content_encoding = 'gzip'
+    else:
+        response = app.response_class(session_recorder.stream(session_id), mimetype='application/x-ndjson')
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename="{session_id}.ndjson"'
+    return response
+
+# API endpoint to get the current presentation's pace and projected finish time
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    presentation_id = timings_store.current_presentation_id
+    if not presentation_id:
+        return jsonify({"status": "success", "forecast": None, "message": "No presentation is open."})
+    slide_number = request.args.get('slide', type=int) or keynote_state["last_slide_number"]
+    if not slide_number or slide_number < 1:
+        slide_number = 1
+    try:
+        projection = forecast_engine.project(presentation_id, slide_number,
+                                             session_clock.elapsed(), session_clock.slide_elapsed())
+    except Exception as e:
+        print(f"Error projecting the finish time: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+    if projection is None:
+        return jsonify({"status": "error", "message": f"Slide {slide_number} not found."}), 404
+    return jsonify({"status": "success", "forecast": projection})
+
+# API endpoint to get per-slide statistics across past rehearsals of a presentation
+@app.route('/api/presentations/<path:presentation_id>/stats', methods=['GET'])
+def presentation_stats(presentation_id):
+    last = request.args.get('last', type=int)
+    if last is not None and last < 1:
+        return jsonify({"status": "error", "message": "'last' must be a positive number of sessions."}), 400
+
+    try:
+        stats = rehearsal_history.stats(presentation_id, last=last)
+    except Exception as e:
+        print(f"Error computing rehearsal statistics: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+    if stats is None:
+        return jsonify({"status": "error", "message": f"No rehearsal history for '{presentation_id}'."}), 404
+    return jsonify(dict(stats, status="success"))
+
+# API endpoint to estimate a presentation's slide timings from its content, and store them if asked to
+@app.route('/api/presentations/<path:presentation_id>/estimate', methods=['POST'])
+def estimate_presentation_timings(presentation_id):
+    file_path = resolve_presentation_path(presentation_id)
+    if file_path is None:
+        return jsonify({"status": "error", "message": "Invalid presentation ID."}), 400
+    if not os.path.isfile(file_path):
+        return jsonify({"status": "error", "message": f"File '{presentation_id}' not found."}), 404
+    data = request.get_json(silent=True)
+    apply = isinstance(data, dict) and data.get('apply') is True
+
+    try:
+        slides, seconds = estimate_slide_timings(file_path)
+    except KeynoteBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except FileNotFoundError:
+        return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
+    except (subprocess.CalledProcessError, ScriptHostError, ValueError) as e:
+        print(f"Error reading slide content: {e}")
+        return jsonify({"status": "error", "message": "Could not read the slides from Keynote."}), 500
+    suggestions = [{"slide": slide["slide"], "estimated_time_seconds": estimate, "title": slide["title"],
+                    "skipped": slide["skipped"]} for slide, estimate in zip(slides, seconds)]
+
+    if apply:
+        by_number = {suggestion["slide"]: suggestion["estimated_time_seconds"] for suggestion in suggestions}
+        if not apply_slide_estimates(presentation_id, by_number):
+            return jsonify({"status": "error", "message": f"No timings stored for '{presentation_id}'."}), 404
+
+    return jsonify({"status": "success", "presentation_id": presentation_id, "applied": apply,
+                    "slides": suggestions, "estimator": timing_estimator.stats()})
+
+# API endpoint to get what a client needs to build versioned thumbnail URLs for a presentation
+@app.route('/api/thumbnails/<path:presentation_id>', methods=['GET'])
+def thumbnail_manifest(presentation_id):
+    document_path = resolve_presentation_path(presentation_id)
+    if document_path is None:
+        return jsonify({"status": "error", "message": "Access denied."}), 403
+    try:
+        version = document_version(document_path)
+    except FileNotFoundError:
+        return jsonify({"status": "error", "message": f"Presentation '{presentation_id}' not found."}), 404
+    return jsonify({"status": "success", "version": version, "variants": VARIANTS, "default_variant": DEFAULT_VARIANT})
+
+# API endpoint to get one slide's thumbnail image
+@app.route('/api/thumbnails/<path:presentation_id>/<int:slide_number>', methods=['GET'])
+def slide_thumbnail(presentation_id, slide_number):
+    variant = request.args.get('size', DEFAULT_VARIANT)
+    if variant not in VARIANTS:
+        return jsonify({"status": "error", "message": f"Unknown size '{variant}'."}), 400
+    document_path = resolve_presentation_path(presentation_id)
+    if document_path is None:
+        return jsonify({"status": "error", "message": "Access denied."}), 403
+
+    try:
+        path, etag = thumbnail_service.get(document_path, slide_number, variant)
+    except FileNotFoundError:
+        return jsonify({"status": "error", "message": f"Presentation '{presentation_id}' not found."}), 404
+    except IndexError:
+        return jsonify({"status": "error", "message": f"Slide {slide_number} not found."}), 404
+    except KeynoteBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except subprocess.CalledProcessError as e:
+        return jsonify({"status": "error", "message": f"Failed to render slide. Is Keynote installed? Error: {e.stderr.strip()}"}), 500
+    except Exception as e:
+        print(f"Error rendering thumbnail: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
+    response = send_file(os.path.abspath(path), mimetype='image/png', etag=etag, conditional=True)
+    if request.args.get('v') == document_version(document_path):
+        # The URL names this exact document version, so its image can never change.
+        response.cache_control.public = True
+        response.cache_control.max_age = THUMBNAIL_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+# API endpoint to update one slide's timings without rewriting the whole timings file
+@app.route('/api/presentations/<path:presentation_id>/slides/<int:index>', methods=['PATCH'])
+@idempotent
+def patch_slide_timing(presentation_id, index):
+    changes = request_payload()
+    if not isinstance(changes, dict):
+        return jsonify({"status": "error", "message": "Invalid data format. Expected a dictionary."}), 400
+
+    try:
+        slide = timings_store.patch_slide(presentation_id, index, changes)
+        forecast_engine.update_row(presentation_id, index, slide)
+        if presentation_id == timings_store.current_presentation_id:
+            push_forecast()
+        return jsonify({"status": "success", "slide": slide})
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Presentation '{presentation_id}' not found."}), 404
+    except IndexError:
+        return jsonify({"status": "error", "message": f"Slide index {index} not found."}), 404
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error saving slide timing: {e}")
+        return jsonify({"status": "error", "message": "An internal error occurred."}), 500
+
 # API endpoint to start Keynote presentation
 @app.route('/api/start_presentation', methods=['POST'])
 def start_presentation():
     try:
-        # This AppleScript command tells Keynote to start the slideshow of the frontmost document.
-        script = 'tell application "Keynote" to start slideshow of the front document'
-        subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
+        # Start the slideshow of the frontmost document.
+        run_applescript('start')
+        after_keynote_command('status')
+        emit_clock(session_clock.start())
         return jsonify({"status": "success", "message": "Presentation started successfully."})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except subprocess.CalledProcessError as e:
         # This error is triggered if the AppleScript returns a non-zero exit code,
         # for example, if Keynote is not open or no presentation is loaded.
@@ -301,10 +1339,13 @@ def start_presentation():
 @app.route('/api/stop_presentation', methods=['POST'])
 def stop_presentation():
     try:
-        # This AppleScript command tells Keynote to stop the current slideshow.
-        script = 'tell application "Keynote" to stop slideshow'
-        subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
+        # Stop the current slideshow.
+        run_applescript('stop')
+        after_keynote_command('status')
+        emit_clock(session_clock.pause())
         return jsonify({"status": "success", "message": "Presentation stopped successfully."})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except subprocess.CalledProcessError as e:
         # This error can occur if there is no slideshow currently running. It's safe to ignore.
         return jsonify({"status": "success", "message": "Presentation already stopped or no slideshow running."})
@@ -324,30 +1365,37 @@ def close_presentation():
         elapsed_dir = os.path.join('static', 'elapsed_times')
         os.makedirs(elapsed_dir, exist_ok=True)
         
-        timings_path = os.path.join('static', 'slide_timings.json')
-        with open(timings_path, 'r+') as f:
-            timings_data = json.load(f)
-            presentation_id = timings_data.get('current_presentation_id')
-
-            if presentation_id and presentation_id in timings_data.get('presentations', {}):
-                # Save the final timings
-                export_data = timings_data['presentations'][presentation_id]
-                base_name = os.path.splitext(os.path.basename(presentation_id))[0]
-                timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-                out_path = os.path.join(elapsed_dir, f'{base_name}_elapsed_{timestamp}.json')
-                with open(out_path, 'w') as outf:
-                    json.dump(export_data, outf, indent=2)
-
-            # Reset the current presentation ID
-            timings_data['current_presentation_id'] = None
-            f.seek(0)
-            json.dump(timings_data, f, indent=2)
-            f.truncate()
+        room = current_room()
+        end_recording()
+        presentation_id, presentation = timings_store.close_current()
+        # This session, or the one the monitor ended when the deck was closed on the Mac.
+        session_id, aggregates = take_ended_session(presentation_id)
+        forecast_engine.invalidate()
+        if presentation is not None:
+            # Actual times come from the server's transition log; the browser's timings only if nothing was played.
+            slides, source = presentation.get("slides", []), "client"
+            if aggregates and aggregates["played_seconds"] > 0:
+                slides, source = merge_into_slides(slides, aggregates), "recorder"
+            # Save the final timings, with enough context for the rehearsal history to group sessions
+            export_data = dict(presentation, slides=slides, presentation_id=presentation_id,
+                               presentation_name=presentation.get("name"),
+                               exported_at=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                               session=session_id, source=source)
+            if source == "recorder":
+                export_data["back_navigations"] = aggregates["back_navigations"]
+            base_name = os.path.splitext(os.path.basename(presentation_id))[0]
+            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            out_path = os.path.join(elapsed_dir, f'{base_name}_elapsed_{timestamp}.json')
+            write_json_atomic(out_path, export_data, indent=2, kind='export')
 
         # Now close the Keynote document
-        script = 'tell application "Keynote" to close front document'
-        subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
+        navigation_queue.clear()
+        emit_clock(session_clock.reset(), room=room)
+        run_applescript('close')
+        after_keynote_command()
         return jsonify({"status": "success", "message": "Presentation closed successfully."})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except subprocess.CalledProcessError:
         # This can happen if no document is open, which is a success from our perspective.
         return jsonify({"status": "success", "message": "No presentation was open."})
@@ -357,37 +1405,76 @@ def close_presentation():
         print(f"Error closing presentation: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+def keynote_next_slide():
+    """Advance Keynote by one slide (or build) and return the new slide number."""
+    result = run_applescript('next')
+    return int(result.stdout.strip())
+
+def keynote_previous_slide():
+    """Move Keynote back by one slide (or build) and return the new slide number."""
+    result = run_applescript('previous')
+    return int(result.stdout.strip())
+
+def keynote_goto_slide(slide_number):
+    """Show a specific slide in Keynote, while playing or in edit mode, and return the new slide number."""
+    result = run_applescript('goto', slide_number)
+    return int(result.stdout.strip())
+
+def execute_navigation(command, target):
+    """Run one (possibly coalesced) navigation command from the queue."""
+    if command == 'next':
+        return keynote_next_slide()
+    if command == 'previous':
+        return keynote_previous_slide()
+    return keynote_goto_slide(target)
+
+def navigation_position():
+    """Return (current_slide_number, slide_count) used to predict where navigation lands."""
+    status, _ = status_cache.get('status', get_keynote_status)
+    if not status["document_open"]:
+        return None, None
+    slide_count, _ = status_cache.get('slide_count', fetch_slide_count, max_age=SLIDE_COUNT_MAX_AGE)
+    return status["slide_number"], slide_count
+
+def confirm_navigation(pending, slide_number):
+    """Record where Keynote landed after a queued command and confirm it to clients."""
+    status, _ = status_cache.peek('status')
+    if status is not None and status["document_open"]:
+        status_cache.put('status', dict(status, slide_number=slide_number))
+    else:
+        status_cache.invalidate('status')
+    monitor_scheduler.notify_activity()
+
+    # Update the monitor's state too, so it does not report the same change a second time.
+    if keynote_state["last_slide_number"] != slide_number:
+        keynote_state["last_slide_number"] = slide_number
+        emit_slide_update(slide_number)
+
+def navigation_failed(pending, error):
+    print(f"Error running queued navigation ({pending['command']} to slide {pending['target']}): {error}")
+    after_keynote_command('status')
+
+def read_keynote_status(lane='default'):
+    """get_keynote_status() for status reads, which give queued navigation commands priority."""
+    navigation_queue.wait_idle(NAVIGATION_READ_WAIT)
+    return get_keynote_status(lane)
+
 # API endpoint to advance to the next slide
 @app.route('/api/next_slide', methods=['POST'])
 def next_slide():
     try:
-        # This AppleScript command advances the slide and returns the new slide number.
-        script = """
-        tell application "Keynote"
-            if playing is true then
-                show next
-            else
-                if not (exists front document) then error "No presentation open."
-                tell front document
-                    set current_slide_number to get slide number of current slide
-                    if current_slide_number < (count of slides) then
-                        set current slide to slide (current_slide_number + 1)
-                    end if
-                end tell
-            end if
-            return get slide number of the current slide of the front document
-        end tell
-        """
-        result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
-        slide_number = int(result.stdout.strip())
-        return jsonify({"status": "success", "message": "Moved to next slide.", "slide_number": slide_number})
-    except subprocess.CalledProcessError as e:
+        # Acknowledge right away with the predicted slide; the slide_update event confirms it.
+        slide_number = navigation_queue.submit('next')
+        return jsonify({"status": "success", "message": "Moving to next slide.", "slide_number": slide_number, "predicted": True})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except NavigationError as e:
         # This error can occur if Keynote is not open or no presentation is loaded.
-        return jsonify({"status": "error", "message": f"Failed to move to next slide. Is a presentation open? Error: {e.stderr.strip()}"}), 500
+        return jsonify({"status": "error", "message": f"Failed to move to next slide. Is a presentation open? Error: {e}"}), 500
     except FileNotFoundError:
         return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
     except ValueError:
-        return jsonify({"status": "error", "message": "Failed to parse slide number from Keynote."}), 500
+        return jsonify({"status": "error", "message": "Failed to parse slide count from Keynote."}), 500
     except Exception as e:
         print(f"Error moving to next slide: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
@@ -396,33 +1483,18 @@ def next_slide():
 @app.route('/api/previous_slide', methods=['POST'])
 def previous_slide():
     try:
-        # This AppleScript command goes to the previous slide and returns the new slide number.
-        script = """
-        tell application "Keynote"
-            if playing is true then
-                show previous
-            else
-                if not (exists front document) then error "No presentation open."
-                tell front document
-                    set current_slide_number to get slide number of current slide
-                    if current_slide_number > 1 then
-                        set current slide to slide (current_slide_number - 1)
-                    end if
-                end tell
-            end if
-            return get slide number of the current slide of the front document
-        end tell
-        """
-        result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
-        slide_number = int(result.stdout.strip())
-        return jsonify({"status": "success", "message": "Moved to previous slide.", "slide_number": slide_number})
-    except subprocess.CalledProcessError as e:
+        # Acknowledge right away with the predicted slide; the slide_update event confirms it.
+        slide_number = navigation_queue.submit('previous')
+        return jsonify({"status": "success", "message": "Moving to previous slide.", "slide_number": slide_number, "predicted": True})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except NavigationError as e:
         # This error can occur if Keynote is not open or no presentation is loaded.
-        return jsonify({"status": "error", "message": f"Failed to move to previous slide. Is a presentation open? Error: {e.stderr.strip()}"}), 500
+        return jsonify({"status": "error", "message": f"Failed to move to previous slide. Is a presentation open? Error: {e}"}), 500
     except FileNotFoundError:
         return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
     except ValueError:
-        return jsonify({"status": "error", "message": "Failed to parse slide number from Keynote."}), 500
+        return jsonify({"status": "error", "message": "Failed to parse slide count from Keynote."}), 500
     except Exception as e:
         print(f"Error moving to previous slide: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
@@ -431,21 +1503,18 @@ def previous_slide():
 @app.route('/api/current_slide_number', methods=['GET'])
 def get_current_slide_number():
     try:
-        # This AppleScript gets the slide number of the currently visible slide in the frontmost presentation.
-        script = 'tell application "Keynote" to get slide number of the current slide of the front document'
-        result = subprocess.run(['osascript', '-e', script], capture_output=True, text=True)
-        
-        if result.returncode != 0:
+        # Served from the monitor's latest status snapshot when it is fresh enough.
+        status, age = status_cache.get('status', read_keynote_status)
+        age_ms = int(age * 1000)
+
+        if not status["document_open"]:
             # This can happen if Keynote is not open or no presentation is loaded.
             # It's not a server error, but a state where no slide is active.
-            return jsonify({"status": "success", "slide_number": None, "message": "No active presentation in Keynote."})
+            return jsonify({"status": "success", "slide_number": None, "message": "No active presentation in Keynote.", "snapshot_age_ms": age_ms})
 
-        slide_number = int(result.stdout.strip())
-        return jsonify({"status": "success", "slide_number": slide_number})
-    except FileNotFoundError:
-        return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
-    except ValueError:
-        return jsonify({"status": "error", "message": "Failed to parse slide number from Keynote."}), 500
+        return jsonify({"status": "success", "slide_number": status["slide_number"], "snapshot_age_ms": age_ms})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except Exception as e:
         print(f"Error getting slide number: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
@@ -454,47 +1523,40 @@ def get_current_slide_number():
 @app.route('/api/goto_slide/<int:slide_number>', methods=['POST'])
 def goto_slide(slide_number):
     try:
-        # This AppleScript command tells Keynote to go to a specific slide number,
-        # handling both presentation and edit modes.
-        script = f'''
-        tell application "Keynote"
-            if not (exists front document) then error "No presentation open."
-            
-            if playing is true then
-                show slide {slide_number} of the front document
-            else
-                set current slide of front document to slide {slide_number} of front document
-            end if
-
-            return get slide number of the current slide of the front document
-        end tell
-        '''
-        result = subprocess.run(['osascript', '-e', script], check=True, capture_output=True, text=True)
-        new_slide_number = int(result.stdout.strip())
-        return jsonify({"status": "success", "message": f"Moved to slide {new_slide_number}.", "slide_number": new_slide_number})
-    except (subprocess.CalledProcessError, ValueError) as e:
-        error_message = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) else str(e)
-        # This error can occur if there is no slideshow running or the slide number is invalid.
-        return jsonify({"status": "error", "message": f"Failed to move to slide {slide_number}. Is a presentation open and the slide number valid? Error: {error_message}"}), 500
+        # Supersedes any navigation still queued; the slide_update event confirms where Keynote landed.
+        predicted = navigation_queue.submit('goto', slide_number)
+        return jsonify({"status": "success", "message": f"Moving to slide {predicted}.", "slide_number": predicted, "predicted": True})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
+    except (NavigationError, ValueError) as e:
+        # This error can occur if there is no presentation open or the slide number is invalid.
+        return jsonify({"status": "error", "message": f"Failed to move to slide {slide_number}. Is a presentation open and the slide number valid? Error: {e}"}), 500
     except FileNotFoundError:
         return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
     except Exception as e:
         print(f"Error moving to slide {slide_number}: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+def fetch_slide_count():
+    """Query Keynote for the slide count of the front document, or None if nothing is open."""
+    result = run_applescript('count', check=False)
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.strip())
+
 # API endpoint to get the total number of slides
 @app.route('/api/slide_count', methods=['GET'])
 def get_slide_count():
     try:
-        # This AppleScript gets the total number of slides in the frontmost presentation.
-        script = 'tell application "Keynote" to get count of slides of the front document'
-        result = subprocess.run(['osascript', '-e', script], capture_output=True, text=True)
+        slide_count, age = status_cache.get('slide_count', fetch_slide_count)
+        age_ms = int(age * 1000)
 
-        if result.returncode != 0:
-            return jsonify({"status": "success", "slide_count": 0, "message": "No active presentation in Keynote."})
+        if slide_count is None:
+            return jsonify({"status": "success", "slide_count": 0, "message": "No active presentation in Keynote.", "snapshot_age_ms": age_ms})
 
-        slide_count = int(result.stdout.strip())
-        return jsonify({"status": "success", "slide_count": slide_count})
+        return jsonify({"status": "success", "slide_count": slide_count, "snapshot_age_ms": age_ms})
+    except ScriptTimeout as e:
+        return script_timeout_response(e)
     except FileNotFoundError:
         return jsonify({"status": "error", "message": "This feature is only available on macOS."}), 501
     except ValueError:
@@ -503,5 +1565,98 @@ def get_slide_count():
         print(f"Error getting slide count: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred."}), 500
 
+# Navigation commands run one at a time in a background worker, with rapid taps coalesced.
+navigation_queue = NavigationQueue(
+    execute=execute_navigation,
+    position=navigation_position,
+    on_done=confirm_navigation,
+    on_error=navigation_failed,
+    spawn=socketio.start_background_task,
+    event_factory=socketio.server.eio.create_event,
+)
+
+# Boot steps read files and start processes; they run off the event loop, so /healthz and /readyz answer meanwhile.
+# --profile-startup runs them inline instead, where cProfile can see them.
+PROFILE_STARTUP = False
+# Listing the home directory and crawling it for search happen on first use unless this is set.
+BOOT_DIRECTORY_INDEX = os.environ.get('KEYMOTE_BOOT_DIRECTORY_INDEX') == '1'
+
+def boot_blocking(fn, *args):
+    return fn(*args) if PROFILE_STARTUP else offload_blocking(fn, *args)
+
+def boot_scripts():
+    """Start the scripting host and compile every Keynote script before the first command of the talk needs it."""
+    return {"mode": SCRIPT_HOST_MODE, "compiled": boot_blocking(script_library.warm)}
+
+def boot_timings():
+    return boot_blocking(timings_store.warm)
+
+def boot_assets():
+    """Fingerprint and compress the front end, so the first page load is served from memory."""
+    boot_blocking(asset_manifest.build)
+    version, urls, _ = asset_manifest.precache()
+    return dict(asset_manifest.stats(), version=version, precache=len(urls))
+
+def boot_directory_index():
+    """List the home directory for the file browser and start indexing presentations for search."""
+    items = boot_blocking(directory_index.list, os.path.expanduser('~'))
+    presentation_crawler.start()
+    return {"items": len(items)}
+
+def boot_keynote():
+    """Read Keynote's state once and start the monitor, so the first client's snapshot needs no Keynote call."""
+    global keynote_state
+    snapshot = read_keynote_snapshot()
+    keynote_state = {
+        "document_open": snapshot["document_open"],
+        "is_playing": snapshot["is_playing"],
+        "last_slide_number": snapshot["slide_number"],
+        "document_name": snapshot["document_name"]
+    }
+    start_background_tasks()
+    return {"document_open": snapshot["document_open"], "document_name": snapshot["document_name"]}
+
+# Keynote goes last, so a dialog that keeps it from answering cannot hold up the rest.
+boot_sequence.add('scripts', boot_scripts)
+boot_sequence.add('timings', boot_timings)
+boot_sequence.add('assets', boot_assets)
+if BOOT_DIRECTORY_INDEX:
+    boot_sequence.add('directory_index', boot_directory_index, required=False)
+boot_sequence.add('keynote', boot_keynote, required=False)
+
+def run_boot():
+    boot_sequence.run()
+    print(boot_sequence.summary())
+
+def claim_single_worker():
+    """Take the server lock for the life of the process. Returns False if another server already holds it.
+
+    Only one server process is supported: the timings store, session clock, status cache, navigation queue,
+    event log and session recorder live in its memory, and it alone drives Keynote.
+    """
+    return leader_lock.acquire()
+
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5002) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Keymote server")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="boot under cProfile before serving, and print where the startup time went")
+    args = parser.parse_args()
+    if not claim_single_worker():
+        print(f"Another Keymote worker is already running (lock: {LEADER_LOCK_PATH}). Only one worker can run at a time.")
+        sys.exit(1)
+    if args.profile_startup:
+        PROFILE_STARTUP = True
+        _, profile = boot_sequence.profile()
+        PROFILE_STARTUP = False
+        print(boot_sequence.summary())
+        print(profile)
+    else:
+        # Serve /healthz and /readyz while booting; everything else works cold too, just slower.
+        socketio.start_background_task(run_boot)
+    # Browsers only run the service worker (offline caching) over HTTPS, or on localhost.
+    ssl_options = {}
+    if os.environ.get('KEYMOTE_SSL_CERT'):
+        ssl_options = {"certfile": os.environ['KEYMOTE_SSL_CERT'], "keyfile": os.environ.get('KEYMOTE_SSL_KEY')}
+    # No reloader: it would serve from a thread whose event loop never runs the boot, and a stray
+    # save must not restart the server in the middle of a talk.
+    socketio.run(app, debug=True, use_reloader=False, host='0.0.0.0', port=5002, **ssl_options) 
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Server-authoritative presentation clock.
+
+Every device used to count seconds with its own ``setInterval``, so devices
+drifted apart and a phone that slept lost time. The clock now lives on the
+server, driven by the transitions the monitor and the navigation queue detect,
+and measured with a monotonic clock so wall-clock adjustments cannot skew it.
+
+Clients only hear about transitions. A snapshot carries the session and
+current-slide start times as epoch seconds plus the server's current time, so a
+client can estimate its offset to the server once and render the running clock
+locally from then on.
+"""
+import threading
+import time
+
+
+class SessionClock:
+    def __init__(self, clock=time.monotonic, wall=time.time):
+        self.clock = clock
+        self.wall = wall
+        self.seq = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the session, e.g. when a presentation is opened or closed."""
+        with self._lock:
+            self.seq += 1
+            self.running = False
+            self.slide_number = None
+            self._elapsed_base = 0.0
+            self._slide_base = 0.0
+            self._run_started = None
+            self._slide_run_started = None
+        return True
+
+    # --- Transitions; each returns True if the clock changed ---
+
+    def start(self, slide_number=None, at=None):
+        """Start or resume the session clock."""
+        at = self.clock() if at is None else at
+        with self._lock:
+            changed = False
+            if slide_number is not None and slide_number != self.slide_number:
+                self._change_slide(slide_number, at)
+                changed = True
+            if not self.running:
+                self.running = True
+                self._run_started = at
+                self._slide_run_started = at
+                changed = True
+            if changed:
+                self.seq += 1
+            return changed
+
+    def pause(self, at=None):
+        at = self.clock() if at is None else at
+        with self._lock:
+            if not self.running:
+                return False
+            self._elapsed_base += at - self._run_started
+            self._slide_base += at - self._slide_run_started
+            self.running = False
+            self._run_started = None
+            self._slide_run_started = None
+            self.seq += 1
+            return True
+
+    def slide_changed(self, slide_number, at=None):
+        at = self.clock() if at is None else at
+        with self._lock:
+            if slide_number == self.slide_number:
+                return False
+            self._change_slide(slide_number, at)
+            self.seq += 1
+            return True
+
+    def _change_slide(self, slide_number, at):
+        self.slide_number = slide_number
+        self._slide_base = 0.0
+        self._slide_run_started = at if self.running else None
+
+    def set_elapsed(self, seconds, at=None):
+        """Correct the session's elapsed time, e.g. after the presenter edited it."""
+        at = self.clock() if at is None else at
+        with self._lock:
+            self._elapsed_base = float(seconds)
+            if self.running:
+                self._run_started = at
+            self.seq += 1
+            return True
+
+    # --- Reading ---
+
+    def _elapsed(self, now):
+        if not self.running:
+            return self._elapsed_base
+        return self._elapsed_base + now - self._run_started
+
+    def _slide_elapsed(self, now):
+        if not self.running or self._slide_run_started is None:
+            return self._slide_base
+        return self._slide_base + now - self._slide_run_started
+
+    def elapsed(self):
+        with self._lock:
+            return self._elapsed(self.clock())
+
+    def slide_elapsed(self):
+        with self._lock:
+            return self._slide_elapsed(self.clock())
+
+    def snapshot(self):
+        """Compact state for clients. Times ending in _at are epoch seconds on the server's clock."""
+        with self._lock:
+            now = self.clock()
+            server_time = self.wall()
+            elapsed = self._elapsed(now)
+            slide_elapsed = self._slide_elapsed(now)
+            return {
+                "seq": self.seq,
+                "running": self.running,
+                "slide_number": self.slide_number,
+                "elapsed_seconds": round(elapsed, 3),
+                "slide_elapsed_seconds": round(slide_elapsed, 3),
+                "started_at": round(server_time - elapsed, 3),
+                "slide_started_at": round(server_time - slide_elapsed, 3),
+                "server_time": round(server_time, 3),
+            }
@@ -0,0 +1,112 @@
+"""Slide content for timing estimates: titles, body text, presenter notes and media counts.
+
+Everything is read from Keynote in a single call per deck (the ``slides``
+script), whatever its size. The result is cached on disk per document path,
+together with the document's version (its mtime), so reopening a deck that was
+not saved since costs no Keynote call at all. A deck saved since is read again
+and its entry replaced. The cache holds presenter notes, so it lives under
+``data/`` rather than in the static folder.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from thumbnails import document_version
+from timings_store import write_json_atomic
+
+CONTENT_DIR = os.path.join('data', 'slide_content')
+CACHE_VERSION = 1
+FIELD_SEP = '\x1f'
+RECORD_SEP = '\x1e'
+
+
+def parse_slide_content(output):
+    """Parse the output of the 'slides' script into one dict per slide. Raises ValueError if it is malformed."""
+    output = output.rstrip('\n')
+    slides = []
+    if not output:
+        return slides
+    for record in output.split(RECORD_SEP):
+        fields = record.split(FIELD_SEP, 6)
+        if len(fields) < 7:
+            raise ValueError(f"Expected 7 fields per slide, got {len(fields)}.")
+        number, skipped, images, media, title, body, notes = fields
+        slides.append({
+            "slide": int(number),
+            "skipped": skipped == 'true',
+            "images": int(images),
+            "media": int(media),
+            # Keynote separates paragraphs with carriage returns.
+            "title": title.replace('\r', '\n'),
+            "body": body.replace('\r', '\n'),
+            "notes": notes.replace('\r', '\n'),
+        })
+    return slides
+
+
+class ContentCache:
+    """One JSON file per document under directory, holding the slides read at one version of it."""
+
+    def __init__(self, directory=CONTENT_DIR):
+        self.directory = directory
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def path(self, document_path):
+        digest = hashlib.sha256(document_path.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def latest(self, document_path):
+        """The cached entry of a document, {"path", "version", "slides"}, whatever its version; None if there is none."""
+        try:
+            with open(self.path(document_path)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("v") != CACHE_VERSION or entry.get("path") != document_path:
+            return None
+        return entry
+
+    def get(self, document_path, version):
+        """The cached slides of a document at version, or None."""
+        entry = self.latest(document_path)
+        if entry is None or entry.get("version") != version:
+            return None
+        return entry["slides"]
+
+    def put(self, document_path, version, slides):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            write_json_atomic(self.path(document_path),
+                              {"v": CACHE_VERSION, "path": document_path, "version": version, "slides": slides},
+                              kind='slide_content')
+            self.writes += 1
+
+
+class SlideContentExtractor:
+    """Reads a deck's slide content through run(document_path) -> script output, cached by document version."""
+
+    def __init__(self, run, cache=None):
+        self.run = run
+        self.cache = cache if cache is not None else ContentCache()
+        self.hits = 0
+        self.extractions = 0
+
+    def extract(self, document_path):
+        """Every slide's content. Raises OSError if the document is gone, and like run() on a cache miss."""
+        version = document_version(document_path)
+        slides = self.cache.get(document_path, version)
+        if slides is not None:
+            self.hits += 1
+            return slides
+        slides = parse_slide_content(self.run(document_path))
+        self.extractions += 1
+        try:
+            self.cache.put(document_path, version, slides)
+        except OSError as e:
+            print(f"Could not cache slide content of {document_path}: {e}")
+        return slides
+
+    def stats(self):
+        return {"hits": self.hits, "extractions": self.extractions, "writes": self.cache.writes}
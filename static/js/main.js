@@ -1,6 +1,6 @@
 // JavaScript moved from index.html
 
-const socket = io();
+const socket = io(KeymoteWire.socketOptions());
 
 const playPauseBtn = document.getElementById('play-pause-btn');
 const playPauseIcon = document.getElementById('play-pause-icon');
@@ -38,6 +38,7 @@ const cancelFileOpenBtn = document.getElementById('cancel-file-open');
 const okFileOpenBtn = document.getElementById('ok-file-open');
 const fileBrowserPathEl = document.getElementById('file-browser-path');
 const fileBrowserBackBtn = document.getElementById('file-browser-back-btn');
+const fileBrowserSearchInput = document.getElementById('file-browser-search');
 const loadingOverlay = document.getElementById('loading-overlay');
 const stopPresentationMenu = document.getElementById('stop-presentation-menu');
 const closePresentationMenu = document.getElementById('close-presentation-menu');
@@ -52,6 +53,14 @@ let slideTimings = [];
 let lastTrackingText = '0:00';
 let isPlayMode = false; // Track if presentation is in play mode
 
+// Load the app from cache next time, even when the Mac is unreachable (needs HTTPS or localhost)
+if ('serviceWorker' in navigator) {
+  window.addEventListener('load', () => {
+    navigator.serviceWorker.register('/sw.js')
+      .catch(err => console.error('Service worker registration failed:', err));
+  });
+}
+
 // --- GLOBAL UTILITY FUNCTIONS ---
 function formatTime(secs) {
   const h = Math.floor(secs / 3600);
@@ -214,11 +223,16 @@ function updateSelectedSlideByIndex(idx) {
 }
 
 function updatePresentationUI(data) {
+    // A snapshot's Keynote status is only current now; later refreshes of the same data ask again
+    const keynote = data ? data.keynote : null;
+    if (keynote) delete data.keynote;
     presentationsData = data;
 
-    // First, check if a presentation is actually running
-    fetch('/api/current_slide_number')
-        .then(res => res.json())
+    // First, check if a presentation is actually running; a snapshot already says so
+    const keynoteStatus = keynote
+        ? Promise.resolve({ status: 'success', slide_number: keynote.slide_number })
+        : fetch('/api/current_slide_number').then(res => res.json());
+    keynoteStatus
         .then(api_data => {
             if (api_data.status === 'success' && api_data.slide_number) {
                 // A presentation is active. Build the full UI.
@@ -303,6 +317,8 @@ function updatePresentationUI(data) {
                 updateSelectedSlideUI(api_data.slide_number);
                 updateSlideTimersUI();
                 updateTimeLeftDisplay();
+                loadThumbnailManifest(currentPresentationId)
+                    .then(() => updateNextSlidePreview(api_data.slide_number));
 
             } else {
                 // No presentation is active.
@@ -557,6 +573,12 @@ document.addEventListener('DOMContentLoaded', function() {
       });
   }
 
+  if (fileBrowserSearchInput) {
+      fileBrowserSearchInput.addEventListener('input', () => {
+          searchPresentations(fileBrowserSearchInput.value.trim());
+      });
+  }
+
   if (fileBrowserBackBtn) {
       fileBrowserBackBtn.addEventListener('click', () => {
       if (currentBrowserPath && currentBrowserPath !== '.') {
@@ -603,45 +625,142 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
 
-  socket.on('slide_update', function(data) {
-    if (data.slide_number) {
-        console.log('Received slide update:', data.slide_number);
-        updateSelectedSlideUI(data.slide_number);
-        // Only start the slide timer if in play mode
-        if (isPlayMode) {
-          startSlideTimer(data.slide_number - 1);
-        } else {
-          stopSlideTimer();
-        }
+  // State events carry a seq, so a reconnecting client can ask for just the ones it missed
+  const stateEventHandlers = {
+    clock: applyClock,
+
+    // Another device opened a presentation: follow it
+    presentation_opened: function(data) {
+      if (!data || data.presentation_id === joinedPresentationId) return;
+      console.log('Received presentation opened event:', data.presentation_id);
+      fetchPresentationData()
+        .then(updatePresentationUI)
+        .catch(err => console.error('Failed to load the opened presentation:', err));
+    },
+
+    // The server stored new estimates for this presentation, e.g. after reading a new deck's content
+    timings_updated: function(data) {
+      if (!data || data.presentation_id !== joinedPresentationId) return;
+      fetchPresentationData()
+        .then(updatePresentationUI)
+        .catch(err => console.error('Failed to reload the updated timings:', err));
+    },
+
+    slide_update: function(data) {
+      if (data.slide_number) {
+          console.log('Received slide update:', data.slide_number);
+          updateSelectedSlideUI(data.slide_number);
+          updateNextSlidePreview(data.slide_number);
+          // Only start the slide timer if in play mode
+          if (isPlayMode) {
+            startSlideTimer(data.slide_number - 1);
+          } else {
+            stopSlideTimer();
+          }
+      }
+    },
+
+    presentation_closed: function() {
+      console.log('Received presentation closed event.');
+      isPlayMode = false;
+      resetAllTimersAndTracking('-');
+      resetHeaderToNoPresentationState();
+      thumbnailManifest = null;
+      updateNextSlidePreview(null);
+      stopSlideTimer();
+    },
+
+    presentation_stopped: function() {
+      console.log('Received presentation stopped event.');
+      isPlayMode = false;
+      resetHeaderForStoppedPresentation();
+      stopSlideTimer();
+    },
+
+    // Projected finish from the server; only pushed when it moved noticeably
+    forecast: function(data) {
+      const timeLeftEl = document.getElementById('time-left-display');
+      if (!timeLeftEl || !data) return;
+      const delta = Math.round(data.finish_delta_seconds || 0);
+      const finish = new Date(data.projected_finish_at * 1000).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+      const pace = delta === 0 ? 'on plan' : `${formatTime(Math.abs(delta))} ${delta > 0 ? 'behind' : 'ahead'}`;
+      timeLeftEl.title = `Projected finish ${finish} (${pace})`;
+    },
+
+    presentation_started: function() {
+      console.log('Received presentation started event.');
+      isPlayMode = true;
+      // Start timers for the current slide
+      if (typeof currentSlideIdx === 'number' && currentSlideIdx >= 0) {
+        startSlideTimer(currentSlideIdx);
+      }
     }
-  });
+  };
 
-  socket.on('presentation_closed', function() {
-    console.log('Received presentation closed event.');
-    isPlayMode = false;
-    resetAllTimersAndTracking('-');
-    resetHeaderToNoPresentationState();
-    stopSlideTimer();
+  Object.entries(stateEventHandlers).forEach(([event, handler]) => {
+    socket.on(event, data => {
+      noteEventSeq(data);
+      handler(data);
+    });
   });
 
-  socket.on('presentation_stopped', function() {
-    console.log('Received presentation stopped event.');
-    isPlayMode = false;
-    resetHeaderForStoppedPresentation();
-    stopSlideTimer();
-  });
+  // The server could not replay the missed events: apply its current state instead
+  function applySessionState(state) {
+    adoptEventSync(state.sync);
+    applyClock(state.clock);
+    if ((state.presentation_id || null) !== joinedPresentationId) {
+      fetchPresentationData()
+        .then(updatePresentationUI)
+        .catch(err => console.error('Failed to load the current presentation:', err));
+      return;
+    }
+    const keynote = state.keynote || {};
+    if (!keynote.document_open) {
+      stateEventHandlers.presentation_closed();
+      return;
+    }
+    if (keynote.is_playing !== isPlayMode) {
+      (keynote.is_playing ? stateEventHandlers.presentation_started : stateEventHandlers.presentation_stopped)();
+    }
+    if (keynote.slide_number) stateEventHandlers.slide_update({ slide_number: keynote.slide_number });
+  }
 
-  socket.on('presentation_started', function() {
-    console.log('Received presentation started event.');
-    isPlayMode = true;
-    // Start timers for the current slide
-    if (typeof currentSlideIdx === 'number' && currentSlideIdx >= 0) {
-      startSlideTimer(currentSlideIdx);
+  // Replay the events missed while disconnected or asleep, or fall back to the session state
+  function catchUpOnEvents() {
+    if (!eventSync) {
+      resyncSession();
+      return;
     }
+    const request = { epoch: eventSync.epoch, seq: eventSync.seq, presentation_id: joinedPresentationId };
+    socket.emit('resync', request, reply => {
+      if (!reply) return;
+      if (reply.status === 'success') {
+        reply.events.forEach(item => {
+          noteEventSeq(item.data);
+          const handler = stateEventHandlers[item.event];
+          if (handler) handler(item.data);
+        });
+        adoptEventSync(reply.sync);
+      } else if (reply.status === 'snapshot') {
+        applySessionState(reply);
+      }
+    });
+  }
+
+  // Rooms do not survive a reconnect
+  socket.on('connect', () => {
+    joinPresentationRoom(joinedPresentationId);
+    catchUpOnEvents();
+    // The server is reachable again: send the timing writes queued while it was not.
+    KeymoteOutbox.flush();
   });
 
-  fetch('static/slide_timings.json')
-    .then(response => response.json())
+  document.addEventListener('visibilitychange', () => {
+    // While disconnected, the 'connect' handler catches up once the socket is back.
+    if (document.visibilityState === 'visible' && socket.connected) catchUpOnEvents();
+  });
+
+  fetchPresentationData()
     .then(data => {
       updatePresentationUI(data);
       addSlideClickListeners();
@@ -667,6 +786,78 @@ let timerRunning = false;
 let slideElapsedSeconds = 0;
 let slideTimerInterval = null;
 let lastSlideIdx = null;
+// The current slide's timer counts from slideTimerBase at slideTimerStartedAt (server time).
+let slideTimerBase = 0;
+let slideTimerStartedAt = 0;
+
+// --- SERVER SESSION CLOCK ---
+// The server owns the presentation clock; this device renders it locally between 'clock' events.
+let sessionClock = null;
+let serverClockOffset = 0;
+
+function serverNow() {
+  return Date.now() / 1000 + serverClockOffset;
+}
+
+function sessionElapsedSeconds() {
+  if (!sessionClock) return elapsedSeconds;
+  const elapsed = sessionClock.running ? serverNow() - sessionClock.started_at : sessionClock.elapsed_seconds;
+  return Math.max(0, Math.floor(elapsed));
+}
+
+function startClockRendering() {
+  if (timerInterval) clearInterval(timerInterval);
+  timerInterval = setInterval(() => {
+    elapsedSeconds = sessionElapsedSeconds();
+    updateMainTimeDisplay(elapsedSeconds);
+  }, 1000);
+  timerRunning = true;
+  if (playPauseIcon) playPauseIcon.src = 'static/images/009-pause-button.png';
+}
+
+function applyClock(clock) {
+  if (!clock) return;
+  const previous = sessionClock;
+  sessionClock = clock;
+  serverClockOffset = clock.server_time - Date.now() / 1000;
+  elapsedSeconds = sessionElapsedSeconds();
+  updateMainTimeDisplay(elapsedSeconds);
+
+  if (clock.running && !timerRunning) {
+    // Started or resumed, possibly from another device.
+    startClockRendering();
+    if (!isPlayMode) {
+      isPlayMode = true;
+      if (typeof currentSlideIdx === 'number' && currentSlideIdx >= 0 && slideTimings[currentSlideIdx]) {
+        startSlideTimer(currentSlideIdx);
+      }
+    }
+  } else if (!clock.running && timerRunning) {
+    // Paused, possibly from another device.
+    stopTimerAndResetButton();
+    isPlayMode = false;
+    stopSlideTimer();
+  }
+
+  // On a slide transition, time the new slide from the moment the server saw it change.
+  const slideChanged = !previous || previous.slide_number !== clock.slide_number;
+  if (slideChanged && clock.running && slideTimerInterval && lastSlideIdx !== null &&
+      slideTimings[lastSlideIdx] && slideTimings[lastSlideIdx].slide === clock.slide_number) {
+    slideTimerStartedAt = clock.slide_started_at;
+  }
+}
+
+// Catch up straight away when a phone wakes up, instead of waiting for the next transition
+function resyncSession() {
+  KeymoteWire.fetchData('/api/session')
+    .then(data => {
+      if (data.status === 'success') {
+        adoptEventSync(data.sync);
+        applyClock(data.clock);
+      }
+    })
+    .catch(err => console.error('Could not resync session clock:', err));
+}
 
 function formatMmSs(secs) {
   const m = Math.floor(secs / 60);
@@ -712,11 +903,7 @@ function addBreakAfterCurrentSlide() {
   dataToSave.presentations[currentPresentationId].slides = slideTimings.map(({ cumulative_time_seconds, ...slide }) => slide);
 
   // Save to backend
-  fetch('/api/save_timings', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(dataToSave)
-  })
+  savePresentationToBackend(dataToSave)
   .then(response => {
     if (response.ok) {
       console.log('Break added and saved successfully');
@@ -781,18 +968,71 @@ function updateSlideTimersUI() {
   });
 }
 
-function saveSlideTimingsToBackend() {
+// Persist a single slide's timing fields without re-sending the whole document
+function presentationPath(presentationId) {
+  return presentationId.split('/').map(encodeURIComponent).join('/');
+}
+
+// Follow one presentation's events; the server scopes slide and clock updates to its room
+let joinedPresentationId = null;
+// The event log position ({epoch, seq}) this client is up to date with, or null before the first load
+let eventSync = null;
+
+function adoptEventSync(sync) {
+  if (!sync) return;
+  if (!eventSync || eventSync.epoch !== sync.epoch) {
+    eventSync = { epoch: sync.epoch, seq: sync.seq };
+  } else {
+    eventSync.seq = Math.max(eventSync.seq, sync.seq);
+  }
+}
+
+function noteEventSeq(data) {
+  if (eventSync && data && typeof data.seq === 'number') {
+    eventSync.seq = Math.max(eventSync.seq, data.seq);
+  }
+}
+
+function joinPresentationRoom(presentationId) {
+  joinedPresentationId = presentationId;
+  if (presentationId && socket.connected) {
+    socket.emit('join_presentation', { presentation_id: presentationId });
+  }
+}
+
+// Shape a snapshot (from /api/snapshot or /api/open_presentation) like the old timings document
+function presentationDataFromSnapshot(snapshot) {
+  adoptEventSync(snapshot.sync);
+  const data = { current_presentation_id: snapshot.presentation_id || null, presentations: {}, keynote: snapshot.keynote || null };
+  if (!data.current_presentation_id) return data;
+  joinPresentationRoom(data.current_presentation_id);
+  if (snapshot.presentation) {
+    data.presentations[data.current_presentation_id] = snapshot.presentation;
+  }
+  return data;
+}
+
+// Load the open deck and its timings in one request
+function fetchPresentationData() {
+  return KeymoteWire.fetchData('/api/snapshot')
+    .then(snapshot => {
+      if (snapshot.status !== 'success') throw new Error(snapshot.message || 'Could not load the snapshot.');
+      return presentationDataFromSnapshot(snapshot);
+    });
+}
+
+// Save the current presentation's slides in one request, e.g. after adding or removing a break
+function savePresentationToBackend(data) {
+  const presentationId = data.current_presentation_id;
+  return KeymoteOutbox.send(`/api/presentations/${presentationPath(presentationId)}`,
+    KeymoteWire.bodyOptions('PUT', data.presentations[presentationId]));
+}
+
+function saveSlideTimingToBackend(idx, fields) {
   if (!presentationsData || !presentationsData.current_presentation_id) return;
-  // Prepare data for saving
-  const dataToSave = JSON.parse(JSON.stringify(presentationsData));
-  const currentPresentationId = dataToSave.current_presentation_id;
-  // Update slides for the current presentation, removing cumulative_time_seconds
-  dataToSave.presentations[currentPresentationId].slides = slideTimings.map(({ cumulative_time_seconds, ...slide }) => slide);
-  fetch('/api/save_timings', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(dataToSave)
-  }).catch(err => console.error('Error saving timings:', err));
+  KeymoteOutbox.send(`/api/presentations/${presentationPath(presentationsData.current_presentation_id)}/slides/${idx}`,
+    KeymoteWire.bodyOptions('PATCH', fields)
+  ).catch(err => console.error('Error saving slide timing:', err));
 }
 
 function startSlideTimer(idx) {
@@ -808,14 +1048,17 @@ function startSlideTimer(idx) {
   // Save elapsed time for previous slide
   if (lastSlideIdx !== null && lastSlideIdx !== idx && slideTimings[lastSlideIdx]) {
     slideTimings[lastSlideIdx].actual_time_seconds = slideElapsedSeconds;
-    saveSlideTimingsToBackend();
+    saveSlideTimingToBackend(lastSlideIdx, { actual_time_seconds: slideElapsedSeconds });
   }
   // Restore elapsed for new slide if it exists, otherwise 0
   slideElapsedSeconds = slideTimings[idx].actual_time_seconds || 0;
+  slideTimerBase = slideElapsedSeconds;
+  slideTimerStartedAt = serverNow();
   lastSlideIdx = idx;
   updateSlideTimersUI();
   slideTimerInterval = setInterval(() => {
-    slideElapsedSeconds++;
+    // Computed from the start time rather than counted, so a sleeping device does not lose time.
+    slideElapsedSeconds = slideTimerBase + Math.max(0, Math.floor(serverNow() - slideTimerStartedAt));
     updateSlideTimersUI();
   }, 1000);
 }
@@ -828,7 +1071,7 @@ function stopSlideTimer() {
   // Save elapsed time for last slide
   if (lastSlideIdx !== null && slideTimings[lastSlideIdx]) {
     slideTimings[lastSlideIdx].actual_time_seconds = slideElapsedSeconds;
-    saveSlideTimingsToBackend();
+    saveSlideTimingToBackend(lastSlideIdx, { actual_time_seconds: slideElapsedSeconds });
   }
 }
 
@@ -881,11 +1124,14 @@ function updateMainTimeDisplay(secs) {
 function pauseTimer() {
     if (timerRunning) {
         clearInterval(timerInterval);
+        timerInterval = null;
         timerRunning = false;
         playPauseIcon.src = 'static/images/008-play-button.png';
         playPauseIcon.alt = 'Play';
         isPlayMode = false;
         stopSlideTimer();
+        fetch('/api/session/pause', { method: 'POST' })
+          .catch(error => console.error('Error pausing session clock:', error));
     }
 }
 
@@ -1036,12 +1282,7 @@ function startTimer() {
     })
     .catch(error => console.error('Error getting current slide number:', error));
 
-  timerInterval = setInterval(() => {
-    elapsedSeconds++;
-    updateMainTimeDisplay(elapsedSeconds);
-  }, 1000);
-  timerRunning = true;
-  if (playPauseIcon) playPauseIcon.src = 'static/images/009-pause-button.png';
+  startClockRendering();
 }
 
 // --- TIME EDIT OVERLAY FUNCTIONS ---
@@ -1173,19 +1414,8 @@ function finishEditingTime(timeInput, slideIndex, shouldSave, fallbackValue = nu
       
       finalValue = formatMmSs(newTotalSeconds);
 
-      // Prepare data for saving
-      const dataToSave = JSON.parse(JSON.stringify(presentationsData));
-      const currentPresentationId = dataToSave.current_presentation_id;
-      
-      // Update slides for the current presentation, removing cumulative_time_seconds
-      dataToSave.presentations[currentPresentationId].slides = slideTimings.map(({ cumulative_time_seconds, ...slide }) => slide);
-
-      // Persist changes to the server
-      fetch('/api/save_timings', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(dataToSave)
-      }).catch(err => console.error('Error saving timings:', err));
+      // Persist only the edited slide
+      saveSlideTimingToBackend(slideIndex, { estimated_time_seconds: newTotalSeconds });
 
       // Add visual feedback
       slideElement.classList.add('timing-updated');
@@ -1269,59 +1499,152 @@ function parseTimeInput(timeStr) {
   return null;
 }
 
+// --- SLIDE THUMBNAILS ---
+let thumbnailManifest = null;
+
+// Thumbnail URLs include the document version, so the browser can cache each image for good
+function loadThumbnailManifest(presentationId) {
+  thumbnailManifest = null;
+  if (!presentationId) return Promise.resolve(null);
+  return fetch(`/api/thumbnails/${presentationPath(presentationId)}`)
+    .then(response => response.json())
+    .then(data => {
+      if (data.status === 'success') {
+        thumbnailManifest = { presentationId: presentationId, version: data.version };
+      }
+      return thumbnailManifest;
+    })
+    .catch(err => {
+      console.error('Could not load thumbnail info:', err);
+      return null;
+    });
+}
+
+function thumbnailUrl(slideNumber, size) {
+  return `/api/thumbnails/${presentationPath(thumbnailManifest.presentationId)}/${slideNumber}?size=${size}&v=${thumbnailManifest.version}`;
+}
+
+function updateNextSlidePreview(slideNumber) {
+  const preview = document.getElementById('next-slide-preview');
+  const image = document.getElementById('next-slide-image');
+  if (!preview || !image) return;
+
+  const slideCount = slideTimings.filter(slide => slide.slide !== 'BREAK').length;
+  if (!thumbnailManifest || !slideNumber || slideNumber >= slideCount) {
+    preview.style.display = 'none';
+    return;
+  }
+  image.onload = () => { preview.style.display = ''; };
+  image.onerror = () => { preview.style.display = 'none'; };
+  image.src = thumbnailUrl(slideNumber + 1, 'small');
+}
+
 // --- FILE OPEN FUNCTIONALITY ---
+// Entries per /api/list_presentations page; the first page renders while the rest load.
+const FILE_LIST_PAGE_SIZE = 200;
+
+function createFileItem(item, label) {
+  const fileItem = document.createElement('div');
+  fileItem.className = 'file-item ' + item.type;
+  fileItem.textContent = label || item.name;
+
+  fileItem.addEventListener('click', () => {
+      if (item.type === 'directory') {
+          browseDirectory(item.path);
+      } else {
+          // Visually select the file
+          const allItems = fileListContainer.querySelectorAll('.file-item');
+          allItems.forEach(el => el.classList.remove('selected'));
+          fileItem.classList.add('selected');
+          selectedFilePath = item.path;
+          okFileOpenBtn.disabled = false;
+      }
+  });
+  return fileItem;
+}
+
 function browseDirectory(path) {
   currentBrowserPath = path;
   selectedFilePath = null; // Reset selection when changing directories
   okFileOpenBtn.disabled = true;
+  if (fileBrowserSearchInput) fileBrowserSearchInput.value = '';
   fileListContainer.innerHTML = '<div class="file-item-none">Loading...</div>';
 
-  fetch(`/api/list_presentations?path=${encodeURIComponent(path)}`)
-    .then(response => {
-        if (!response.ok) { throw new Error('Network response was not ok.'); }
-        return response.json();
-    })
-    .then(data => {
-        if (data.status === 'success') {
-            fileListContainer.innerHTML = ''; // Clear loading/previous list
-            
-            // Update UI elements
-            fileBrowserPathEl.textContent = `/${data.path || ''}`;
-            fileBrowserBackBtn.disabled = !data.path; // Disable back button at root
-
-            if (data.items.length > 0) {
-                data.items.forEach(item => {
-                    const fileItem = document.createElement('div');
-                    fileItem.className = 'file-item ' + item.type;
-                    fileItem.textContent = item.name;
-                    
-                    fileItem.addEventListener('click', () => {
-                        if (item.type === 'directory') {
-                            browseDirectory(item.path);
-                        } else {
-                            // Visually select the file
-                            const allItems = fileListContainer.querySelectorAll('.file-item');
-                            allItems.forEach(el => el.classList.remove('selected'));
-                            fileItem.classList.add('selected');
-                            selectedFilePath = item.path;
-                            okFileOpenBtn.disabled = false;
-                        }
-                    });
-                    fileListContainer.appendChild(fileItem);
-                });
-            } else {
-                fileListContainer.innerHTML = '<div class="file-item-none">This folder is empty.</div>';
-            }
-        } else {
-            throw new Error(data.message || 'Failed to list files.');
-        }
-    })
+  const loadPage = (cursor, first) => {
+    let url = `/api/list_presentations?path=${encodeURIComponent(path)}&limit=${FILE_LIST_PAGE_SIZE}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return fetch(url)
+      .then(response => {
+          if (!response.ok) { throw new Error('Network response was not ok.'); }
+          return response.json();
+      })
+      .then(data => {
+          // The user moved on to another directory while this page was loading.
+          if (currentBrowserPath !== path) return;
+          if (data.status !== 'success') {
+              throw new Error(data.message || 'Failed to list files.');
+          }
+          if (first) {
+              fileListContainer.innerHTML = ''; // Clear loading/previous list
+
+              // Update UI elements
+              fileBrowserPathEl.textContent = `/${data.path || ''}`;
+              fileBrowserBackBtn.disabled = !data.path; // Disable back button at root
+
+              if (data.items.length === 0) {
+                  fileListContainer.innerHTML = '<div class="file-item-none">This folder is empty.</div>';
+              }
+          }
+          data.items.forEach(item => fileListContainer.appendChild(createFileItem(item)));
+          if (data.next_cursor) {
+              return loadPage(data.next_cursor, false);
+          }
+      });
+  };
+
+  loadPage(null, true)
     .catch(error => {
         console.error('Error browsing directory:', error);
         fileListContainer.innerHTML = `<div class="file-item-none">Error: ${error.message}</div>`;
     });
 }
 
+let fileSearchTimeout = null;
+
+function searchPresentations(query) {
+  clearTimeout(fileSearchTimeout);
+  if (!query) {
+    browseDirectory(currentBrowserPath);
+    return;
+  }
+  // Wait for the user to stop typing.
+  fileSearchTimeout = setTimeout(() => {
+    fetch(`/api/search_presentations?q=${encodeURIComponent(query)}`)
+      .then(response => response.json())
+      .then(data => {
+        if (fileBrowserSearchInput.value.trim() !== query) return;
+        if (data.status !== 'success') {
+          throw new Error(data.message || 'Search failed.');
+        }
+        selectedFilePath = null;
+        okFileOpenBtn.disabled = true;
+        fileListContainer.innerHTML = '';
+        data.items.forEach(item => fileListContainer.appendChild(createFileItem(item, item.path)));
+        if (!data.complete) {
+          // The index is still being built; show what we have and look again shortly.
+          fileListContainer.insertAdjacentHTML('beforeend', '<div class="file-item-none">Still indexing your files...</div>');
+          fileSearchTimeout = setTimeout(() => searchPresentations(query), 1000);
+        } else if (data.items.length === 0) {
+          fileListContainer.innerHTML = '<div class="file-item-none">No presentations found.</div>';
+        }
+      })
+      .catch(error => {
+        console.error('Error searching presentations:', error);
+        fileListContainer.innerHTML = `<div class="file-item-none">Error: ${error.message}</div>`;
+      });
+  }, 250);
+}
+
 function openFileOpenOverlay() {
   browseDirectory('.'); // Start at the root
   if (fileOpenOverlay) {
@@ -1371,11 +1694,7 @@ function resetSlideElapsedTimes(timingsData) {
   presentationsData = timingsData;
   
   // Save the reset data to the backend
-  fetch('/api/save_timings', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(timingsData)
-  })
+  savePresentationToBackend(timingsData)
   .then(response => {
     if (response.ok) {
       console.log('Successfully reset slide elapsed times');
@@ -1400,32 +1719,11 @@ function openPresentation(filename) {
     .then(response => response.json())
     .then(data => {
       if (data.status === 'success') {
-        // If the backend provides the current slide number, highlight it immediately
-        if (typeof data.current_slide_number === 'number' && data.current_slide_number > 0) {
-          // Wait for the slide list to be loaded, then highlight
-          fetch('static/slide_timings.json?t=' + new Date().getTime()) // Cache-bust
-            .then(response => response.json())
-            .then(timingsData => {
-              // Reset elapsed times for all slides when opening a new presentation
-              resetSlideElapsedTimes(timingsData);
-              updatePresentationUI(timingsData);
-              // Highlight the correct slide after UI is built
-              setTimeout(() => {
-                updateSelectedSlideUI(data.current_slide_number);
-              }, 100);
-            })
-            .catch(err => console.error('Failed to reload slide timings:', err));
-        } else {
-          // Fallback: just update UI as before
-          fetch('static/slide_timings.json?t=' + new Date().getTime())
-            .then(response => response.json())
-            .then(timingsData => {
-              // Reset elapsed times for all slides when opening a new presentation
-              resetSlideElapsedTimes(timingsData);
-              updatePresentationUI(timingsData);
-            })
-            .catch(err => console.error('Failed to reload slide timings:', err));
-        }
+        // The response carries the deck's timings, so the UI renders without another request
+        const timingsData = presentationDataFromSnapshot(data);
+        // Reset elapsed times for all slides when opening a new presentation
+        resetSlideElapsedTimes(timingsData);
+        updatePresentationUI(timingsData);
       } else {
         throw new Error(data.message || 'Failed to open presentation.');
       }
@@ -1485,11 +1783,7 @@ function deleteBreakSlide(slideIndex) {
   dataToSave.presentations[currentPresentationId].slides = slideTimings.map(({ cumulative_time_seconds, ...slide }) => slide);
   
   // Save to backend
-  fetch('/api/save_timings', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(dataToSave)
-  })
+  savePresentationToBackend(dataToSave)
   .then(response => {
     if (response.ok) {
       console.log('Slide deleted and saved successfully');
@@ -0,0 +1,119 @@
+// Durable outbox for timing writes: every write is stored in IndexedDB first, then sent
+// in order. A write that fails because the network is down stays queued and is replayed
+// when the connection returns, with the same Idempotency-Key, so the server applies it once.
+
+const KeymoteOutbox = (function() {
+  const DB_NAME = 'keymote';
+  const STORE = 'outbox';
+  const MIN_RETRY_MS = 1000;
+  const MAX_RETRY_MS = 60000;
+
+  let dbPromise = null;
+  let flushing = null;
+  let retryTimer = null;
+  let retryDelay = MIN_RETRY_MS;
+  // Entry id -> resolve() of the send() waiting for it.
+  const waiters = new Map();
+
+  function openDb() {
+    if (!dbPromise) {
+      dbPromise = new Promise((resolve, reject) => {
+        const request = indexedDB.open(DB_NAME, 1);
+        request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'id', autoIncrement: true });
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+      });
+    }
+    return dbPromise;
+  }
+
+  function withStore(mode, fn) {
+    return openDb().then(db => new Promise((resolve, reject) => {
+      const transaction = db.transaction(STORE, mode);
+      const request = fn(transaction.objectStore(STORE));
+      transaction.oncomplete = () => resolve(request.result);
+      transaction.onerror = () => reject(transaction.error);
+    }));
+  }
+
+  function newKey() {
+    if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+  }
+
+  // What send() resolves with while its write is still queued: the change is kept locally.
+  function queuedResponse() {
+    return new Response(null, { status: 202, statusText: 'Queued' });
+  }
+
+  // Network trouble, and server responses worth retrying; anything else is final.
+  function shouldRetry(response) {
+    return response.status >= 500 || [408, 409, 429].includes(response.status);
+  }
+
+  function scheduleRetry() {
+    waiters.forEach(resolve => resolve(queuedResponse()));
+    waiters.clear();
+    if (retryTimer) return;
+    retryTimer = setTimeout(() => { retryTimer = null; flush(); }, retryDelay);
+    retryDelay = Math.min(retryDelay * 2, MAX_RETRY_MS);
+  }
+
+  function deliver(entry) {
+    const headers = Object.assign({}, entry.headers, { 'Idempotency-Key': entry.key });
+    return fetch(entry.url, { method: entry.method, headers, body: entry.body });
+  }
+
+  // Send queued writes oldest first; stop at the first one that cannot be delivered yet.
+  function flush() {
+    if (flushing) return flushing;
+    const step = () => withStore('readonly', store => store.getAll(null, 1)).then(([entry]) => {
+      if (!entry) return;
+      return deliver(entry).then(response => {
+        if (shouldRetry(response)) {
+          scheduleRetry();
+          return;
+        }
+        if (!response.ok) console.error(`Dropping queued ${entry.method} ${entry.url}: HTTP ${response.status}`);
+        return withStore('readwrite', store => store.delete(entry.id)).then(() => {
+          retryDelay = MIN_RETRY_MS;
+          const resolve = waiters.get(entry.id);
+          waiters.delete(entry.id);
+          if (resolve) resolve(response);
+          return step();
+        });
+      }, () => scheduleRetry());
+    });
+    flushing = step()
+      .catch(err => console.error('Error flushing the outbox:', err))
+      .finally(() => { flushing = null; });
+    return flushing;
+  }
+
+  // Queue a write and try to send it. Resolves with the server's response, or with a
+  // 202 "Queued" response if it has to wait for the connection.
+  function send(url, options) {
+    const entry = { url, method: options.method, headers: options.headers || {}, body: options.body,
+                    key: newKey(), queued_at: Date.now() };
+    if (!self.indexedDB) {
+      return fetch(url, Object.assign({}, options, { headers: Object.assign({}, entry.headers, { 'Idempotency-Key': entry.key }) }));
+    }
+    return withStore('readwrite', store => store.add(entry)).then(id => new Promise(resolve => {
+      waiters.set(id, resolve);
+      // A flush in progress may already be past this entry's turn; start another after it.
+      (flushing || Promise.resolve()).then(() => flush());
+    }), err => {
+      console.error('Could not queue the write, sending it directly:', err);
+      return fetch(url, options);
+    });
+  }
+
+  function pending() {
+    if (!self.indexedDB) return Promise.resolve(0);
+    return withStore('readonly', store => store.count());
+  }
+
+  window.addEventListener('online', () => flush());
+
+  return { send, flush, pending };
+})();
@@ -0,0 +1,238 @@
+// Compact wire format: a small MessagePack codec, a Socket.IO parser that uses it,
+// and fetch helpers that negotiate MessagePack with the server and fall back to JSON.
+
+const KeymoteWire = (function() {
+  const MSGPACK = 'application/msgpack';
+  const textEncoder = new TextEncoder();
+  const textDecoder = new TextDecoder();
+
+  // --- Encoding ---
+  class Writer {
+    constructor() {
+      this.bytes = new Uint8Array(256);
+      this.view = new DataView(this.bytes.buffer);
+      this.length = 0;
+    }
+
+    reserve(n) {
+      if (this.length + n <= this.bytes.length) return;
+      let size = this.bytes.length * 2;
+      while (size < this.length + n) size *= 2;
+      const bytes = new Uint8Array(size);
+      bytes.set(this.bytes.subarray(0, this.length));
+      this.bytes = bytes;
+      this.view = new DataView(bytes.buffer);
+    }
+
+    u8(value) { this.reserve(1); this.view.setUint8(this.length, value); this.length += 1; }
+    u16(value) { this.reserve(2); this.view.setUint16(this.length, value); this.length += 2; }
+    u32(value) { this.reserve(4); this.view.setUint32(this.length, value); this.length += 4; }
+    f64(value) { this.reserve(8); this.view.setFloat64(this.length, value); this.length += 8; }
+    raw(bytes) { this.reserve(bytes.length); this.bytes.set(bytes, this.length); this.length += bytes.length; }
+
+    header(length, fix, fixMax, codes) {
+      if (fix !== null && length < fixMax) this.u8(fix | length);
+      else if (codes[0] !== null && length < 0x100) { this.u8(codes[0]); this.u8(length); }
+      else if (length < 0x10000) { this.u8(codes[1]); this.u16(length); }
+      else { this.u8(codes[2]); this.u32(length); }
+    }
+
+    value(value) {
+      if (value === null || value === undefined) this.u8(0xc0);
+      else if (value === false) this.u8(0xc2);
+      else if (value === true) this.u8(0xc3);
+      else if (typeof value === 'number') this.number(value);
+      else if (typeof value === 'string') {
+        const bytes = textEncoder.encode(value);
+        this.header(bytes.length, 0xa0, 32, [0xd9, 0xda, 0xdb]);
+        this.raw(bytes);
+      } else if (value instanceof ArrayBuffer || ArrayBuffer.isView(value)) {
+        const bytes = value instanceof ArrayBuffer ? new Uint8Array(value) : new Uint8Array(value.buffer, value.byteOffset, value.byteLength);
+        this.header(bytes.length, null, 0, [0xc4, 0xc5, 0xc6]);
+        this.raw(bytes);
+      } else if (Array.isArray(value)) {
+        this.header(value.length, 0x90, 16, [null, 0xdc, 0xdd]);
+        value.forEach(item => this.value(item));
+      } else if (typeof value.toJSON === 'function') {
+        this.value(value.toJSON());
+      } else {
+        // Like JSON.stringify, leave out undefined and function members.
+        const keys = Object.keys(value).filter(key => value[key] !== undefined && typeof value[key] !== 'function');
+        this.header(keys.length, 0x80, 16, [null, 0xde, 0xdf]);
+        keys.forEach(key => { this.value(key); this.value(value[key]); });
+      }
+    }
+
+    number(value) {
+      if (!Number.isInteger(value) || Math.abs(value) > 0xffffffff) {
+        this.u8(0xcb);
+        this.f64(value);
+      } else if (value >= 0) {
+        if (value < 0x80) this.u8(value);
+        else if (value < 0x100) { this.u8(0xcc); this.u8(value); }
+        else if (value < 0x10000) { this.u8(0xcd); this.u16(value); }
+        else { this.u8(0xce); this.u32(value); }
+      } else if (value >= -32) {
+        this.u8(value & 0xff);
+      } else if (value >= -0x80000000) {
+        this.u8(0xd2);
+        this.reserve(4);
+        this.view.setInt32(this.length, value);
+        this.length += 4;
+      } else {
+        this.u8(0xcb);
+        this.f64(value);
+      }
+    }
+  }
+
+  function encode(value) {
+    const writer = new Writer();
+    writer.value(value);
+    return writer.bytes.slice(0, writer.length);
+  }
+
+  // --- Decoding ---
+  function decode(buffer) {
+    const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer);
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 0;
+
+    function take(n) {
+      if (offset + n > bytes.length) throw new Error('Truncated MessagePack data.');
+      const start = offset;
+      offset += n;
+      return start;
+    }
+    const u8 = () => view.getUint8(take(1));
+    const u16 = () => view.getUint16(take(2));
+    const u32 = () => view.getUint32(take(4));
+    const str = n => textDecoder.decode(bytes.subarray(take(n), offset));
+    const bin = n => bytes.slice(take(n), offset);
+    const array = n => { const items = new Array(n); for (let i = 0; i < n; i++) items[i] = value(); return items; };
+    const map = n => { const object = {}; for (let i = 0; i < n; i++) { const key = value(); object[key] = value(); } return object; };
+
+    function value() {
+      const type = u8();
+      if (type < 0x80) return type;
+      if (type < 0x90) return map(type & 0x0f);
+      if (type < 0xa0) return array(type & 0x0f);
+      if (type < 0xc0) return str(type & 0x1f);
+      if (type >= 0xe0) return type - 0x100;
+      switch (type) {
+        case 0xc0: return null;
+        case 0xc2: return false;
+        case 0xc3: return true;
+        case 0xc4: return bin(u8());
+        case 0xc5: return bin(u16());
+        case 0xc6: return bin(u32());
+        case 0xca: return view.getFloat32(take(4));
+        case 0xcb: return view.getFloat64(take(8));
+        case 0xcc: return u8();
+        case 0xcd: return u16();
+        case 0xce: return u32();
+        case 0xcf: return Number(view.getBigUint64(take(8)));
+        case 0xd0: return view.getInt8(take(1));
+        case 0xd1: return view.getInt16(take(2));
+        case 0xd2: return view.getInt32(take(4));
+        case 0xd3: return Number(view.getBigInt64(take(8)));
+        case 0xd9: return str(u8());
+        case 0xda: return str(u16());
+        case 0xdb: return str(u32());
+        case 0xdc: return array(u16());
+        case 0xdd: return array(u32());
+        case 0xde: return map(u16());
+        case 0xdf: return map(u32());
+        default: throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}.`);
+      }
+    }
+
+    const result = value();
+    if (offset !== bytes.length) throw new Error('Trailing bytes after MessagePack data.');
+    return result;
+  }
+
+  // --- Socket.IO parser, compatible with python-socketio's 'msgpack' serializer ---
+  // Packets are {type, nsp, data, id} maps, one binary frame each.
+  class Encoder {
+    encode(packet) {
+      return [encode(packet)];
+    }
+  }
+
+  class Decoder {
+    constructor() {
+      this.listeners = {};
+    }
+
+    on(event, fn) {
+      (this.listeners[event] = this.listeners[event] || []).push(fn);
+      return this;
+    }
+
+    off(event, fn) {
+      if (!event) this.listeners = {};
+      else if (!fn) delete this.listeners[event];
+      else this.listeners[event] = (this.listeners[event] || []).filter(listener => listener !== fn);
+      return this;
+    }
+
+    emit(event, ...args) {
+      (this.listeners[event] || []).slice().forEach(fn => fn.apply(this, args));
+      return this;
+    }
+
+    add(chunk) {
+      if (typeof chunk === 'string') throw new Error('Expected a binary Socket.IO packet.');
+      const packet = decode(chunk);
+      if (!packet || !Number.isInteger(packet.type) || typeof packet.nsp !== 'string') {
+        throw new Error('Invalid Socket.IO packet.');
+      }
+      if (packet.id === null) delete packet.id;
+      if (packet.data === null) delete packet.data;
+      this.emit('decoded', packet);
+    }
+
+    destroy() {
+      this.listeners = {};
+    }
+  }
+
+  const socketParser = { protocol: 5, Encoder, Decoder };
+
+  // The server sets this cookie when its Socket.IO packets are MessagePack.
+  function socketOptions() {
+    return /(?:^|;\s*)keymote_socketio=msgpack(?:;|$)/.test(document.cookie) ? { parser: socketParser } : {};
+  }
+
+  // --- HTTP ---
+  // Set once the server answered in MessagePack, so request bodies can use it too.
+  let serverSpeaksMsgpack = false;
+
+  function isMsgpack(response) {
+    return (response.headers.get('Content-Type') || '').split(';')[0].trim() === MSGPACK;
+  }
+
+  // Fetch a document, preferring MessagePack; resolves to the decoded body.
+  function fetchData(url, options = {}) {
+    const headers = Object.assign({ 'Accept': `${MSGPACK}, application/json;q=0.9` }, options.headers);
+    return fetch(url, Object.assign({}, options, { headers }))
+      .then(response => {
+        if (isMsgpack(response)) {
+          serverSpeaksMsgpack = true;
+          return response.arrayBuffer().then(decode);
+        }
+        return response.json();
+      });
+  }
+
+  // Options for sending data as MessagePack when the server has shown it understands it, JSON otherwise.
+  function bodyOptions(method, data) {
+    if (serverSpeaksMsgpack) {
+      return { method, headers: { 'Content-Type': MSGPACK }, body: encode(data) };
+    }
+    return { method, headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(data) };
+  }
+
+  return { encode, decode, socketParser, socketOptions, fetchData, bodyOptions };
+})();
@@ -0,0 +1,101 @@
+"""Short-lived cache for Keynote status queries.
+
+The Keynote monitor already polls the presentation state, and several phones
+asking for the current slide at once would otherwise each run their own
+AppleScript query. The cache serves reads from the latest snapshot while it is
+younger than the freshness window. Concurrent misses for the same query share a
+single in-flight call (single-flight), and navigation commands invalidate the
+snapshot so the next read goes back to Keynote.
+"""
+import threading
+import time
+
+
+class _Flight:
+    """A query in progress that other callers can wait on."""
+
+    def __init__(self, event):
+        self.event = event
+        self.value = None
+        self.error = None
+
+
+class StatusCache:
+    def __init__(self, max_age=1.0, event_factory=threading.Event, clock=time.monotonic):
+        self.max_age = max_age
+        self.event_factory = event_factory
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # key -> (value, timestamp)
+        self._flights = {}  # key -> _Flight
+        self._generations = {}  # key -> int, bumped on invalidation
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        """Store a fresh snapshot, e.g. the result of a monitor poll."""
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+
+    def peek(self, key):
+        """Return (value, age_seconds) for the latest snapshot, or (None, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        value, timestamp = entry
+        return value, self.clock() - timestamp
+
+    def invalidate(self, *keys):
+        """Drop the given snapshots, or all of them when no key is given."""
+        with self._lock:
+            for key in keys or list(self._entries):
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def get(self, key, fetch, max_age=None):
+        """Return (value, age_seconds), calling fetch() only on a cache miss.
+
+        Callers that miss while another call for the same key is in flight wait
+        for that call instead of starting their own. Exceptions raised by fetch()
+        are re-raised in every waiting caller.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] <= max_age:
+                self.hits += 1
+                return entry[0], self.clock() - entry[1]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = _Flight(self.event_factory())
+                self._flights[key] = flight
+                generation = self._generations.get(key, 0)
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 0.0
+
+        try:
+            flight.value = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                # A navigation command during the call may already have made this result stale.
+                if flight.error is None and self._generations.get(key, 0) == generation:
+                    self._entries[key] = (flight.value, self.clock())
+            flight.event.set()
+        return flight.value, 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "max_age_seconds": self.max_age}
@@ -0,0 +1,103 @@
+// Service worker: the app loads from cache, even when the Mac is unreachable.
+// The server prepends self.KEYMOTE_PRECACHE = { version, urls, external } (see /sw.js in server.py),
+// so a new build of the front end installs a new worker with a new asset cache.
+
+const PRECACHE = self.KEYMOTE_PRECACHE || { version: 'dev', urls: [], external: [] };
+const ASSET_CACHE = `keymote-assets-${PRECACHE.version}`;
+const DATA_CACHE = 'keymote-data';
+// Live state is taken from the network unless it takes longer than this.
+const NETWORK_TIMEOUT_MS = 3000;
+
+// Fingerprinted assets never change, so any cached copy is current.
+const FINGERPRINTED = /\.[0-9a-f]{8}\.[a-z0-9]+$/;
+// Stored timings: shown from cache at once, refreshed in the background.
+const STALE_WHILE_REVALIDATE = [/^\/api\/presentations(\/|$)/, /^\/api\/thumbnails\//];
+// Keynote and session state: from the network, from cache only when offline.
+const NETWORK_FIRST = ['/api/snapshot', '/api/session'];
+
+// Scripts from other sites (the Socket.IO client) are cached as opaque responses, on a best-effort basis.
+function cacheExternal(cache) {
+  return Promise.all(PRECACHE.external.map(url =>
+    fetch(url, { mode: 'no-cors' })
+      .then(response => cache.put(url, response))
+      .catch(err => console.warn(`Could not cache ${url}:`, err))));
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(ASSET_CACHE)
+      .then(cache => cache.addAll(PRECACHE.urls).then(() => cacheExternal(cache)))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(names
+        .filter(name => name.startsWith('keymote-assets-') && name !== ASSET_CACHE)
+        .map(name => caches.delete(name))))
+      .then(() => self.clients.claim())
+  );
+});
+
+function cacheFirst(request) {
+  return caches.match(request).then(cached => cached || fetch(request).then(response => {
+    if (response.ok || response.type === 'opaque') {
+      const copy = response.clone();
+      caches.open(ASSET_CACHE).then(cache => cache.put(request, copy));
+    }
+    return response;
+  }));
+}
+
+function staleWhileRevalidate(event, cacheName) {
+  const request = event.request;
+  return caches.open(cacheName).then(cache => cache.match(request).then(cached => {
+    const refreshed = fetch(request).then(response => {
+      if (response.ok) return cache.put(request, response.clone()).then(() => response);
+      return response;
+    });
+    if (cached) {
+      // Keep the worker alive until the cache is refreshed; failures just leave the cached copy.
+      event.waitUntil(refreshed.catch(() => {}));
+      return cached;
+    }
+    return refreshed;
+  }));
+}
+
+function networkFirst(request) {
+  const network = fetch(request).then(response => {
+    if (response.ok) {
+      const copy = response.clone();
+      caches.open(DATA_CACHE).then(cache => cache.put(request, copy));
+    }
+    return response;
+  });
+  const timeout = new Promise((resolve, reject) => setTimeout(() => reject(new Error('Network timeout')), NETWORK_TIMEOUT_MS));
+  return Promise.race([network, timeout]).catch(err =>
+    caches.match(request).then(cached => cached || network.catch(() => { throw err; }))
+  );
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (PRECACHE.external.includes(request.url)) {
+    event.respondWith(cacheFirst(request));
+    return;
+  }
+  if (url.origin !== self.location.origin || url.pathname.startsWith('/socket.io/')) return;
+
+  if (url.pathname === '/') {
+    event.respondWith(staleWhileRevalidate(event, ASSET_CACHE));
+  } else if (url.pathname.startsWith('/static/') && FINGERPRINTED.test(url.pathname)) {
+    event.respondWith(cacheFirst(request));
+  } else if (STALE_WHILE_REVALIDATE.some(pattern => pattern.test(url.pathname))) {
+    event.respondWith(staleWhileRevalidate(event, DATA_CACHE));
+  } else if (NETWORK_FIRST.includes(url.pathname)) {
+    event.respondWith(networkFirst(request));
+  }
+});
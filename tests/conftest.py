@@ -1,13 +1,55 @@
 import pytest
 from server import app as flask_app
 from server import socketio
+from server import status_cache
+from server import navigation_queue
+from server import session_clock
+from server import forecast_engine
+from server import monitor_scheduler
+from timings_store import TimingsStore
+from event_log import EventLog
+from idempotency import IdempotencyStore
+from recorder import SessionRecorder
+from slide_content import SlideContentExtractor, ContentCache
+from estimator import TimingEstimator
 
 @pytest.fixture
-def app():
+def background_tasks(monkeypatch):
+    """(fn, args) of the tasks the server starts in the background; tests run them explicitly."""
+    tasks = []
+    monkeypatch.setattr(socketio, 'start_background_task', lambda fn, *args: tasks.append((fn, args)))
+    return tasks
+
+@pytest.fixture
+def app(monkeypatch, tmp_path, background_tasks):
     """Create and configure a new app instance for each test."""
     # Note: We will need to add extensive mocking here later on,
     # especially for AppleScript subprocess calls and file system access.
+    status_cache.invalidate()
+    # Tests run queued navigation explicitly with navigation_queue.drain().
+    navigation_queue.clear()
+    session_clock.reset()
+    forecast_engine.invalidate()
+    monkeypatch.setattr(navigation_queue, 'spawn', None)
+    # Tests drive the monitor's logic directly; a background monitor would poll the mocked Keynote too.
+    monkeypatch.setattr('server.background_task_started', True)
+    # Slide updates only prefetch thumbnails in the tests that ask for it.
+    monkeypatch.setattr('server.THUMBNAIL_PREFETCH', 0)
+    # Events are scoped to the current presentation, so every test gets an empty timings store.
+    store = TimingsStore(str(tmp_path / 'presentations'), legacy_path=None)
+    monkeypatch.setattr('server.timings_store', store)
+    monkeypatch.setattr('server.event_log', EventLog())
+    monkeypatch.setattr('server.idempotency_store', IdempotencyStore())
+    monkeypatch.setattr('server.session_recorder', SessionRecorder(str(tmp_path / 'sessions')))
+    monkeypatch.setattr('server.ended_session', None)
+    monkeypatch.setattr(monitor_scheduler, 'holds', 0)
+    import server
+    monkeypatch.setattr('server.slide_content', SlideContentExtractor(server.slide_content.run,
+                                                                      ContentCache(str(tmp_path / 'slide_content'))))
+    monkeypatch.setattr('server.timing_estimator', TimingEstimator())
+    monkeypatch.setattr('server.estimator_calibrated_for', None)
     yield flask_app
+    store.close()
 
 @pytest.fixture
 def client(app):
@@ -17,4 +59,10 @@ def client(app):
 @pytest.fixture
 def socketio_client(app, client):
     """A test client for the socketio server."""
-    return socketio.test_client(app, flask_test_client=client) 
\ No newline at end of file
+    return socketio.test_client(app, flask_test_client=client) 
+
+@pytest.fixture
+def timings_store(app):
+    """The empty timings store the server is using for this test."""
+    import server
+    return server.timings_store
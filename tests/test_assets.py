@@ -0,0 +1,84 @@
+import gzip
+import os
+
+import pytest
+
+from assets import AssetManifest
+
+
+class AcceptStub(dict):
+    """Quacks like werkzeug's Accept: missing encodings have quality 0."""
+
+    def __init__(self, **qualities):
+        super().__init__(qualities)
+
+    def __getitem__(self, key):
+        return self.get(key, 0)
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / 'static' / 'css').mkdir(parents=True)
+    (tmp_path / 'static' / 'js').mkdir()
+    (tmp_path / 'static' / 'images').mkdir()
+    (tmp_path / 'static' / 'images' / 'bg.jpg').write_bytes(b'\xff\xd8jpeg')
+    (tmp_path / 'static' / 'css' / 'app.css').write_text("body { background: url('../images/bg.jpg'); }\n" * 40)
+    (tmp_path / 'static' / 'js' / 'app.js').write_text("icon.src = 'static/images/bg.jpg';\n")
+    (tmp_path / 'index.html').write_text(
+        '<link href="static/css/app.css"><script src="static/js/app.js"></script>'
+        '<script src="https://cdn.example.com/lib.js"></script>')
+    return tmp_path
+
+
+def test_references_are_rewritten_to_fingerprinted_urls(site):
+    manifest = AssetManifest(str(site))
+    css_url = manifest.url_for('static/css/app.css')
+    js_url = manifest.url_for('static/js/app.js')
+    image_url = manifest.url_for('static/images/bg.jpg')
+
+    assert css_url.startswith('static/css/app.') and css_url != 'static/css/app.css'
+    page, immutable = manifest.lookup('index.html')
+    assert not immutable
+    assert f'href="{css_url}"' in page.body.decode()
+    assert f'src="{js_url}"' in page.body.decode()
+    assert 'https://cdn.example.com/lib.js' in page.body.decode()
+
+    css, immutable = manifest.lookup(css_url)
+    assert immutable
+    assert f"url('../images/{image_url.rsplit('/', 1)[1]}')" in css.body.decode()
+    js, _ = manifest.lookup(js_url)
+    assert f"'{image_url}'" in js.body.decode()
+
+
+def test_precache_lists_what_the_page_loads(site):
+    (site / 'static' / 'images' / 'unused.png').write_bytes(b'png')
+    manifest = AssetManifest(str(site))
+
+    version, urls, external = manifest.precache()
+
+    assert urls == ['/'] + sorted('/' + manifest.url_for(path) for path in
+                                  ('static/css/app.css', 'static/js/app.js', 'static/images/bg.jpg'))
+    assert external == ['https://cdn.example.com/lib.js']
+    (site / 'static' / 'css' / 'app.css').write_text("body { color: red; }")
+    assert AssetManifest(str(site)).precache()[0] != version
+
+
+def test_compressed_variants(site):
+    css, _ = AssetManifest(str(site)).lookup('static/css/app.css')
+    assert gzip.decompress(css.encodings['gzip']) == css.body
+    encoding, body = css.negotiate(AcceptStub(gzip=1))
+    assert encoding == 'gzip' and body == css.encodings['gzip']
+    assert css.negotiate(AcceptStub())[0] is None
+
+
+def test_fingerprint_changes_with_content(site):
+    manifest = AssetManifest(str(site), check_interval=0)
+    before = manifest.url_for('static/css/app.css')
+
+    image = site / 'static' / 'images' / 'bg.jpg'
+    image.write_bytes(b'\xff\xd8other')
+    os.utime(image, ns=(0, os.stat(image).st_mtime_ns + 1000))
+
+    # The CSS embeds the image's fingerprint, so it changes too.
+    assert manifest.url_for('static/css/app.css') != before
+    assert manifest.builds == 2
@@ -0,0 +1,79 @@
+import subprocess
+
+import pytest
+
+import wire
+from benchmarks.run import compare, percentile, run_suite
+from benchmarks.simulated_keynote import LatencyModel, SimulatedKeynote
+
+
+def test_simulated_keynote_runs_the_script_library():
+    import server
+    from keynote_scripts import ScriptLibrary
+    keynote = SimulatedKeynote(slide_count=3)
+    library = ScriptLibrary(runner=keynote)
+    library.run('open', ['/Users/me/Talks/Deck.key'])
+
+    assert library.run('count').stdout.strip() == '3'
+    assert library.run('start').returncode == 0
+    assert library.run('next').stdout.strip() == '2'
+    assert library.run('goto', [3]).stdout.strip() == '3'
+    assert library.run('next').stdout.strip() == '3'
+    with pytest.raises(subprocess.CalledProcessError):
+        library.run('goto', [9])
+
+    # The server parses the simulated status like the real one.
+    original = server.script_library
+    server.script_library = library
+    try:
+        assert server.get_keynote_status() == {"document_open": True, "is_playing": True, "slide_number": 3, "document_name": "Deck.key"}
+        assert server.get_keynote_snapshot() == {"document_open": True, "is_playing": True, "slide_number": 3, "document_name": "Deck.key",
+                                                 "slide_count": 3, "document_path": "/Users/me/Talks/Deck.key"}
+        library.run('close')
+        assert server.get_keynote_status()["document_open"] is False
+    finally:
+        server.script_library = original
+
+
+def test_latency_model_is_reproducible():
+    first = [LatencyModel(20, 0.5, seed=7).sample() for _ in range(3)]
+    second = [LatencyModel(20, 0.5, seed=7).sample() for _ in range(3)]
+    assert first == second
+    assert LatencyModel(20, 0).sample() == 0.02
+    assert LatencyModel(0).sample() == 0.0
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile([4], 0.99) == 4
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"a": {"p50_ms": 10.0, "p99_ms": 20.0}, "gone": {"p50_ms": 1.0, "p99_ms": 1.0}}}
+    current = {"results": {"a": {"p50_ms": 10.5, "p99_ms": 30.0}, "new": {"p50_ms": 1.0, "p99_ms": 1.0}}}
+
+    rows = compare(current, baseline, threshold=0.2)
+
+    assert [(row["metric"], row["regressed"]) for row in rows] == [("p50_ms", False), ("p99_ms", True)]
+    # Tiny absolute differences are not regressions, whatever the ratio.
+    tiny = compare({"results": {"a": {"p50_ms": 0.2, "p99_ms": 0.2}}}, {"results": {"a": {"p50_ms": 0.1, "p99_ms": 0.1}}})
+    assert not any(row["regressed"] for row in tiny)
+
+
+def test_quick_run_produces_every_benchmark(app):
+    document = run_suite(latency_ms=0, iterations=3, deck_sizes=(10,), client_counts=(2,), wire_sizes=(50,))
+
+    formats = ["json-indent", "json"] + (["msgpack"] if wire.available() else [])
+    assert set(document["results"]) == {
+        "http.open_presentation", "http.next_slide", "http.next_slide.confirmed", "http.goto_slide",
+        "socketio.slide_update[clients=2]", "http.save_timings[slides=10]",
+        *(f"wire.{step}[format={name},slides=50]" for step in ("encode", "decode") for name in formats),
+        *(f"wire.socketio.slide_update[format={name}]" for name in formats if name != "json-indent"),
+    }
+    # Compact JSON drops the indentation of the old file format.
+    assert (document["results"]["wire.encode[format=json,slides=50]"]["bytes"]
+            < document["results"]["wire.encode[format=json-indent,slides=50]"]["bytes"])
+    assert all(result["n"] >= 3 for result in document["results"].values())
+    assert document["meta"]["scripts_run"] > 0
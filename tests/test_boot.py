@@ -0,0 +1,90 @@
+from boot import BootSequence, READY, FAILED, PENDING
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_steps_run_in_order_with_their_timings_and_details():
+    clock = FakeClock()
+    boot = BootSequence(clock=clock)
+    calls = []
+
+    def step(name, seconds):
+        def run():
+            calls.append(name)
+            clock.now += seconds
+            return {"name": name}
+        return run
+
+    boot.add('first', step('first', 0.5))
+    boot.add('second', step('second', 0.25))
+    assert not boot.ready and not boot.done
+    assert boot.report()["components"]["first"]["state"] == PENDING
+
+    assert boot.run() is True
+    assert calls == ['first', 'second']
+    report = boot.report()
+    assert report["ready"] and report["done"]
+    assert report["seconds"] == 0.75
+    assert report["components"]["first"] == {"state": READY, "required": True, "seconds": 0.5,
+                                             "detail": {"name": "first"}, "error": None}
+    assert list(report["components"]) == ['first', 'second']
+
+
+def test_a_failed_step_does_not_stop_the_others():
+    boot = BootSequence()
+    ran = []
+
+    def broken():
+        raise OSError("disk on fire")
+
+    boot.add('broken', broken)
+    boot.add('after', lambda: ran.append(True))
+
+    assert boot.run() is False
+    assert ran == [True]
+    component = boot.report()["components"]["broken"]
+    assert component["state"] == FAILED
+    assert component["error"] == "OSError: disk on fire"
+    assert boot.done and not boot.ready
+
+
+def test_optional_steps_only_degrade():
+    boot = BootSequence()
+    boot.add('required', lambda: None)
+    boot.add('optional', lambda: 1 / 0, required=False)
+
+    assert boot.run() is True
+    assert boot.report()["components"]["optional"]["state"] == FAILED
+    assert 'optional' in boot.summary() and 'ZeroDivisionError' in boot.summary()
+
+
+def test_run_only_runs_steps_once():
+    boot = BootSequence()
+    calls = []
+    boot.add('once', lambda: calls.append(1))
+
+    boot.run()
+    boot.run()
+
+    assert calls == [1]
+
+
+def test_profile_reports_the_expensive_calls():
+    boot = BootSequence()
+
+    def expensive_step():
+        return sum(range(10000))
+
+    boot.add('expensive', expensive_step)
+
+    ready, profile = boot.profile(limit=10)
+
+    assert ready
+    assert 'expensive_step' in profile
+    assert boot.report()["components"]["expensive"]["detail"] == sum(range(10000))
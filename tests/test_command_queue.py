@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from command_queue import NavigationQueue, NavigationError
+
+
+class FakeKeynote:
+    def __init__(self, current=1, slide_count=10):
+        self.current = current
+        self.slide_count = slide_count
+        self.commands = []
+
+    def execute(self, command, target):
+        self.commands.append((command, target))
+        if command == 'next':
+            self.current = min(self.current + 1, self.slide_count)
+        elif command == 'previous':
+            self.current = max(self.current - 1, 1)
+        else:
+            self.current = target
+        return self.current
+
+    def position(self):
+        return self.current, self.slide_count
+
+
+def make_queue(keynote, done=None):
+    return NavigationQueue(keynote.execute, keynote.position,
+                           on_done=lambda pending, actual: done.append(actual) if done is not None else None)
+
+
+def test_single_move_runs_native_command():
+    keynote = FakeKeynote(current=3)
+    done = []
+    queue = make_queue(keynote, done)
+
+    assert queue.submit('next') == 4
+    queue.drain()
+
+    assert keynote.commands == [('next', 4)]
+    assert done == [4]
+
+
+def test_queued_moves_coalesce_into_one_clamped_goto():
+    keynote = FakeKeynote(current=7, slide_count=10)
+    queue = make_queue(keynote)
+
+    predictions = [queue.submit('next') for _ in range(5)]
+    queue.drain()
+
+    assert predictions == [8, 9, 10, 10, 10]
+    assert keynote.commands == [('goto', 10)]
+    assert queue.stats()['coalesced'] == 4
+
+
+def test_goto_supersedes_queued_commands():
+    keynote = FakeKeynote(current=2)
+    queue = make_queue(keynote)
+
+    queue.submit('goto', 9)
+    queue.submit('previous')
+    queue.submit('goto', 4)
+    queue.drain()
+
+    assert keynote.commands == [('goto', 4)]
+    assert not queue.busy
+    assert queue.wait_idle(0)
+
+
+def test_rejects_navigation_without_presentation_or_out_of_range():
+    keynote = FakeKeynote()
+    queue = make_queue(keynote)
+    with pytest.raises(NavigationError):
+        queue.submit('goto', 11)
+
+    keynote.current = None
+    with pytest.raises(NavigationError):
+        queue.submit('next')
+
+
+def test_failed_command_reports_error_and_resets_prediction():
+    errors = []
+
+    def execute(command, target):
+        raise RuntimeError('Keynote got an error')
+
+    queue = NavigationQueue(execute, lambda: (3, 10), on_error=lambda pending, e: errors.append(pending))
+    queue.submit('next')
+    queue.drain()
+
+    assert errors == [{"command": 'next', "target": 4}]
+    assert queue.submit('next') == 4
+
+
+def test_concurrent_submits_each_advance_the_prediction():
+    keynote = FakeKeynote(current=3)
+    # Both taps read Keynote's position before either has queued its move.
+    both_read = threading.Barrier(2)
+
+    def position():
+        both_read.wait(timeout=5)
+        return keynote.position()
+
+    queue = NavigationQueue(keynote.execute, position)
+    targets = []
+    taps = [threading.Thread(target=lambda: targets.append(queue.submit('next'))) for _ in range(2)]
+    for tap in taps:
+        tap.start()
+    for tap in taps:
+        tap.join()
+    queue.drain()
+
+    assert sorted(targets) == [4, 5]
+    assert keynote.commands == [('goto', 5)]
+    assert queue.stats()["coalesced"] == 1
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from directory_index import DirectoryIndex, PresentationCrawler
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'Talks').mkdir()
+    (tmp_path / 'Talks' / 'Keynote.key').write_text('')
+    (tmp_path / 'Talks' / 'Archive').mkdir()
+    (tmp_path / 'Talks' / 'Archive' / 'old keynote.key').mkdir()  # a package-style document
+    (tmp_path / 'notes.txt').write_text('')
+    (tmp_path / '.hidden').mkdir()
+    (tmp_path / '.hidden' / 'secret.key').write_text('')
+    (tmp_path / 'b.key').write_text('')
+    (tmp_path / 'A.key').write_text('')
+    return tmp_path
+
+
+def test_listing_is_cached_until_the_directory_changes(tree, mocker):
+    index = DirectoryIndex()
+    assert [item['name'] for item in index.list(str(tree))] == ['Talks', 'A.key', 'b.key']
+
+    scandir = mocker.spy(os, 'scandir')
+    index.list(str(tree))
+    assert scandir.call_count == 0
+    assert index.hits == 1
+
+    (tree / 'c.key').write_text('')
+    os.utime(tree, ns=(0, os.stat(tree).st_mtime_ns + 1000))
+    assert [item['name'] for item in index.list(str(tree))] == ['Talks', 'A.key', 'b.key', 'c.key']
+    assert scandir.call_count == 1
+
+
+def test_cursor_pagination(tree):
+    index = DirectoryIndex()
+    first, cursor = index.page(str(tree), limit=2)
+    assert [item['name'] for item in first] == ['Talks', 'A.key']
+
+    # An entry sorting before the cursor does not shift the next page.
+    (tree / '0.key').write_text('')
+    second, cursor = index.page(str(tree), cursor, limit=2)
+    assert [item['name'] for item in second] == ['b.key']
+    assert cursor is None
+
+
+def test_invalid_cursor(tree):
+    with pytest.raises(ValueError):
+        DirectoryIndex().page(str(tree), 'not-a-cursor', limit=2)
+
+
+def test_crawler_indexes_key_files(tree):
+    crawler = PresentationCrawler(str(tree))
+    crawler.crawl()
+
+    assert crawler.complete
+    assert [item['path'] for item in crawler.search('KEYNOTE')] == ['Talks/Keynote.key', 'Talks/Archive/old keynote.key']
+    assert crawler.search('secret') == []
+
+
+def test_recrawl_only_rescans_changed_directories(tree, mocker):
+    crawler = PresentationCrawler(str(tree))
+    crawler.crawl()
+
+    (tree / 'Talks' / 'new.key').write_text('')
+    os.utime(tree / 'Talks', ns=(0, os.stat(tree / 'Talks').st_mtime_ns + 1000))
+    scandir = mocker.spy(os, 'scandir')
+    crawler.crawl()
+
+    assert scandir.call_count == 1
+    assert [item['path'] for item in crawler.search('new')] == ['Talks/new.key']
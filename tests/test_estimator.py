@@ -0,0 +1,55 @@
+import pytest
+
+from estimator import PRIOR, TimingEstimator, calibration_samples, feature_row, solve
+
+
+def slide(number, title='', body='', notes='', images=0, media=0, skipped=False):
+    return {"slide": number, "title": title, "body": body, "notes": notes, "images": images, "media": media,
+            "skipped": skipped}
+
+
+def test_feature_row_counts_words_and_media():
+    assert feature_row(slide(1, title='Quarterly results', body='one two three', notes='a b c d', images=2, media=1)) == \
+        (1.0, 2.0, 3.0, 4.0, 2.0, 1.0)
+
+
+def test_solve():
+    assert solve([[2.0, 1.0], [1.0, 3.0]], [3.0, 5.0]) == pytest.approx([0.8, 1.4])
+    with pytest.raises(ValueError):
+        solve([[1.0, 2.0], [2.0, 4.0]], [1.0, 2.0])
+
+
+def test_uncalibrated_estimates_use_the_prior():
+    estimator = TimingEstimator()
+    slides = [slide(1, title='Hi'), slide(2, notes=' '.join(['word'] * 150), images=1), slide(3, skipped=True)]
+
+    # 15 + 0.5 = 15.5 -> 15; 15 + 60 + 5 = 80; skipped slides are not shown.
+    assert estimator.estimate(slides) == [15, 80, 0]
+    assert estimator.estimate([slide(1, body=' '.join(['word'] * 5000))]) == [900]
+
+
+def test_fit_moves_towards_the_history_but_keeps_the_prior_for_unseen_features():
+    # This speaker takes about 0.8 s per word of notes, twice the prior.
+    samples = [(slide(i, notes=' '.join(['word'] * words)), 15 + 0.8 * words) for i, words in enumerate(range(20, 220, 5))]
+    estimator = TimingEstimator(prior_strength=1)
+
+    assert estimator.fit(samples) == len(samples)
+
+    weights = estimator.stats()["weights"]
+    assert weights["notes_words"] == pytest.approx(0.8, abs=0.05)
+    assert weights["images"] == pytest.approx(PRIOR[4])
+    assert estimator.estimate([slide(1, notes=' '.join(['word'] * 100))]) == [95]
+
+    assert estimator.fit([]) == 0
+    assert estimator.weights == PRIOR
+
+
+def test_calibration_samples_pair_content_with_median_actuals():
+    history = type('History', (), {"stats": lambda self, presentation_id: {"slides": [
+        {"slide": 1, "median": 42.0}, {"slide": 2, "median": None}, {"slide": 3, "median": 10.0}]}
+        if presentation_id == 'deck.key' else None})()
+    content = {"deck.key": [slide(1, title='A'), slide(2), slide(3, skipped=True)], "other.key": [slide(1)]}
+
+    samples = list(calibration_samples(history, content.get, ['deck.key', 'other.key', 'unknown.key']))
+
+    assert samples == [(slide(1, title='A'), 42.0)]
@@ -0,0 +1,38 @@
+from event_log import EventLog
+
+
+def test_events_are_numbered_and_replayed_after_a_seq():
+    log = EventLog(epoch='e1')
+    assert log.append('slide_update', {'slide_number': 2}, room='presentation:a') == {'slide_number': 2, 'seq': 1}
+    assert log.append('presentation_started') == {'seq': 2}
+    log.append('slide_update', {'slide_number': 3}, room='presentation:a')
+
+    assert log.since('e1', 1, rooms=(None, 'presentation:a')) == [
+        {"event": "presentation_started", "data": {"seq": 2}},
+        {"event": "slide_update", "data": {"slide_number": 3, "seq": 3}},
+    ]
+    assert log.since('e1', 3) == []
+    assert log.position() == {"epoch": "e1", "seq": 3}
+
+
+def test_events_for_other_rooms_are_skipped():
+    log = EventLog(epoch='e1')
+    log.append('slide_update', {'slide_number': 2}, room='presentation:a')
+    log.append('slide_update', {'slide_number': 7}, room='presentation:b')
+    log.append('presentation_opened', {'presentation_id': 'b'})
+
+    assert [item["data"]["seq"] for item in log.since('e1', 0, rooms=(None, 'presentation:a'))] == [1, 3]
+
+
+def test_gaps_that_cannot_be_replayed_need_a_snapshot():
+    log = EventLog(capacity=2, epoch='e1')
+    for slide in range(1, 5):
+        log.append('slide_update', {'slide_number': slide})
+
+    # Events 1 and 2 have been dropped.
+    assert log.since('e1', 1) is None
+    assert [item["data"]["slide_number"] for item in log.since('e1', 2)] == [3, 4]
+    # Another process, a restarted server, or a seq this log never issued.
+    assert log.since('e0', 4) is None
+    assert log.since('e1', 9) is None
+    assert log.stats() == {"epoch": "e1", "seq": 4, "buffered": 2, "capacity": 2}
@@ -0,0 +1,74 @@
+import time
+import uuid
+
+import socketio
+
+from fanout import LeaderLock, LocalPubSubManager, message_queue_options, presentation_room
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_message_queue_options():
+    assert message_queue_options(None) == {}
+    assert isinstance(message_queue_options('local')['client_manager'], LocalPubSubManager)
+    assert message_queue_options('redis://localhost:6379/0') == {"message_queue": 'redis://localhost:6379/0'}
+
+
+def test_local_queue_delivers_to_every_subscriber():
+    channel = uuid.uuid4().hex
+    first, second = LocalPubSubManager(channel=channel), LocalPubSubManager(channel=channel)
+    first_inbox, second_inbox = first.subscribe(), second.subscribe()
+    other = LocalPubSubManager(channel=uuid.uuid4().hex)
+    other_inbox = other.subscribe()
+
+    first._publish({"method": "emit", "event": "slide_update"})
+
+    assert second_inbox.get_nowait() == '{"method": "emit", "event": "slide_update"}'
+    assert first_inbox.qsize() == 1
+    assert other_inbox.empty()
+
+    second.unsubscribe()
+    first._publish({"method": "emit", "event": "clock"})
+    assert second_inbox.empty()
+
+
+def test_emit_on_one_worker_reaches_room_members_on_another():
+    channel = uuid.uuid4().hex
+    workers = []
+    for _ in range(2):
+        server = socketio.Server(async_mode='threading', client_manager=LocalPubSubManager(channel=channel))
+        server.manager.initialize()
+        workers.append(server)
+    sender, receiver = workers
+    delivered = []
+    receiver._send_eio_packet = lambda eio_sid, pkt: delivered.append((eio_sid, pkt.data))
+    follower = receiver.manager.connect('follower', '/')
+    receiver.manager.enter_room(follower, '/', presentation_room('deck.key'))
+    receiver.manager.connect('bystander', '/')
+
+    sender.emit('slide_update', {'slide_number': 3}, to=presentation_room('deck.key'))
+    sender.emit('slide_update', {'slide_number': 9}, to=presentation_room('other.key'))
+
+    assert wait_for(lambda: delivered)
+    time.sleep(0.05)
+    assert delivered == [('follower', '2["slide_update",{"slide_number":3}]')]
+
+
+def test_leader_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / 'monitor.lock')
+    leader, follower = LeaderLock(path), LeaderLock(path)
+
+    assert leader.acquire() is True
+    assert leader.acquire() is True
+    assert follower.acquire() is False
+    assert follower.is_leader is False
+
+    leader.release()
+    assert leader.is_leader is False
+    assert follower.acquire() is True
+    follower.release()
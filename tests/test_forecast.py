@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from forecast import FenwickTree, Forecast, ForecastEngine
+
+
+def deck(*estimates, actuals=None):
+    """Rows from estimates in seconds; 'B<seconds>' makes a break."""
+    slides, number = [], 0
+    for i, estimate in enumerate(estimates):
+        actual = actuals[i] if actuals and i < len(actuals) else None
+        if isinstance(estimate, str):
+            slides.append({"slide": "BREAK", "estimated_time_seconds": int(estimate[1:]), "actual_time_seconds": actual})
+        else:
+            number += 1
+            slides.append({"slide": number, "estimated_time_seconds": estimate, "actual_time_seconds": actual})
+    return slides
+
+
+def test_fenwick_tree_matches_plain_sums():
+    rng = random.Random(4)
+    values = [rng.randint(0, 9) for _ in range(37)]
+    tree = FenwickTree(values)
+    for _ in range(200):
+        index = rng.randrange(len(values))
+        values[index] = rng.randint(0, 9)
+        tree.set(index, values[index])
+        start, end = sorted(rng.sample(range(len(values) + 1), 2))
+        assert tree.range(start, end) == sum(values[start:end])
+    assert tree.total() == sum(values)
+
+
+def test_fenwick_find_maps_counts_to_indexes():
+    tree = FenwickTree([1, 1, 0, 1, 0, 1])
+    assert [tree.find(k) for k in range(1, 6)] == [0, 1, 3, 5, 6]
+
+
+def test_projection_scales_the_rest_by_the_pace_so_far():
+    # Slides 1 and 2 took 90s each against 60s estimates: pace 1.5.
+    forecast = Forecast(deck(60, 60, 60, 60, actuals=[90, 90]))
+
+    projection = forecast.project(3, elapsed=180, slide_elapsed=0, now=1000)
+
+    assert projection["pace"] == 1.5
+    assert projection["planned_total_seconds"] == 240
+    assert projection["projected_remaining_seconds"] == 180
+    assert projection["projected_total_seconds"] == 360
+    assert projection["finish_delta_seconds"] == 120
+    assert projection["behind_seconds"] == 60
+    assert projection["projected_finish_at"] == 1180
+
+
+def test_breaks_start_sections_and_slide_numbers_skip_them():
+    forecast = Forecast(deck(60, 60, 'B300', 60, 60, actuals=[30, 50]))
+
+    assert forecast.row_for_slide(3) == 3
+    assert forecast.row_for_slide(5) is None
+    projection = forecast.project(3, elapsed=380, slide_elapsed=0)
+    assert projection["section"] == 1
+    assert [(s["state"], s["planned_seconds"], s["delta_seconds"]) for s in projection["sections"]] == [
+        ("done", 120, -40), ("current", 420, 0)]
+
+
+def test_edits_update_the_projection_incrementally():
+    slides = deck(*[60] * 1000)
+    forecast = Forecast(slides)
+    before = forecast.project(500, elapsed=0, slide_elapsed=0, sections=False)
+
+    forecast.update_row(999, dict(slides[999], estimated_time_seconds=360))
+
+    after = forecast.project(500, elapsed=0, slide_elapsed=0, sections=False)
+    assert after["planned_total_seconds"] == before["planned_total_seconds"] + 300
+    assert after["sections"] is None
+
+
+def test_history_is_blended_into_the_remaining_time():
+    history = {"sessions": 3, "slides": [{"slide": 2, "mean": 120.0}, {"slide": 3, "mean": 120.0}]}
+    forecast = Forecast(deck(60, 60, 60), history=history, history_weight=0.5)
+
+    projection = forecast.project(1, elapsed=0, slide_elapsed=0)
+
+    # Plan: 180s left; history: 60 + 120 + 120 = 300s left.
+    assert projection["projected_remaining_seconds"] == 240
+    assert projection["history_sessions"] == 3
+
+
+def test_engine_pushes_only_significant_changes():
+    presentations = {"deck.key": {"slides": deck(60, 60, 'B60', 60)}}
+    engine = ForecastEngine(load=presentations.get, threshold=15)
+
+    assert engine.changed_projection("deck.key", 1, 0, 0) is not None
+    # Time passing as planned does not move the projected total.
+    assert engine.changed_projection("deck.key", 1, 10, 10) is None
+    assert engine.changed_projection("deck.key", 1, 80, 80)["projected_total_seconds"] == 260
+    # Entering the next section always pushes.
+    assert engine.changed_projection("deck.key", 3, 260, 0)["section"] == 1
+    assert engine.changed_projection("unknown.key", 1, 0, 0) is None
+
+
+def test_engine_applies_edits_and_rebuilds_after_structural_changes():
+    presentations = {"deck.key": {"slides": deck(60, 60)}}
+    engine = ForecastEngine(load=presentations.get)
+    assert engine.project("deck.key", 1, 0, 0)["planned_total_seconds"] == 120
+
+    engine.update_row("deck.key", 1, {"slide": 2, "estimated_time_seconds": 30, "actual_time_seconds": None})
+    assert engine.project("deck.key", 1, 0, 0)["planned_total_seconds"] == 90
+    assert engine.rebuilds == 1
+
+    presentations["deck.key"] = {"slides": deck(60, 'B120', 60)}
+    engine.invalidate("deck.key")
+    assert engine.project("deck.key", 1, 0, 0)["planned_total_seconds"] == 240
+    assert engine.rebuilds == 2
+
+
+@pytest.mark.parametrize("slide_number", [0, 3])
+def test_unknown_slides_have_no_projection(slide_number):
+    assert Forecast(deck(60, 60)).project(slide_number, 0, 0) is None
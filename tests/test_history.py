@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+from history import RehearsalHistory
+
+
+def write_export(directory, timestamp, actuals, presentation_id="Talks/deck.key", estimate=60):
+    export = {
+        "presentation_id": presentation_id,
+        "name": os.path.basename(presentation_id),
+        "slides": [{"slide": i, "estimated_time_seconds": estimate, "actual_time_seconds": actual}
+                   for i, actual in enumerate(actuals, start=1)],
+    }
+    path = directory / f"deck_elapsed_{timestamp}.json"
+    path.write_text(json.dumps(export))
+    return path
+
+
+@pytest.fixture
+def elapsed_dir(tmp_path):
+    directory = tmp_path / 'elapsed_times'
+    directory.mkdir()
+    return directory
+
+
+def test_per_slide_statistics(elapsed_dir):
+    for day, actual in enumerate([10, 20, 30, 40, 50], start=1):
+        write_export(elapsed_dir, f"2025070{day}-090000", [actual, None])
+
+    stats = RehearsalHistory(str(elapsed_dir)).stats("Talks/deck.key")
+
+    assert stats["sessions"] == 5
+    first, second = stats["slides"]
+    assert first["mean"] == 30
+    assert first["median"] == 30
+    assert first["p90"] == pytest.approx(46)
+    assert first["trend_per_session"] == pytest.approx(10)
+    assert first["drift_seconds"] == -30
+    assert second["sessions"] == 0
+    assert second["mean"] is None
+
+
+def test_last_n_sessions_in_chronological_order(elapsed_dir):
+    # Written out of order on purpose.
+    write_export(elapsed_dir, "20250703-090000", [30])
+    write_export(elapsed_dir, "20250701-090000", [10])
+    write_export(elapsed_dir, "20250702-090000", [20])
+
+    stats = RehearsalHistory(str(elapsed_dir)).stats("Talks/deck.key", last=2)
+
+    assert stats["sessions"] == 2
+    assert stats["slides"][0]["mean"] == 25
+    assert stats["first_session"] == "2025-07-02T09:00:00"
+
+
+def test_exports_are_parsed_once(elapsed_dir, mocker):
+    write_export(elapsed_dir, "20250701-090000", [10])
+    history = RehearsalHistory(str(elapsed_dir))
+    history.stats("Talks/deck.key")
+    assert history.files_ingested == 1
+
+    load = mocker.spy(json, 'load')
+    history.stats("Talks/deck.key")
+    assert load.call_count == 0
+
+    write_export(elapsed_dir, "20250702-090000", [20])
+    assert history.stats("Talks/deck.key")["sessions"] == 2
+    assert history.files_ingested == 2
+
+
+def test_cache_survives_restart(elapsed_dir):
+    write_export(elapsed_dir, "20250701-090000", [10])
+    RehearsalHistory(str(elapsed_dir)).refresh()
+
+    restarted = RehearsalHistory(str(elapsed_dir))
+    assert restarted.stats("Talks/deck.key")["sessions"] == 1
+    assert restarted.files_ingested == 0
+
+
+def test_legacy_exports_are_grouped_by_name(elapsed_dir):
+    (elapsed_dir / "deck_elapsed_20250701-090000.json").write_text(json.dumps(
+        {"name": "deck.key", "slides": [{"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": 12}]}))
+
+    stats = RehearsalHistory(str(elapsed_dir)).stats("Talks/deck.key")
+
+    assert stats["slides"][0]["mean"] == 12
+
+
+def test_unknown_presentation_has_no_stats(elapsed_dir):
+    assert RehearsalHistory(str(elapsed_dir)).stats("missing.key") is None
@@ -0,0 +1,54 @@
+from idempotency import IdempotencyStore, request_fingerprint, NEW, REPLAY, IN_PROGRESS, MISMATCH
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_retries_get_the_first_response():
+    store = IdempotencyStore()
+    fingerprint = request_fingerprint('PATCH', '/api/presentations/deck.key/slides/0', b'{"actual_time_seconds":42}')
+
+    assert store.begin('k1', fingerprint) == (NEW, None)
+    assert store.begin('k1', fingerprint) == (IN_PROGRESS, None)
+    store.complete('k1', (b'{"status":"success"}', 200, 'application/json'))
+
+    assert store.begin('k1', fingerprint) == (REPLAY, (b'{"status":"success"}', 200, 'application/json'))
+    assert store.stats()["replays"] == 1
+
+
+def test_a_key_reused_for_another_request_is_refused():
+    store = IdempotencyStore()
+    store.begin('k1', request_fingerprint('PATCH', '/a', b'1'))
+
+    assert store.begin('k1', request_fingerprint('PATCH', '/a', b'2'))[0] == MISMATCH
+    assert store.begin('k1', request_fingerprint('PUT', '/a', b'1'))[0] == MISMATCH
+
+
+def test_released_keys_run_again():
+    store = IdempotencyStore()
+    store.begin('k1', 'fingerprint')
+    store.release('k1')
+
+    assert store.begin('k1', 'fingerprint')[0] == NEW
+
+
+def test_keys_expire_and_are_bounded():
+    clock = FakeClock()
+    store = IdempotencyStore(capacity=2, ttl=60, clock=clock)
+    for key in ('a', 'b'):
+        store.begin(key, key)
+        store.complete(key, (b'', 200, 'application/json'))
+
+    # Full: the oldest key makes room for the new one.
+    store.begin('c', 'c')
+    assert store.begin('a', 'a')[0] == NEW
+    assert store.stats()["keys"] == 2
+
+    clock.now = 61
+    assert store.begin('c', 'c')[0] == NEW
+    assert store.stats()["keys"] == 1
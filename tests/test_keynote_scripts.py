@@ -0,0 +1,125 @@
+import subprocess
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from keynote_scripts import KEYNOTE_SCRIPTS, RecordingRunner, ScriptLibrary, SubprocessRunner
+from script_host import ScriptTimeout
+
+
+def test_scripts_take_their_values_as_arguments():
+    for name, source in KEYNOTE_SCRIPTS.items():
+        assert 'on run argv' in source, name
+        assert '{}' not in source and '{slide' not in source and '{file' not in source, name
+    library = ScriptLibrary()
+    # The source, and so the compiled form, is the same whatever the arguments.
+    assert library.scripts['goto'].digest == ScriptLibrary().scripts['goto'].digest
+
+
+def test_subprocess_runner_passes_arguments_verbatim(mocker):
+    mock_run = mocker.patch('subprocess.run', return_value=MagicMock(returncode=0, stdout="\n"))
+    library = ScriptLibrary(runner=SubprocessRunner())
+    path = '/Users/me/Talks/The "final" deck.key'
+
+    library.run('open', [path])
+
+    command = mock_run.call_args.args[0]
+    assert command[:2] == ['osascript', '-e']
+    assert command[2] == KEYNOTE_SCRIPTS['open']
+    assert command[3:] == [path]
+
+
+def test_subprocess_runner_uses_precompiled_scripts(mocker, tmp_path):
+    mocker.patch('shutil.which', return_value='/usr/bin/osacompile')
+
+    def fake_run(command, **kwargs):
+        if command[0] == 'osacompile':
+            (tmp_path / command[2].rsplit('/', 1)[-1]).write_text('compiled')
+        return MagicMock(returncode=0, stdout="7\n")
+
+    mock_run = mocker.patch('subprocess.run', side_effect=fake_run)
+    library = ScriptLibrary(runner=SubprocessRunner(compiled_dir=str(tmp_path)))
+
+    assert library.warm() == len(KEYNOTE_SCRIPTS)
+    compiles = mock_run.call_count
+    assert library.run('goto', [7]).stdout.strip() == '7'
+
+    command = mock_run.call_args.args[0]
+    assert command[1].startswith(str(tmp_path)) and command[1].endswith('.scpt')
+    assert command[2:] == ['7']
+    # Already compiled files are reused by the next process.
+    assert ScriptLibrary(runner=SubprocessRunner(compiled_dir=str(tmp_path))).warm() == len(KEYNOTE_SCRIPTS)
+    assert mock_run.call_count == compiles + 1
+
+
+def test_warm_is_a_no_op_without_osacompile(mocker):
+    mocker.patch('shutil.which', return_value=None)
+    mock_run = mocker.patch('subprocess.run')
+    assert ScriptLibrary(runner=SubprocessRunner()).warm() == 0
+    mock_run.assert_not_called()
+
+
+def test_recording_runner():
+    runner = RecordingRunner({'count': '12', 'goto': lambda args: args[0],
+                              'close': subprocess.CalledProcessError(1, 'osascript')})
+    library = ScriptLibrary(runner=runner)
+
+    assert library.run('count').stdout.strip() == '12'
+    assert library.run('goto', [4]).stdout.strip() == '4'
+    assert library.run('start').stdout.strip() == ''
+    with pytest.raises(subprocess.CalledProcessError):
+        library.run('close')
+    with pytest.raises(KeyError):
+        library.run('rm -rf')
+
+    assert runner.calls == [('count', []), ('goto', ['4']), ('start', []), ('close', [])]
+
+
+def test_subprocess_runner_kills_scripts_after_their_timeout(mocker):
+    mock_run = mocker.patch('subprocess.run', side_effect=subprocess.TimeoutExpired('osascript', 2.5))
+    library = ScriptLibrary(runner=SubprocessRunner(), timeouts={'export': 30}, default_timeout=2.5)
+
+    with pytest.raises(ScriptTimeout) as raised:
+        library.run('start')
+
+    assert raised.value.operation == 'start'
+    assert raised.value.timeout == 2.5
+    assert mock_run.call_args.kwargs['timeout'] == 2.5
+    assert library.timeout_for('export') == 30
+    assert library.stats()['timed_out'] == 1
+
+
+def test_lanes_bound_concurrency_independently():
+    release = threading.Event()
+    runner = RecordingRunner({'status': 'closed', 'goto': lambda args: release.wait(5) and args[0]})
+    library = ScriptLibrary(runner=runner, default_timeout=0.2, limits={'default': 1, 'monitor': 1})
+    stuck = threading.Thread(target=library.run, args=('goto', [3]))
+    stuck.start()
+    while library.gates['default'].in_use == 0:
+        time.sleep(0.01)
+
+    # A stuck command holds the only default slot: the next one gives up, the monitor's lane is unaffected.
+    with pytest.raises(ScriptTimeout) as raised:
+        library.run('start')
+    assert raised.value.operation == 'start'
+    assert library.run('status', lane='monitor').stdout.strip() == 'closed'
+
+    release.set()
+    stuck.join()
+    assert library.run('start').returncode == 0
+    assert library.stats()['lanes']['default'] == {"limit": 1, "in_use": 0, "waited": 1}
+
+
+def test_blocking_calls_go_through_offload():
+    offloaded = []
+
+    def offload(fn, *args):
+        offloaded.append(args[0].name)
+        return fn(*args)
+
+    library = ScriptLibrary(runner=RecordingRunner({'count': '5'}), offload=offload)
+
+    assert library.run('count').stdout.strip() == '5'
+    assert offloaded == ['count']
@@ -0,0 +1,65 @@
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    emits = registry.counter('emits_total', 'Events emitted.', labels=('event',))
+    registry.gauge('clients', 'Connected clients.', fn=lambda: 3)
+    emits.inc(event='slide_update')
+    emits.inc(2, event='slide_update')
+    emits.inc(event='say "hi"')
+
+    assert emits.value(event='slide_update') == 3
+    assert registry.render().splitlines() == [
+        '# HELP clients Connected clients.',
+        '# TYPE clients gauge',
+        'clients 3',
+        '# HELP emits_total Events emitted.',
+        '# TYPE emits_total counter',
+        'emits_total{event="say \\"hi\\""} 1',
+        'emits_total{event="slide_update"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('script_seconds', 'Script time.', labels=('operation',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, operation='next')
+
+    assert latency.count(operation='next') == 3
+    assert latency.total(operation='next') == pytest.approx(5.55)
+    lines = registry.render().splitlines()
+    assert 'script_seconds_bucket{operation="next",le="0.1"} 1' in lines
+    assert 'script_seconds_bucket{operation="next",le="1"} 2' in lines
+    assert 'script_seconds_bucket{operation="next",le="+Inf"} 3' in lines
+    assert 'script_seconds_count{operation="next"} 3' in lines
+
+
+def test_labels_must_match_and_declarations_are_idempotent():
+    registry = MetricsRegistry()
+    counter = registry.counter('polls_total', 'Polls.')
+    assert registry.counter('polls_total', 'Polls.') is counter
+    with pytest.raises(ValueError):
+        registry.gauge('polls_total', 'Polls.')
+    with pytest.raises(ValueError):
+        counter.inc(event='x')
+
+
+def test_slow_calls_are_logged(capsys):
+    registry = MetricsRegistry(slow_call_seconds=0)
+    logged = registry.histogram('slow_seconds', 'Logged.', labels=('operation',), log_slow=True)
+    quiet = registry.histogram('quiet_seconds', 'Not logged.')
+
+    with pytest.raises(RuntimeError):
+        with logged.time(operation='open'):
+            raise RuntimeError("Keynote is not running")
+    with quiet.time():
+        pass
+
+    assert logged.count(operation='open') == 1
+    output = capsys.readouterr().out
+    assert 'Slow call: slow_seconds{operation="open"}' in output
+    assert 'quiet_seconds' not in output
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from monitor_scheduler import AdaptiveScheduler
+
+OPEN_IDLE = {"document_open": True, "is_playing": False}
+PLAYING = {"document_open": True, "is_playing": True}
+CLOSED = {"document_open": False, "is_playing": False}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(clock):
+    return AdaptiveScheduler(fast_interval=0.1, fast_window=2.0, base_interval=0.5,
+                             playing_max_interval=1.0, idle_max_interval=3.0,
+                             closed_max_interval=8.0, clock=clock)
+
+
+def test_polls_fast_after_activity_then_backs_off():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.notify_activity()
+
+    assert scheduler.record_poll(OPEN_IDLE, changed=False) == 0.1
+    clock.now = 2.5
+    intervals = [scheduler.record_poll(OPEN_IDLE, changed=False) for _ in range(5)]
+
+    assert intervals == [1.0, 2.0, 3.0, 3.0, 3.0]
+
+
+def test_backoff_cap_depends_on_presentation_state():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+
+    assert max(scheduler.record_poll(PLAYING, changed=False) for _ in range(10)) == 1.0
+    assert max(scheduler.record_poll(CLOSED, changed=False) for _ in range(10)) == 8.0
+
+
+def test_detected_change_resets_to_fast_polling_and_records_lag():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    scheduler.record_poll(PLAYING, changed=False)
+    clock.now = 0.8
+
+    assert scheduler.record_poll(PLAYING, changed=True) == 0.1
+    stats = scheduler.stats()
+    assert stats["polls"] == 2
+    assert stats["changes_detected"] == 1
+    assert stats["last_detection_lag_seconds"] == 0.8
+
+
+def test_monitor_pauses_without_clients():
+    scheduler = AdaptiveScheduler()
+    resumed = threading.Event()
+
+    def monitor():
+        scheduler.wait_for_clients()
+        resumed.set()
+
+    threading.Thread(target=monitor, daemon=True).start()
+    time.sleep(0.05)
+    assert not resumed.is_set()
+    assert scheduler.stats()["paused"]
+
+    scheduler.client_connected()
+    assert resumed.wait(1)
+    assert scheduler.wait_for_clients() is False
+
+
+def test_holds_keep_the_monitor_polling_without_clients():
+    scheduler = AdaptiveScheduler()
+    scheduler.client_connected()
+    scheduler.hold()
+    scheduler.client_disconnected()
+
+    assert scheduler.wait_for_clients() is False
+    assert not scheduler.stats()["paused"]
+    scheduler.release()
+    assert scheduler.stats()["paused"]
+
+
+def test_activity_wakes_sleeping_monitor():
+    scheduler = AdaptiveScheduler()
+    threading.Timer(0.05, scheduler.notify_activity).start()
+    started = time.monotonic()
+    scheduler.sleep(5)
+    assert time.monotonic() - started < 1
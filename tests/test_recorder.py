@@ -0,0 +1,122 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from recorder import SessionAggregates, SessionRecorder, merge_into_slides, OPEN, PLAY, SLIDE, STOP, CLOSE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_aggregates_count_played_time_visits_and_back_navigation():
+    aggregates = SessionAggregates()
+    for t, kind, slide in [(0, OPEN, 1), (5000, SLIDE, 2), (6000, PLAY, 2), (36000, SLIDE, 3),
+                           (46000, SLIDE, 2), (51000, STOP, 2), (90000, PLAY, 2), (100000, CLOSE, None)]:
+        aggregates.apply(t, kind, slide)
+
+    snapshot = aggregates.snapshot()
+
+    # Time in edit mode (before play, and while stopped) does not count; resuming on slide 2 is not a new visit.
+    assert snapshot["slides"] == [{"slide": 2, "seconds": 45.0, "visits": 2}, {"slide": 3, "seconds": 10.0, "visits": 1}]
+    assert snapshot["back_navigations"] == 1
+    assert snapshot["played_seconds"] == 55.0
+    assert snapshot["duration_seconds"] == 100.0
+
+
+def test_records_are_buffered_then_written(tmp_path, clock):
+    recorder = SessionRecorder(str(tmp_path), flush_records=4, flush_interval=10, clock=clock)
+    session_id = recorder.begin("Talks/Quarterly Review.key", 1)
+    assert session_id.startswith("Quarterly-Review-")
+    recorder.record(PLAY, 1)
+    assert recorder.records_written == 0
+
+    recorder.record(SLIDE, 2)
+    assert recorder.records_written == 4
+    recorder.record(SLIDE, 3)
+    clock.now += 10
+    recorder.flush_if_due()
+    assert recorder.records_written == 5
+    assert recorder.current()["aggregates"]["slides"][-1] == {"slide": 3, "seconds": 10.0, "visits": 1}
+
+
+def test_ending_a_session_compresses_its_log(tmp_path, clock):
+    recorder = SessionRecorder(str(tmp_path), clock=clock)
+    session_id = recorder.begin("deck.key", 1)
+    recorder.record(PLAY, 1)
+    clock.now += 12.5
+    recorder.record(SLIDE, 2)
+
+    ended, aggregates = recorder.end()
+
+    assert ended == session_id and not recorder.active
+    assert os.listdir(tmp_path) == [f"{session_id}.log.gz"]
+    with gzip.open(tmp_path / f"{session_id}.log.gz", 'rt') as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[0])["presentation_id"] == "deck.key"
+    assert [json.loads(line) for line in lines[1:]] == [[0, 'o', 1], [0, 'p', 1], [12500, 's', 2], [12500, 'c', None]]
+    assert recorder.aggregates(session_id) == aggregates
+    assert b''.join(recorder.stream(session_id)).decode().splitlines() == lines
+    assert recorder.sessions("deck.key")[0]["session"] == session_id
+    assert recorder.sessions("other.key") == []
+
+
+def test_logs_left_by_a_crash_are_compressed_and_readable(tmp_path, clock):
+    crashed = SessionRecorder(str(tmp_path), flush_records=1, clock=clock)
+    session_id = crashed.begin("deck.key", 1)
+    crashed.record(PLAY, 1)
+    clock.now += 30
+    crashed.record(SLIDE, 2)
+
+    recorder = SessionRecorder(str(tmp_path), clock=clock)
+    recorder.begin("deck.key", 1)
+
+    assert recorder.locate(session_id) == (str(tmp_path / f"{session_id}.log.gz"), True)
+    assert recorder.aggregates(session_id)["slides"][0] == {"slide": 1, "seconds": 30.0, "visits": 1}
+    assert recorder.locate("../etc/passwd") is None
+
+
+def test_recovery_leaves_the_live_log_of_another_process_alone(tmp_path, clock):
+    other = SessionRecorder(str(tmp_path), flush_records=1, clock=clock)
+    # The parent of the test run stands in for another worker that is still recording.
+    other.pid = os.getppid()
+    live_id = other.begin("deck.key", 1)
+    crashed = SessionRecorder(str(tmp_path), flush_records=1, clock=clock)
+    exited = subprocess.Popen([sys.executable, '-c', ''])
+    exited.wait()
+    crashed.pid = exited.pid
+    clock.now += 1
+    crashed_id = crashed.begin("other.key", 1)
+
+    recorder = SessionRecorder(str(tmp_path), clock=clock)
+    recorder.begin("third.key", 1)
+
+    assert recorder.locate(live_id) == (str(tmp_path / f"{live_id}.log"), False)
+    assert recorder.locate(crashed_id) == (str(tmp_path / f"{crashed_id}.log.gz"), True)
+
+
+def test_merge_into_slides_keeps_breaks():
+    slides = [{"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": 12},
+              {"slide": "BREAK", "estimated_time_seconds": 300, "actual_time_seconds": None},
+              {"slide": 2, "estimated_time_seconds": 60, "actual_time_seconds": 50}]
+    aggregates = {"slides": [{"slide": 1, "seconds": 61.4, "visits": 2}]}
+
+    merged = merge_into_slides(slides, aggregates)
+
+    assert merged == [{"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": 61, "visits": 2},
+                      slides[1],
+                      {"slide": 2, "estimated_time_seconds": 60, "actual_time_seconds": None, "visits": 0}]
+    assert slides[0]["actual_time_seconds"] == 12
@@ -0,0 +1,116 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from script_host import ScriptHostPool, ScriptTimeout
+
+FAKE_OSASCRIPT = '''
+import sys, time
+script, args = sys.argv[2], sys.argv[3:]
+if script.startswith("sleep"):
+    time.sleep(float(script.split()[1]))
+if script == "fail":
+    print("Keynote got an error", file=sys.stderr)
+    sys.exit(1)
+print("||".join([script] + args))
+'''
+
+
+@pytest.fixture
+def fake_runner(tmp_path):
+    """A stand-in for osascript that echoes the script and its arguments."""
+    path = tmp_path / 'fake_osascript.py'
+    path.write_text(FAKE_OSASCRIPT)
+    return [sys.executable, str(path)]
+
+
+@pytest.fixture
+def pool(fake_runner):
+    pool = ScriptHostPool(size=2, runner=fake_runner, timeout=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_runs_scripts_through_persistent_workers(pool):
+    result = pool.run('count of slides', args=['a', 'b'])
+    assert result.returncode == 0
+    assert result.stdout.strip() == 'count of slides||a||b'
+
+    pids = {worker.process.pid for worker in pool._workers}
+    for _ in range(5):
+        pool.run('status')
+    assert {worker.process.pid for worker in pool._workers} == pids
+    assert sum(w['calls'] for w in pool.health()['workers']) == 6
+
+
+def test_pool_raises_called_process_error_on_failure(pool):
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        pool.run('fail')
+    assert 'Keynote got an error' in excinfo.value.stderr
+
+    result = pool.run('fail', check=False)
+    assert result.returncode == 1
+
+
+def test_pool_times_out_hung_scripts(pool):
+    with pytest.raises(ScriptTimeout):
+        pool.run('sleep 5', timeout=0.3)
+    # The pool keeps serving after the timeout.
+    assert pool.run('status').stdout.strip() == 'status'
+
+
+def test_pool_times_out_waiting_for_a_free_worker(fake_runner):
+    pool = ScriptHostPool(size=1, runner=fake_runner, timeout=5)
+    try:
+        pool.start()
+        slow = threading.Thread(target=pool.run, args=('sleep 1',))
+        slow.start()
+        time.sleep(0.2)
+        # The only worker is busy: the call gives up after its own timeout instead of waiting for it.
+        with pytest.raises(ScriptTimeout):
+            pool.run('status', timeout=0.2)
+        slow.join()
+        assert pool.run('status').stdout.strip() == 'status'
+    finally:
+        pool.shutdown()
+
+
+def test_pool_restarts_crashed_workers(pool):
+    pool.start()
+    for worker in pool._workers:
+        worker.process.kill()
+        worker.process.wait()
+
+    assert pool.run('status').stdout.strip() == 'status'
+    pool.check_health()
+    assert all(w['alive'] for w in pool.health()['workers'])
+    assert pool.restarts == 2
+
+
+def test_pool_restarts_unresponsive_workers(fake_runner):
+    silent_worker = [sys.executable, '-c', 'import time; time.sleep(60)']
+    pool = ScriptHostPool(size=1, command=silent_worker, runner=fake_runner)
+    try:
+        with pytest.raises(ScriptTimeout):
+            pool.run('status', timeout=0.2)
+        assert pool.restarts == 1
+    finally:
+        pool.shutdown()
+
+
+def test_pool_reports_missing_runner(tmp_path):
+    pool = ScriptHostPool(size=1, runner=[str(tmp_path / 'missing-osascript')])
+    try:
+        with pytest.raises(FileNotFoundError):
+            pool.run('status')
+    finally:
+        pool.shutdown()
+
+
+def test_pool_compiles_on_every_worker(pool):
+    assert pool.compile(['count of slides', 'show next']) == 2
+    assert all(worker.calls == 2 for worker in pool._workers)
+    assert pool.run('show next').stdout.strip() == 'show next'
@@ -1,8 +1,10 @@
 import subprocess
+import pytest
 from server import get_keynote_status
 import os
 from unittest.mock import MagicMock, mock_open
 import json
+from timings_store import TimingsStore
 
 def test_get_keynote_status_closed(mocker):
     """
@@ -156,7 +158,7 @@ def test_list_presentations_not_found(client, mocker):
     assert data['message'] == 'Directory not found.'
 
 
-def test_open_presentation_success(client, mocker):
+def test_open_presentation_success(client, mocker, timings_store):
     """
     Test the /api/open_presentation endpoint for a successful opening of a presentation.
     """
@@ -166,47 +168,32 @@ def test_open_presentation_success(client, mocker):
     mocker.patch('os.path.abspath', side_effect=lambda x: os.path.join('/fake/home', x))
     mocker.patch('os.path.isfile', return_value=True)
 
-    # Mock subprocess calls
+    # One Keynote call opens the deck and reports its slide count and current slide
     mock_subprocess_run = mocker.patch('subprocess.run')
-    # This will be a bit complex as it's called multiple times with different expected outcomes
-    # 1. Open presentation (no output needed)
-    # 2. Get slide count
-    # 3. Get current slide number
-    mock_slide_count_result = MagicMock()
-    mock_slide_count_result.stdout = '10'
-    mock_current_slide_result = MagicMock()
-    mock_current_slide_result.stdout = '1'
-    
-    mock_subprocess_run.side_effect = [
-        MagicMock(returncode=0),  # open script
-        mock_slide_count_result,  # count script
-        mock_current_slide_result # current slide script
-    ]
+    mock_subprocess_run.return_value.stdout = 'my_deck.key||10||1||false||/fake/home/presentations/my_deck.key'
+    mock_subprocess_run.return_value.returncode = 0
 
-    # Mock file I/O for slide_timings.json
-    initial_json = {
-        "current_presentation_id": None,
-        "presentations": {}
-    }
-    mock_read_data = json.dumps(initial_json)
-    mocker.patch('builtins.open', mock_open(read_data=mock_read_data))
+    import server
+    opens_before = server.KEYNOTE_SCRIPT_SECONDS.count(operation='open')
 
     # Make the request
     response = client.post('/api/open_presentation', json={'filename': 'presentations/my_deck.key'})
 
     # Assertions
     assert response.status_code == 200
+    assert server.KEYNOTE_SCRIPT_SECONDS.count(operation='open') == opens_before + 1
     data = response.get_json()
     assert data['status'] == 'success'
     assert data['current_slide_number'] == 1
+    assert data['presentation_id'] == 'presentations/my_deck.key'
+    assert len(data['presentation']['slides']) == 10
+    assert data['keynote']['slide_count'] == 10
+    mock_subprocess_run.assert_called_once()
+    assert mock_subprocess_run.call_args[0][0][-1] == '/fake/home/presentations/my_deck.key'
 
-    # Check that open was called to write the updated timings
-    handle = open('static/slide_timings.json', 'r+')
-    handle.seek.assert_called_once_with(0)
-
-    # Reconstruct the full string written to the file from all write calls
-    written_data = "".join(call.args[0] for call in handle.write.call_args_list)
-    updated_json = json.loads(written_data)
+    # Check that the updated timings were written to disk
+    timings_store.flush()
+    updated_json = TimingsStore(timings_store.directory, legacy_path=None).load()
 
     assert updated_json['current_presentation_id'] == 'presentations/my_deck.key'
     assert 'presentations/my_deck.key' in updated_json['presentations']
@@ -286,4 +273,917 @@ def test_open_presentation_applescript_error(client, mocker):
     assert response.status_code == 500
     data = response.get_json()
     assert data['status'] == 'error'
-    assert 'Failed to open or get info from presentation' in data['message'] 
\ No newline at end of file
+    assert 'Failed to open or get info from presentation' in data['message'] 
+
+def test_read_endpoints_share_cached_status(client, mocker):
+    """
+    Test that repeated reads are served from the status snapshot and report its age.
+    """
+    mock_run = mocker.patch('subprocess.run')
+    mock_run.return_value.stdout = "My Presentation.key||5||true"
+    mock_run.return_value.returncode = 0
+
+    first = client.get('/api/current_slide_number').get_json()
+    second = client.get('/api/current_slide_number').get_json()
+
+    assert first['slide_number'] == 5
+    assert second['slide_number'] == 5
+    assert 'snapshot_age_ms' in second
+    mock_run.assert_called_once()
+
+
+def test_snapshot_returns_open_deck_with_its_timings(client, mocker, timings_store):
+    """
+    Test that /api/snapshot answers with Keynote's deck and its stored timings from one Keynote call,
+    and that the snapshot also answers the slide count and slide number reads.
+    """
+    mocker.patch('os.path.expanduser', return_value='/fake/home')
+    timings_store.open_presentation("Talks/deck.key", "deck.key", 4)
+    timings_store.open_presentation("Talks/other.key", "other.key", 2)
+    mock_run = mocker.patch('subprocess.run')
+    mock_run.return_value.stdout = "deck.key||4||3||true||/fake/home/Talks/deck.key/\n"
+    mock_run.return_value.returncode = 0
+
+    data = client.get('/api/snapshot').get_json()
+
+    assert data['status'] == 'success'
+    assert data['keynote'] == {"document_open": True, "is_playing": True, "slide_number": 3, "document_name": "deck.key",
+                               "slide_count": 4, "document_path": "/fake/home/Talks/deck.key"}
+    # The deck open in Keynote wins over the last one opened through the remote.
+    assert data['presentation_id'] == 'Talks/deck.key'
+    assert len(data['presentation']['slides']) == 4
+    assert 'clock' in data
+    assert client.get('/api/slide_count').get_json()['slide_count'] == 4
+    assert client.get('/api/current_slide_number').get_json()['slide_number'] == 3
+    mock_run.assert_called_once()
+
+
+def test_snapshot_without_keynote_falls_back_to_current_presentation(client, mocker, timings_store):
+    """
+    Test that /api/snapshot still serves the current presentation when Keynote cannot be reached.
+    """
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+    mocker.patch('subprocess.run', side_effect=FileNotFoundError("osascript"))
+
+    data = client.get('/api/snapshot').get_json()
+
+    assert data['keynote']['document_open'] is False
+    assert data['presentation_id'] == 'deck.key'
+    assert len(data['presentation']['slides']) == 2
+
+
+def test_resync_replays_missed_events_or_sends_a_snapshot(app, client, mocker, timings_store):
+    """
+    Test that a reconnecting client gets only the events it missed, and a snapshot when they are gone.
+    """
+    import server
+    timings_store.open_presentation("deck.key", "deck.key", 5)
+    follower = server.socketio.test_client(app, flask_test_client=client)
+    position = client.get('/api/session').get_json()['sync']
+
+    server.emit_slide_update(2)
+    server.emit_slide_update(3)
+
+    reply = follower.emit('resync', dict(position, presentation_id='deck.key'), callback=True)
+    assert reply['status'] == 'success'
+    assert [(item['event'], item['data']['slide_number']) for item in reply['events']] == [
+        ('slide_update', 2), ('clock', 2), ('forecast', 2), ('slide_update', 3), ('clock', 3), ('forecast', 3)]
+    assert reply['sync'] == server.event_log.position()
+
+    reply = follower.emit('resync', {'epoch': 'another-server', 'seq': position['seq']}, callback=True)
+    assert reply['status'] == 'snapshot'
+    assert reply['presentation_id'] == 'deck.key'
+    assert reply['sync'] == server.event_log.position()
+    assert 'clock' in reply and 'keynote' in reply and 'presentation' not in reply
+    follower.disconnect()
+
+
+def test_forecast_follows_timing_edits(client, mocker, timings_store):
+    """
+    Test that /api/forecast projects the finish and that timing edits push a new forecast when it moves.
+    """
+    import server
+    mock_emit = mocker.patch.object(server.socketio, 'emit')
+    mocker.patch.object(server, 'rehearsal_history', mocker.Mock(stats=mocker.Mock(return_value=None)))
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": True, "last_slide_number": 2, "document_name": "deck.key"
+    })
+    timings_store.open_presentation("deck.key", "deck.key", 3)
+
+    data = client.get('/api/forecast?slide=2').get_json()
+    assert data['forecast']['planned_total_seconds'] == 180
+    assert data['forecast']['presentation_id'] == 'deck.key'
+    assert client.get('/api/forecast?slide=9').status_code == 404
+
+    # The slide took twice its estimate: the rest of the deck is projected at that pace.
+    client.patch('/api/presentations/deck.key/slides/0', json={'actual_time_seconds': 120})
+    forecasts = [c.args[1] for c in mock_emit.call_args_list if c.args[0] == 'forecast']
+    assert forecasts and forecasts[-1]['pace'] == 2.0
+    assert client.get('/api/forecast?slide=2').get_json()['forecast']['projected_remaining_seconds'] == 240
+
+
+def test_keynote_timeouts_answer_with_structured_504(client, mocker):
+    """
+    Test that a script killed after its timeout answers 504 with the operation, instead of hanging or a 500.
+    """
+    import server
+    mock_run = mocker.patch('subprocess.run', side_effect=subprocess.TimeoutExpired('osascript', 10))
+
+    response = client.post('/api/start_presentation')
+
+    assert response.status_code == 504
+    assert response.get_json() == {
+        "status": "error", "error": "timeout", "operation": "start", "timeout_seconds": server.SCRIPT_TIMEOUT,
+        "message": f"Keynote did not answer within {server.SCRIPT_TIMEOUT} seconds. Is a dialog open in Keynote?"
+    }
+    assert mock_run.call_args.kwargs['timeout'] == server.SCRIPT_TIMEOUT
+
+    # A status read that times out is not mistaken for a closed presentation.
+    response = client.get('/api/current_slide_number')
+    assert response.status_code == 504
+    assert response.get_json()['operation'] == 'status'
+
+
+def test_next_slide_acknowledges_prediction_and_confirms(client, mocker):
+    """
+    Test that next_slide answers with the predicted slide and the queued command confirms it.
+    """
+    import server
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": True, "last_slide_number": 5, "document_name": "My Presentation.key"
+    })
+    mock_emit = mocker.patch.object(server.socketio, 'emit')
+    mock_run = mocker.patch('subprocess.run')
+    mock_run.side_effect = [
+        MagicMock(returncode=0, stdout="My Presentation.key||5||true"),  # status
+        MagicMock(returncode=0, stdout="10"),  # slide count
+        MagicMock(returncode=0, stdout="6"),  # show next
+    ]
+
+    response = client.post('/api/next_slide')
+    assert response.get_json()['slide_number'] == 6
+    assert response.get_json()['predicted'] is True
+    assert mock_run.call_count == 2
+
+    server.navigation_queue.drain()
+    assert [c for c in mock_emit.call_args_list if c.args[0] == 'slide_update'] == [mocker.call('slide_update', {'slide_number': 6, 'seq': mocker.ANY}, to=None)]
+    # The confirmed slide is served from the snapshot without another Keynote call.
+    assert client.get('/api/current_slide_number').get_json()['slide_number'] == 6
+    assert mock_run.call_count == 3
+
+
+def test_rapid_navigation_coalesces_into_one_goto(client, mocker):
+    """
+    Test that several queued taps run as a single goto clamped to the slide count.
+    """
+    import server
+    mocker.patch.object(server.socketio, 'emit')
+    mock_run = mocker.patch('subprocess.run')
+    mock_run.side_effect = [
+        MagicMock(returncode=0, stdout="My Presentation.key||5||true"),  # status
+        MagicMock(returncode=0, stdout="8"),  # slide count
+        MagicMock(returncode=0, stdout="8"),  # goto
+    ]
+
+    predictions = [client.post('/api/next_slide').get_json()['slide_number'] for _ in range(5)]
+    server.navigation_queue.drain()
+
+    assert predictions == [6, 7, 8, 8, 8]
+    assert mock_run.call_count == 3
+    # The slide number is passed as an argument, not spliced into the script.
+    goto_command = mock_run.call_args_list[2].args[0]
+    assert 'show slide slideNumber' in goto_command[2]
+    assert goto_command[3:] == ['8']
+
+
+def test_process_keynote_status_emits_slide_update(mocker, app):
+    """
+    Test that a slide change detected by the monitor is emitted and reported as a change.
+    """
+    import server
+    mock_emit = mocker.patch.object(server.socketio, 'emit')
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": True, "last_slide_number": 4, "document_name": "Deck.key"
+    })
+
+    changed = server.process_keynote_status({"document_open": True, "is_playing": True, "slide_number": 5, "document_name": "Deck.key"})
+    unchanged = server.process_keynote_status({"document_open": True, "is_playing": True, "slide_number": 5, "document_name": "Deck.key"})
+
+    assert changed is True
+    assert unchanged is False
+    assert [c for c in mock_emit.call_args_list if c.args[0] == 'slide_update'] == [mocker.call('slide_update', {'slide_number': 5, 'seq': mocker.ANY}, to=None)]
+
+
+def test_monitor_stats(client):
+    """
+    Test the /api/monitor_stats endpoint reports the scheduler counters.
+    """
+    response = client.get('/api/monitor_stats')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['status'] == 'success'
+    assert {'polls', 'changes_detected', 'current_interval_seconds'} <= set(data['monitor'])
+
+
+def test_patch_slide_timing(client, timings_store):
+    """
+    Test that PATCH updates one slide and is reflected in /api/timings.
+    """
+    timings_store.save({"current_presentation_id": "Talks/deck.key", "presentations": {
+        "Talks/deck.key": {"name": "deck.key", "slides": [
+            {"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": None},
+            {"slide": 2, "estimated_time_seconds": 60, "actual_time_seconds": None},
+        ]}
+    }})
+
+    response = client.patch('/api/presentations/Talks/deck.key/slides/1', json={"actual_time_seconds": 42})
+    assert response.status_code == 200
+    assert response.get_json()['slide'] == {"slide": 2, "estimated_time_seconds": 60, "actual_time_seconds": 42}
+
+    data = client.get('/api/timings').get_json()
+    assert data['presentations']['Talks/deck.key']['slides'][1]['actual_time_seconds'] == 42
+
+
+def test_patch_slide_timing_errors(client, timings_store):
+    """
+    Test PATCH validation for unknown presentations, slides and fields.
+    """
+    timings_store.save({"current_presentation_id": None, "presentations": {
+        "deck.key": {"name": "deck.key", "slides": [{"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": None}]}
+    }})
+
+    assert client.patch('/api/presentations/missing.key/slides/0', json={"actual_time_seconds": 1}).status_code == 404
+    assert client.patch('/api/presentations/deck.key/slides/5', json={"actual_time_seconds": 1}).status_code == 404
+    assert client.patch('/api/presentations/deck.key/slides/0', json={"slide": 3}).status_code == 400
+    assert client.patch('/api/presentations/deck.key/slides/0', json={"estimated_time_seconds": -5}).status_code == 400
+
+
+def test_presentation_index_and_shard_endpoints(client, timings_store):
+    """
+    Test the lightweight index, per-presentation reads with ETags and whole-deck PUT.
+    """
+    timings_store.open_presentation("Talks/deck.key", "deck.key", 2)
+
+    index = client.get('/api/presentations')
+    assert index.status_code == 200
+    assert index.get_json()['current_presentation_id'] == "Talks/deck.key"
+    assert index.get_json()['presentations'][0]['slide_count'] == 2
+    assert 'slides' not in index.get_json()['presentations'][0]
+
+    response = client.get('/api/presentations/Talks/deck.key')
+    assert response.status_code == 200
+    assert len(response.get_json()['presentation']['slides']) == 2
+    etag = response.headers['ETag']
+    assert client.get('/api/presentations/Talks/deck.key', headers={'If-None-Match': etag}).status_code == 304
+
+    deck = response.get_json()['presentation']
+    deck['slides'].insert(1, {"slide": "BREAK", "estimated_time_seconds": 300, "actual_time_seconds": None})
+    assert client.put('/api/presentations/Talks/deck.key', json=deck).status_code == 200
+    response = client.get('/api/presentations/Talks/deck.key', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['presentation']['slides'][1]['slide'] == 'BREAK'
+
+    assert client.get('/api/presentations/missing.key').status_code == 404
+    assert client.put('/api/presentations/Talks/deck.key', json={"name": "x"}).status_code == 400
+
+
+def test_presentation_stats(client, tmp_path, monkeypatch):
+    """
+    Test /api/presentations/<id>/stats over exported rehearsals.
+    """
+    import server
+    from history import RehearsalHistory
+    for day, actual in enumerate([30, 50], start=1):
+        export = {"presentation_id": "Talks/deck.key", "name": "deck.key",
+                  "slides": [{"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": actual}]}
+        (tmp_path / f"deck_elapsed_2025070{day}-090000.json").write_text(json.dumps(export))
+    monkeypatch.setattr(server, 'rehearsal_history', RehearsalHistory(str(tmp_path)))
+
+    response = client.get('/api/presentations/Talks/deck.key/stats')
+    assert response.status_code == 200
+    assert response.get_json()['slides'][0]['mean'] == 40
+
+    response = client.get('/api/presentations/Talks/deck.key/stats?last=1')
+    assert response.get_json()['slides'][0]['mean'] == 50
+
+    assert client.get('/api/presentations/Talks/deck.key/stats?last=0').status_code == 400
+    assert client.get('/api/presentations/missing.key/stats').status_code == 404
+
+
+def test_list_presentations_pagination(client, tmp_path, mocker):
+    """
+    Test that /api/list_presentations pages with cursors and rejects bad cursors.
+    """
+    mocker.patch('os.path.expanduser', return_value=str(tmp_path))
+    for name in ['a.key', 'b.key', 'c.key']:
+        (tmp_path / name).write_text('')
+
+    first = client.get('/api/list_presentations?path=.&limit=2').get_json()
+    assert [item['path'] for item in first['items']] == ['a.key', 'b.key']
+    second = client.get(f"/api/list_presentations?path=.&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [item['path'] for item in second['items']] == ['c.key']
+    assert second['next_cursor'] is None
+
+    assert client.get('/api/list_presentations?path=.&cursor=bogus').status_code == 400
+    assert client.get('/api/list_presentations?path=.&limit=0').status_code == 400
+
+
+def test_search_presentations(client, tmp_path, mocker):
+    """
+    Test /api/search_presentations against the crawler's name index.
+    """
+    import server
+    from directory_index import PresentationCrawler
+    (tmp_path / 'Talks').mkdir()
+    (tmp_path / 'Talks' / 'Quarterly Review.key').write_text('')
+    crawler = PresentationCrawler(str(tmp_path))
+    crawler.crawl()
+    mocker.patch.object(crawler, 'start')
+    mocker.patch.object(server, 'presentation_crawler', crawler)
+
+    data = client.get('/api/search_presentations?q=quarterly').get_json()
+    assert data['complete'] is True
+    assert data['items'] == [{'name': 'Quarterly Review.key', 'type': 'file', 'path': 'Talks/Quarterly Review.key'}]
+    assert client.get('/api/search_presentations?q=').status_code == 400
+
+
+def test_slide_thumbnail(client, tmp_path, mocker):
+    """
+    Test thumbnail serving with versioned, immutable URLs and strong ETags.
+    """
+    import server
+    from thumbnails import ThumbnailService, ThumbnailCache, PlaceholderRenderer
+    mocker.patch('os.path.expanduser', return_value=str(tmp_path))
+    (tmp_path / 'deck.key').write_text('slides')
+    mocker.patch.object(server, 'thumbnail_service', ThumbnailService(PlaceholderRenderer(), ThumbnailCache(str(tmp_path / 'cache'))))
+
+    manifest = client.get('/api/thumbnails/deck.key').get_json()
+    assert manifest['default_variant'] in manifest['variants']
+
+    response = client.get(f"/api/thumbnails/deck.key/2?size=small&v={manifest['version']}")
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    unversioned = client.get('/api/thumbnails/deck.key/2?size=small', headers={'If-None-Match': etag})
+    assert unversioned.status_code == 304
+    assert client.get('/api/thumbnails/deck.key/2?size=huge').status_code == 400
+    assert client.get('/api/thumbnails/missing.key/2').status_code == 404
+
+
+def test_slide_update_prefetches_thumbnails(mocker, monkeypatch, timings_store):
+    """
+    Test that a slide change queues the following slides for rendering.
+    """
+    import server
+    monkeypatch.setattr(server, 'THUMBNAIL_PREFETCH', 2)
+    mocker.patch('os.path.expanduser', return_value='/fake/home')
+    prefetch = mocker.patch.object(server.thumbnail_service, 'prefetch')
+    mocker.patch.object(server.socketio, 'emit')
+    timings_store.open_presentation("deck.key", "deck.key", 5)
+
+    server.emit_slide_update(3)
+
+    prefetch.assert_called_once_with('/fake/home/deck.key', 3, 2, None)
+
+
+def test_slide_update_does_not_export_during_a_slideshow(mocker, monkeypatch, timings_store, tmp_path):
+    """
+    Test that a slide change during a slideshow does not start exporting a deck for thumbnails.
+    """
+    import server
+    from thumbnails import KeynoteRenderer
+    monkeypatch.setattr(server, 'THUMBNAIL_PREFETCH', 2)
+    mocker.patch('os.path.expanduser', return_value=str(tmp_path))
+    (tmp_path / 'deck.key').write_text('deck')
+    mocker.patch.object(server.thumbnail_service, 'renderer', KeynoteRenderer(mocker.Mock()))
+    prefetch = mocker.patch.object(server.thumbnail_service, 'prefetch')
+    mocker.patch.object(server.socketio, 'emit')
+    timings_store.open_presentation("deck.key", "deck.key", 5)
+
+    server.status_cache.put('status', {"document_open": True, "is_playing": True, "slide_number": 3,
+                                       "document_name": "deck.key"})
+    server.emit_slide_update(3)
+    prefetch.assert_not_called()
+
+    server.status_cache.put('status', {"document_open": True, "is_playing": False, "slide_number": 3,
+                                       "document_name": "deck.key"})
+    server.emit_slide_update(3)
+    prefetch.assert_called_once()
+
+
+def test_whole_deck_reads_need_the_deck_in_front_and_no_slideshow(app):
+    """
+    Test that exports and content reads are refused during a slideshow and for decks Keynote does not show.
+    """
+    import server
+    from keynote_scripts import KeynoteBusy
+    snapshot = {"document_open": True, "is_playing": True, "slide_number": 1, "document_name": "deck.key",
+                "slide_count": 3, "document_path": "/home/me/deck.key"}
+    server.status_cache.put('snapshot', snapshot)
+    with pytest.raises(KeynoteBusy):
+        server.require_quiet_front_document("/home/me/deck.key")
+
+    server.status_cache.put('snapshot', dict(snapshot, is_playing=False))
+    with pytest.raises(KeynoteBusy):
+        server.require_quiet_front_document("/home/me/other.key")
+    assert server.require_quiet_front_document("/home/me/deck.key") == "/home/me/deck.key"
+
+
+def test_static_assets_are_fingerprinted_and_compressed(client):
+    """
+    Test that index.html links fingerprinted assets served immutable, gzipped and with ETags.
+    """
+    import re
+    page = client.get('/')
+    assert page.headers['Cache-Control'] == 'no-cache'
+    script = re.search(r'src="(static/js/main\.[0-9a-f]{8}\.js)"', page.get_data(as_text=True)).group(1)
+
+    response = client.get('/' + script, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    revalidated = client.get('/' + script, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    plain = client.get('/static/js/main.js')
+    assert plain.headers['Cache-Control'] == 'no-cache'
+    assert 'Content-Encoding' not in plain.headers
+
+
+def test_session_clock_endpoints(client, mocker, timings_store):
+    """
+    Test /api/session, pausing and correcting the elapsed time, with clock broadcasts.
+    """
+    import server
+    mock_emit = mocker.patch.object(server.socketio, 'emit')
+    timings_store.open_presentation("deck.key", "deck.key", 3)
+    server.session_clock.start(slide_number=2)
+
+    data = client.get('/api/session').get_json()
+    assert data['presentation_id'] == "deck.key"
+    assert len(data['presentation']['slides']) == 3
+    assert data['clock']['running'] is True
+    assert data['clock']['slide_number'] == 2
+
+    assert client.post('/api/session/pause').get_json()['clock']['running'] is False
+    response = client.post('/api/save_elapsed_time', json={'elapsed_seconds': 90})
+    assert response.get_json()['clock']['elapsed_seconds'] == 90
+    assert [c.args[0] for c in mock_emit.call_args_list] == ['clock', 'clock']
+    assert client.post('/api/save_elapsed_time', json={'elapsed_seconds': -1}).status_code == 400
+
+
+def test_connecting_client_receives_clock(socketio_client):
+    """
+    Test that a newly connected client gets the current clock without asking.
+    """
+    received = socketio_client.get_received()
+    assert [event['name'] for event in received] == ['clock']
+    assert received[0]['args'][0]['running'] is False
+
+
+def test_events_are_scoped_to_the_presentation_room(app, client, timings_store):
+    """
+    Test that clients following a presentation get its events and others do not.
+    """
+    import server
+    timings_store.open_presentation("deck.key", "deck.key", 3)
+    follower = server.socketio.test_client(app, flask_test_client=client)
+    elsewhere = server.socketio.test_client(app, flask_test_client=client)
+    assert elsewhere.emit('join_presentation', {'presentation_id': 'other.key'}, callback=True)['status'] == 'success'
+    assert elsewhere.emit('join_presentation', {}, callback=True)['status'] == 'error'
+    follower.get_received()
+    elsewhere.get_received()
+
+    server.emit_slide_update(2)
+
+    assert [event['name'] for event in follower.get_received()] == ['slide_update', 'clock', 'forecast']
+    assert elsewhere.get_received() == []
+
+
+def test_metrics_endpoint(client, mocker, timings_store):
+    """
+    Test that /metrics reports Keynote script latency by operation, emits, timings I/O and clients.
+    """
+    import server
+    mocker.patch.object(server.socketio, 'emit')
+    mocker.patch('subprocess.run', side_effect=[
+        MagicMock(returncode=0, stdout="Deck.key||4||true"),
+        subprocess.CalledProcessError(1, 'osascript', stderr="Keynote got an error."),
+    ])
+    before = server.KEYNOTE_SCRIPT_SECONDS.count(operation='status')
+    errors_before = server.KEYNOTE_SCRIPT_ERRORS.value(operation='stop')
+
+    server.get_keynote_status()
+    client.post('/api/stop_presentation')
+    server.emit_slide_update(4)
+    timings_store.open_presentation("deck.key", "deck.key", 3)
+    timings_store.flush()
+
+    assert server.KEYNOTE_SCRIPT_SECONDS.count(operation='status') == before + 1
+    assert server.KEYNOTE_SCRIPT_ERRORS.value(operation='stop') == errors_before + 1
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'keymote_keynote_script_seconds_count{operation="status"}' in body
+    assert 'keymote_socketio_emits_total{event="slide_update"}' in body
+    assert 'keymote_timings_io_bytes_count{operation="write",file="shard"}' in body
+    assert '# TYPE keymote_monitor_loop_lag_seconds histogram' in body
+    assert f'keymote_connected_clients {server.monitor_scheduler.clients}' in body
+
+
+def test_presentations_negotiate_msgpack(client, timings_store):
+    """
+    Test that clients asking for MessagePack get it, can send it back, and that JSON stays the default.
+    """
+    msgpack = pytest.importorskip('msgpack')
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+    headers = {'Accept': 'application/msgpack, application/json;q=0.9'}
+
+    packed = client.get('/api/presentations/deck.key', headers=headers)
+    assert packed.mimetype == 'application/msgpack'
+    assert 'Accept' in packed.headers['Vary']
+    deck = msgpack.unpackb(packed.data)['presentation']
+    plain = client.get('/api/presentations/deck.key')
+    assert plain.get_json()['presentation'] == deck
+    # Each representation revalidates on its own ETag.
+    assert packed.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/api/presentations/deck.key', headers=dict(headers, **{'If-None-Match': packed.headers['ETag']})).status_code == 304
+
+    deck['slides'][0]['estimated_time_seconds'] = 90
+    response = client.put('/api/presentations/deck.key', data=msgpack.packb(deck), content_type='application/msgpack')
+    assert response.status_code == 200
+    assert client.get('/api/presentations/deck.key').get_json()['presentation']['slides'][0]['estimated_time_seconds'] == 90
+    assert client.post('/api/save_timings', data=b'\xc1', content_type='application/msgpack').status_code == 400
+
+    snapshot = client.get('/api/snapshot', headers=headers)
+    assert snapshot.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(snapshot.data)['status'] == 'success'
+
+
+def test_timings_are_stored_as_compact_json(client, timings_store):
+    """
+    Test that shards and the index are written without indentation.
+    """
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+    timings_store.flush()
+
+    for name in os.listdir(timings_store.directory):
+        if name.endswith('.json'):
+            with open(os.path.join(timings_store.directory, name)) as f:
+                body = f.read()
+            assert '\n' not in body and ': ' not in body
+
+
+def test_replayed_writes_are_applied_once(client, timings_store):
+    """
+    Test that a write retried with the same Idempotency-Key gets the first response without being applied again.
+    """
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+    url = '/api/presentations/deck.key/slides/0'
+    first = client.patch(url, json={"actual_time_seconds": 42}, headers={'Idempotency-Key': 'write-1'})
+    assert first.status_code == 200
+    client.patch(url, json={"actual_time_seconds": 50})
+
+    replay = client.patch(url, json={"actual_time_seconds": 42}, headers={'Idempotency-Key': 'write-1'})
+
+    assert replay.status_code == 200
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == first.get_json()
+    assert timings_store.get_presentation("deck.key")["slides"][0]["actual_time_seconds"] == 50
+    assert client.patch(url, json={"actual_time_seconds": 7}, headers={'Idempotency-Key': 'write-1'}).status_code == 422
+    # Rejected writes are not kept for replay as successes.
+    assert client.patch(url, json={"slide": 3}, headers={'Idempotency-Key': 'write-2'}).status_code == 400
+    assert client.patch(url, json={"slide": 3}, headers={'Idempotency-Key': 'write-2'}).status_code == 400
+
+
+def test_service_worker_precaches_the_current_build(client):
+    """
+    Test that /sw.js is served from the root with the fingerprinted assets the page loads.
+    """
+    response = client.get('/sw.js')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/javascript'
+    header = response.get_data(as_text=True).split('\n', 1)[0]
+    precache = json.loads(header[len('self.KEYMOTE_PRECACHE = '):-1])
+    assert precache["urls"][0] == '/'
+    assert any(url.startswith('/static/js/main.') and url != '/static/js/main.js' for url in precache["urls"])
+    assert any(url.startswith('/static/js/outbox.') for url in precache["urls"])
+    assert client.get('/sw.js', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_close_presentation_exports_the_recorded_session(client, timings_store, mocker, monkeypatch, tmp_path):
+    """
+    Test that transitions seen by the monitor are logged and that closing exports the log's per-slide totals.
+    """
+    import server
+    from recorder import SessionRecorder
+    now = [1000.0]
+    monkeypatch.setattr(server, 'session_recorder', SessionRecorder(str(tmp_path / 'sessions'), clock=lambda: now[0]))
+    monkeypatch.chdir(tmp_path)
+    mocker.patch.object(server, 'run_applescript')
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": False, "last_slide_number": 1, "document_name": "deck.key"
+    })
+    timings_store.open_presentation("deck.key", "deck.key", 3)
+    server.begin_recording("deck.key", 1)
+
+    def poll(slide, playing=True, after=0):
+        now[0] += after
+        server.process_keynote_status({"document_open": True, "is_playing": playing, "slide_number": slide, "document_name": "deck.key"})
+
+    poll(1)
+    poll(2, after=30)
+    poll(1, after=20)
+    poll(2, after=10)
+    poll(2, playing=False, after=5)
+    live = client.get('/api/sessions/current').get_json()['aggregates']
+    assert live['slides'] == [{"slide": 1, "seconds": 40.0, "visits": 2}, {"slide": 2, "seconds": 25.0, "visits": 2}]
+
+    assert client.post('/api/close_presentation').status_code == 200
+
+    exports = os.listdir(tmp_path / 'static' / 'elapsed_times')
+    with open(tmp_path / 'static' / 'elapsed_times' / exports[0]) as f:
+        export = json.load(f)
+    assert export['source'] == 'recorder'
+    assert export['back_navigations'] == 1
+    assert [(s['actual_time_seconds'], s['visits']) for s in export['slides']] == [(40, 2), (25, 2), (None, 0)]
+
+    sessions = client.get('/api/sessions?presentation_id=deck.key').get_json()['sessions']
+    assert [(s['session'], s['compressed']) for s in sessions] == [(export['session'], True)]
+    log = client.get(f"/api/sessions/{export['session']}/log")
+    lines = log.get_data(as_text=True).splitlines()
+    assert json.loads(lines[0])['presentation_id'] == 'deck.key'
+    assert [json.loads(line)[1] for line in lines[1:]] == ['o', 'p', 's', 's', 's', 'x', 'c']
+    assert client.get(f"/api/sessions/{export['session']}/log", headers={'Accept-Encoding': 'gzip'}).content_encoding == 'gzip'
+    assert client.get('/api/sessions/../index/log').status_code == 404
+
+
+def test_close_after_the_deck_was_closed_on_the_mac_exports_the_recorded_session(client, timings_store, mocker,
+                                                                                  monkeypatch, tmp_path):
+    """
+    Test that a session the monitor ended because the deck was closed on the Mac is still merged by a later close.
+    """
+    import server
+    from recorder import SessionRecorder
+    now = [1000.0]
+    monkeypatch.setattr(server, 'session_recorder', SessionRecorder(str(tmp_path / 'sessions'), clock=lambda: now[0]))
+    monkeypatch.chdir(tmp_path)
+    mocker.patch.object(server, 'run_applescript')
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": False, "last_slide_number": 1, "document_name": "deck.key"
+    })
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+    server.begin_recording("deck.key", 1)
+    server.process_keynote_status({"document_open": True, "is_playing": True, "slide_number": 1, "document_name": "deck.key"})
+    now[0] += 30
+    server.process_keynote_status({"document_open": False, "is_playing": False, "slide_number": None, "document_name": None})
+    assert server.session_recorder.active is False
+
+    assert client.post('/api/close_presentation').status_code == 200
+
+    exports = os.listdir(tmp_path / 'static' / 'elapsed_times')
+    with open(tmp_path / 'static' / 'elapsed_times' / exports[0]) as f:
+        export = json.load(f)
+    assert export['source'] == 'recorder'
+    assert [s['actual_time_seconds'] for s in export['slides']] == [30, None]
+    assert server.ended_session is None
+
+
+def test_monitor_records_sessions_under_the_deck_keynote_shows(client, timings_store, mocker):
+    """
+    Test that a session the monitor starts belongs to the deck in the status, not to a stale current presentation.
+    """
+    import server
+    mocker.patch.object(server, 'keynote_state', {
+        "document_open": True, "is_playing": False, "last_slide_number": 1, "document_name": "other.key"
+    })
+    timings_store.open_presentation("Talks/deck.key", "deck.key", 2)
+    server.status_cache.put('snapshot', {"document_open": True, "is_playing": False, "slide_number": 1,
+                                         "document_name": "other.key", "slide_count": 4,
+                                         "document_path": os.path.join(os.path.expanduser('~'), 'Talks', 'other.key')})
+
+    server.process_keynote_status({"document_open": True, "is_playing": True, "slide_number": 1, "document_name": "other.key"})
+    assert server.session_recorder.presentation_id == 'Talks/other.key'
+
+    # Back to the current deck: its transitions start a session of their own.
+    server.process_keynote_status({"document_open": True, "is_playing": True, "slide_number": 2, "document_name": "deck.key"})
+    assert server.session_recorder.presentation_id == 'Talks/deck.key'
+    assert server.ended_session[0] == 'Talks/other.key'
+    server.end_recording()
+
+
+def test_healthz_answers_while_booting(client):
+    """
+    Test that /healthz reports the process alive whether or not the boot has finished.
+    """
+    response = client.get('/healthz')
+
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ok'
+
+
+def test_readyz_reports_boot_progress_per_component(client, mocker):
+    """
+    Test that /readyz answers 503 until the required boot steps succeeded, with each step's timing.
+    """
+    from boot import BootSequence
+    boot = BootSequence()
+    boot.add('timings', lambda: {"presentations": 0})
+    boot.add('keynote', lambda: 1 / 0, required=False)
+    mocker.patch('server.boot_sequence', boot)
+
+    starting = client.get('/readyz')
+    assert starting.status_code == 503
+    assert starting.get_json()['status'] == 'starting'
+
+    boot.run()
+    ready = client.get('/readyz')
+    data = ready.get_json()
+    assert ready.status_code == 200
+    assert data['status'] == 'ready'
+    assert data['components']['timings']['detail'] == {"presentations": 0}
+    assert data['components']['timings']['seconds'] is not None
+    assert data['components']['keynote']['state'] == 'failed'
+
+
+def test_boot_warms_the_first_clients_snapshot(client, mocker, timings_store):
+    """
+    Test that after the boot the first /api/snapshot is answered without asking Keynote, from the boot's
+    snapshot with the monitor's latest status on top, and asks again once Keynote shows another document.
+    """
+    import server
+    mocker.patch('os.path.expanduser', return_value='/fake/home')
+    timings_store.open_presentation("Talks/deck.key", "deck.key", 4)
+    mock_run = mocker.patch('subprocess.run')
+    mock_run.return_value.stdout = "deck.key||4||1||false||/fake/home/Talks/deck.key/\n"
+    mock_run.return_value.returncode = 0
+    mocker.patch('server.keynote_state', dict(server.keynote_state))
+    # Past its max age, so only the warm path can answer without Keynote.
+    mocker.patch.object(server.status_cache, 'max_age', -1)
+
+    assert server.boot_keynote() == {"document_open": True, "document_name": "deck.key"}
+    assert server.keynote_state["last_slide_number"] == 1
+    server.status_cache.put('status', {"document_open": True, "is_playing": True, "slide_number": 2,
+                                       "document_name": "deck.key"})
+
+    data = client.get('/api/snapshot').get_json()
+
+    assert data['keynote']['slide_number'] == 2 and data['keynote']['is_playing'] is True
+    assert data['keynote']['slide_count'] == 4
+    assert data['presentation_id'] == 'Talks/deck.key'
+    mock_run.assert_called_once()
+
+    server.status_cache.put('status', {"document_open": True, "is_playing": False, "slide_number": 1,
+                                       "document_name": "other.key"})
+    client.get('/api/snapshot')
+    assert mock_run.call_count == 2
+
+
+def keynote_with_slides(mocker, tmp_path, slides_output):
+    """Fake home directory with Talks/deck.key, and a Keynote that answers the snapshot and slides scripts."""
+    from slide_content import FIELD_SEP, RECORD_SEP
+    import server
+    deck = tmp_path / 'Talks' / 'deck.key'
+    deck.parent.mkdir()
+    deck.write_text('deck')
+    mocker.patch('os.path.expanduser', return_value=str(tmp_path))
+    mocker.patch.object(server, 'rehearsal_history', server.RehearsalHistory(str(tmp_path / 'elapsed')))
+    output = RECORD_SEP.join(FIELD_SEP.join(str(field) for field in slide) for slide in slides_output)
+
+    def run(cmd, **kwargs):
+        source = ' '.join(cmd)
+        stdout = output if 'presenter notes' in source else f"deck.key||{len(slides_output)}||1||false||{deck}/"
+        return subprocess.CompletedProcess(cmd, 0, stdout=stdout + "\n", stderr='')
+
+    return str(deck), mocker.patch('subprocess.run', side_effect=run)
+
+
+def test_open_new_presentation_estimates_timings_from_its_content(client, mocker, tmp_path, timings_store,
+                                                                  background_tasks):
+    """
+    Test that a deck opened for the first time responds with default timings, gets estimates from its content
+    in the background, read in one extra Keynote call, and that estimating it again while it is unchanged
+    reads nothing more.
+    """
+    import server
+    _, mock_run = keynote_with_slides(mocker, tmp_path, [
+        (1, 'false', 0, 0, 'Welcome', '', ''),
+        (2, 'false', 1, 0, 'Results', '', ' '.join(['word'] * 150)),
+        (3, 'true', 0, 0, 'Backup', '', ''),
+    ])
+    mock_emit = mocker.patch.object(server.socketio, 'emit')
+
+    data = client.post('/api/open_presentation', json={'filename': 'Talks/deck.key'}).get_json()
+
+    assert [slide['estimated_time_seconds'] for slide in data['presentation']['slides']] == [60, 60, 60]
+    assert mock_run.call_count == 1
+
+    # The presenter edits a slide before the estimate lands; that edit is kept.
+    client.patch('/api/presentations/Talks/deck.key/slides/0', json={"estimated_time_seconds": 45})
+    for fn, args in background_tasks:
+        fn(*args)
+
+    slides = timings_store.get_presentation('Talks/deck.key')['slides']
+    assert [slide['estimated_time_seconds'] for slide in slides] == [45, 80, 0]
+    assert mock_run.call_count == 2
+    assert 'timings_updated' in [c.args[0] for c in mock_emit.call_args_list]
+
+    # Reopening a known deck does not estimate it again.
+    background_tasks.clear()
+    client.post('/api/open_presentation', json={'filename': 'Talks/deck.key'})
+    assert background_tasks == []
+
+    # The deck was not saved since, so its content comes from the cache.
+    suggested = client.post('/api/presentations/Talks/deck.key/estimate').get_json()
+    assert [slide['estimated_time_seconds'] for slide in suggested['slides']] == [15, 80, 0]
+    assert mock_run.call_count == 3
+
+
+def test_estimate_endpoint_applies_suggestions(client, mocker, tmp_path, timings_store):
+    """
+    Test that /api/presentations/<id>/estimate suggests timings, and stores them when asked to.
+    """
+    keynote_with_slides(mocker, tmp_path, [(1, 'false', 0, 0, 'Welcome', 'one two', ''), (2, 'false', 0, 1, '', '', '')])
+    timings_store.open_presentation('Talks/deck.key', 'deck.key', 2)
+
+    suggested = client.post('/api/presentations/Talks/deck.key/estimate').get_json()
+    assert suggested['applied'] is False
+    assert [(slide['slide'], slide['estimated_time_seconds']) for slide in suggested['slides']] == [(1, 20), (2, 25)]
+    assert timings_store.get_presentation('Talks/deck.key')['slides'][0]['estimated_time_seconds'] == 60
+
+    applied = client.post('/api/presentations/Talks/deck.key/estimate', json={'apply': True}).get_json()
+    assert applied['applied'] is True
+    assert [slide['estimated_time_seconds'] for slide in timings_store.get_presentation('Talks/deck.key')['slides']] == [20, 25]
+
+    assert client.post('/api/presentations/Talks/missing.key/estimate').status_code == 404
+
+
+def test_estimate_endpoint_does_not_read_decks_during_a_slideshow(client, mocker, tmp_path, timings_store):
+    """
+    Test that estimating a deck whose content is not cached yet is refused while Keynote plays a slideshow.
+    """
+    import server
+    deck, mock_run = keynote_with_slides(mocker, tmp_path, [(1, 'false', 0, 0, 'Welcome', '', '')])
+    server.status_cache.put('snapshot', {"document_open": True, "is_playing": True, "slide_number": 1,
+                                         "document_name": "deck.key", "slide_count": 1, "document_path": deck})
+
+    response = client.post('/api/presentations/Talks/deck.key/estimate')
+
+    assert response.status_code == 409
+    mock_run.assert_not_called()
+
+
+def test_malformed_timings_are_refused(client, timings_store):
+    """
+    Test that malformed timings get a 400 and leave the stored timings readable.
+    """
+    timings_store.open_presentation("deck.key", "deck.key", 2)
+
+    assert client.post('/api/save_timings', json={"presentations": {"new.key": {"slides": 3}}}).status_code == 400
+    assert client.put('/api/presentations/deck.key', json={"slides": [{"estimated_time_seconds": 60}]}).status_code == 400
+
+    assert client.get('/api/timings').status_code == 200
+    assert client.get('/api/presentations/deck.key').status_code == 200
+    assert 'new.key' not in client.get('/api/timings').get_json()['presentations']
+
+
+def test_a_second_worker_refuses_to_start(tmp_path, mocker):
+    """
+    Test that only one worker can claim the server, since its state and files are per process.
+    """
+    import server
+    from fanout import LeaderLock
+    path = str(tmp_path / 'monitor.lock')
+    first, second = LeaderLock(path), LeaderLock(path)
+
+    mocker.patch.object(server, 'leader_lock', first)
+    assert server.claim_single_worker() is True
+    mocker.patch.object(server, 'leader_lock', second)
+    assert server.claim_single_worker() is False
+    first.release()
+
+
+def test_boot_steps_run_off_the_event_loop(mocker, monkeypatch):
+    """
+    Test that blocking boot work is offloaded, except while profiling, and that the home directory is not
+    crawled at boot unless asked for.
+    """
+    import server
+    offload = mocker.patch.object(server, 'offload_blocking', side_effect=lambda fn, *args: fn(*args))
+    warm = mocker.patch.object(server.timings_store, 'warm', return_value={})
+
+    server.boot_timings()
+    offload.assert_called_once_with(warm)
+
+    monkeypatch.setattr(server, 'PROFILE_STARTUP', True)
+    server.boot_timings()
+    assert offload.call_count == 1 and warm.call_count == 2
+
+    assert 'directory_index' not in server.boot_sequence.report()['components']
@@ -0,0 +1,83 @@
+from session_clock import SessionClock
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_clock():
+    monotonic = FakeTime()
+    wall = FakeTime()
+    wall.now = 1_700_000_000.0
+    clock = SessionClock(clock=monotonic, wall=wall)
+
+    def advance(seconds):
+        monotonic.now += seconds
+        wall.now += seconds
+    return clock, advance
+
+
+def test_elapsed_accumulates_across_pauses():
+    clock, advance = make_clock()
+    assert clock.start(slide_number=1)
+    advance(10)
+    assert clock.pause()
+    advance(30)  # paused time does not count
+    assert clock.elapsed() == 10
+    clock.start()
+    advance(5)
+    assert clock.elapsed() == 15
+
+
+def test_slide_elapsed_restarts_on_slide_change():
+    clock, advance = make_clock()
+    clock.start(slide_number=1)
+    advance(8)
+    assert clock.slide_changed(2)
+    advance(3)
+    assert clock.slide_elapsed() == 3
+    assert clock.elapsed() == 11
+    # Repeated reports of the same slide are not transitions.
+    assert not clock.slide_changed(2)
+
+
+def test_snapshot_epochs_let_clients_render_locally():
+    clock, advance = make_clock()
+    clock.start(slide_number=1)
+    advance(20)
+    clock.slide_changed(2)
+    advance(5)
+
+    snapshot = clock.snapshot()
+    assert snapshot["running"] is True
+    assert snapshot["slide_number"] == 2
+    assert snapshot["server_time"] - snapshot["started_at"] == 25
+    assert snapshot["server_time"] - snapshot["slide_started_at"] == 5
+
+
+def test_wall_clock_jumps_do_not_change_elapsed():
+    monotonic, wall = FakeTime(), FakeTime()
+    clock = SessionClock(clock=monotonic, wall=wall)
+    clock.start(slide_number=1)
+    monotonic.now += 10
+    wall.now -= 3600  # e.g. a time zone or NTP correction
+    assert clock.snapshot()["elapsed_seconds"] == 10
+
+
+def test_set_elapsed_and_reset():
+    clock, advance = make_clock()
+    clock.start(slide_number=1)
+    advance(4)
+    clock.set_elapsed(60)
+    advance(1)
+    assert clock.elapsed() == 61
+
+    seq = clock.seq
+    clock.reset()
+    assert clock.seq > seq
+    assert clock.snapshot()["elapsed_seconds"] == 0
+    assert clock.slide_number is None
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from slide_content import ContentCache, SlideContentExtractor, parse_slide_content, FIELD_SEP, RECORD_SEP
+
+
+def script_output(*slides):
+    return RECORD_SEP.join(FIELD_SEP.join(str(field) for field in slide) for slide in slides) + "\n"
+
+
+def test_parse_slide_content():
+    output = script_output((1, 'false', 0, 0, 'Welcome', '', 'Say hello\rand introduce the team'),
+                           (2, 'true', 2, 1, 'Results', 'Revenue up\rCosts down', ''))
+
+    slides = parse_slide_content(output)
+
+    assert slides == [
+        {"slide": 1, "skipped": False, "images": 0, "media": 0, "title": "Welcome", "body": "",
+         "notes": "Say hello\nand introduce the team"},
+        {"slide": 2, "skipped": True, "images": 2, "media": 1, "title": "Results", "body": "Revenue up\nCosts down",
+         "notes": ""},
+    ]
+    assert parse_slide_content("\n") == []
+    with pytest.raises(ValueError):
+        parse_slide_content("1" + FIELD_SEP + "false")
+
+
+def test_extraction_is_cached_by_document_version(tmp_path):
+    deck = tmp_path / 'deck.key'
+    deck.write_text('v1')
+    calls = []
+
+    def run(document_path):
+        calls.append(document_path)
+        return script_output((1, 'false', 0, 0, f'Title {len(calls)}', '', ''))
+
+    extractor = SlideContentExtractor(run, ContentCache(str(tmp_path / 'cache')))
+    assert extractor.extract(str(deck))[0]["title"] == 'Title 1'
+    # A new process finds the cached copy on disk.
+    reopened = SlideContentExtractor(run, ContentCache(str(tmp_path / 'cache')))
+    assert reopened.extract(str(deck))[0]["title"] == 'Title 1'
+    assert calls == [str(deck)]
+    assert reopened.stats() == {"hits": 1, "extractions": 0, "writes": 0}
+
+    deck.write_text('v2, saved later')
+    os.utime(deck, ns=(os.stat(deck).st_atime_ns, os.stat(deck).st_mtime_ns + 1000))
+    assert reopened.extract(str(deck))[0]["title"] == 'Title 2'
+    assert len(calls) == 2
+    assert reopened.cache.latest(str(deck))["slides"][0]["title"] == 'Title 2'
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from status_cache import StatusCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_serves_fresh_snapshot_and_reports_age():
+    clock = FakeClock()
+    cache = StatusCache(max_age=1.0, clock=clock)
+    cache.put('status', {'slide_number': 3})
+    clock.now += 0.4
+
+    value, age = cache.get('status', lambda: pytest.fail('fetch should not be called'))
+
+    assert value == {'slide_number': 3}
+    assert age == pytest.approx(0.4)
+
+
+def test_get_refetches_stale_or_invalidated_snapshot():
+    clock = FakeClock()
+    cache = StatusCache(max_age=1.0, clock=clock)
+    cache.put('status', 1)
+    clock.now += 1.5
+    assert cache.get('status', lambda: 2) == (2, 0.0)
+
+    cache.invalidate('status')
+    assert cache.get('status', lambda: 3) == (3, 0.0)
+    assert cache.stats()['misses'] == 2
+
+
+def test_concurrent_misses_share_one_call():
+    cache = StatusCache(max_age=1.0)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return 7
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('count', fetch)[0])) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [7] * 5
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = StatusCache(max_age=1.0)
+    with pytest.raises(ValueError):
+        cache.get('count', lambda: int('not a number'))
+    assert cache.get('count', lambda: 4) == (4, 0.0)
+
+
+def test_invalidation_during_call_discards_result():
+    cache = StatusCache(max_age=10.0)
+
+    def fetch():
+        cache.invalidate('status')
+        return 'stale'
+
+    assert cache.get('status', fetch)[0] == 'stale'
+    assert cache.peek('status') == (None, None)
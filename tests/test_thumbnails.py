@@ -0,0 +1,116 @@
+import os
+import threading
+
+import pytest
+
+from thumbnails import ThumbnailCache, ThumbnailService, PlaceholderRenderer, KeynoteRenderer, thumbnail_key, placeholder_png
+
+
+@pytest.fixture
+def deck(tmp_path):
+    path = tmp_path / 'deck.key'
+    path.write_text('slides')
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ThumbnailService(PlaceholderRenderer(), ThumbnailCache(str(tmp_path / 'thumbnails')))
+
+
+def test_placeholder_is_a_png():
+    assert placeholder_png(16, 9).startswith(b'\x89PNG\r\n\x1a\n')
+
+
+def test_thumbnails_are_rendered_once(service, deck):
+    path, etag = service.get(deck, 1, 'small')
+    again, same_etag = service.get(deck, 1, 'small')
+
+    assert path == again and etag == same_etag
+    assert service.renderer.renders == 1
+    assert (service.hits, service.misses) == (1, 1)
+    with open(path, 'rb') as f:
+        assert f.read().startswith(b'\x89PNG')
+
+
+def test_variants_and_document_versions_have_their_own_keys(service, deck):
+    _, small = service.get(deck, 1, 'small')
+    _, medium = service.get(deck, 1, 'medium')
+    assert small != medium
+
+    os.utime(deck, ns=(0, os.stat(deck).st_mtime_ns + 1000))
+    _, edited = service.get(deck, 1, 'small')
+    assert edited != small
+
+
+def test_concurrent_requests_render_once(service, deck):
+    threads = [threading.Thread(target=service.get, args=(deck, 2)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert service.renderer.renders == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=25)
+    cache.put('aa1', b'x' * 10)
+    cache.put('bb2', b'x' * 10)
+    assert cache.get('aa1') is not None  # now the most recently used
+    cache.put('cc3', b'x' * 10)
+
+    assert cache.get('bb2') is None
+    assert not os.path.exists(cache.path('bb2'))
+    assert cache.get('aa1') is not None
+    assert cache.evictions == 1
+    # A fresh process picks up what is already on disk.
+    assert ThumbnailCache(str(tmp_path), max_bytes=25).stats()["entries"] == 2
+
+
+def test_prefetch_renders_following_slides(service, deck):
+    service.prefetch(deck, 3, 2, slide_count=4)
+    service.drain_prefetch()
+
+    assert service.renderer.renders == 1
+    version = f"{os.stat(deck).st_mtime_ns:x}"
+    assert service.cache.get(thumbnail_key(deck, version, 4, 'medium')) is not None
+
+
+def test_background_prefetch_cooperates_with_eventlet(tmp_path, deck):
+    eventlet = pytest.importorskip('eventlet')
+    service = ThumbnailService(PlaceholderRenderer(), ThumbnailCache(str(tmp_path / 'thumbnails')),
+                               spawn=eventlet.spawn, queue_factory=eventlet.queue.Queue)
+    ticks = []
+    eventlet.spawn(lambda: [ticks.append(eventlet.sleep(0)) for _ in range(5)])
+
+    service.prefetch(deck, 1, 2, slide_count=3)
+    for _ in range(20):
+        eventlet.sleep(0)
+
+    # The idle prefetcher waits on the queue without blocking the other green threads.
+    assert service.renderer.renders == 2
+    assert len(ticks) == 5
+    service.prefetch(deck, 3, 1)
+    eventlet.sleep(0.01)
+    assert service.stats()["prefetch_queued"] == 0
+
+
+def test_keynote_renderer_resizes_through_offload(tmp_path, deck, mocker):
+    def export(document_path, out_dir):
+        with open(os.path.join(out_dir, 'deck.001.png'), 'wb') as f:
+            f.write(placeholder_png(4, 3))
+
+    offloaded = []
+
+    def offload(fn, *args):
+        offloaded.append(fn)
+        return fn(*args)
+
+    mock_run = mocker.patch('subprocess.run')
+    renderer = KeynoteRenderer(export, work_dir=str(tmp_path / 'exports'), offload=offload)
+
+    renderer.render(deck, 1, 160)
+
+    assert len(offloaded) == 1
+    assert mock_run.call_args[0][0][0] == 'sips'
@@ -0,0 +1,238 @@
+import json
+import os
+import time
+
+import pytest
+
+from timings_store import TimingsStore, shard_filename
+
+DOCUMENT = {
+    "current_presentation_id": "deck.key",
+    "presentations": {
+        "deck.key": {"name": "deck.key", "slides": [
+            {"slide": i, "estimated_time_seconds": 60, "actual_time_seconds": None} for i in range(1, 4)
+        ]}
+    }
+}
+
+
+def shard_path(store, presentation_id):
+    return os.path.join(store.directory, shard_filename(presentation_id))
+
+
+def reopen(store):
+    return TimingsStore(store.directory, legacy_path=None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimingsStore(str(tmp_path / 'presentations'), legacy_path=None, compact_after=3)
+    store.save(DOCUMENT)
+    store.flush()
+    yield store
+    store.close()
+
+
+def test_patch_appends_to_journal_without_rewriting_document(store):
+    with open(shard_path(store, "deck.key")) as f:
+        before = f.read()
+
+    store.patch_slide("deck.key", 0, {"actual_time_seconds": 12})
+
+    with open(shard_path(store, "deck.key")) as f:
+        assert f.read() == before
+    with open(store.journal_path) as f:
+        assert len(f.readlines()) == 1
+    # A fresh store replays the journal on load.
+    reloaded = reopen(store).load()
+    assert reloaded["presentations"]["deck.key"]["slides"][0]["actual_time_seconds"] == 12
+
+
+def test_journal_is_compacted_into_document(store):
+    for index in range(3):
+        store.patch_slide("deck.key", index, {"estimated_time_seconds": 30})
+    store.flush()
+
+    with open(shard_path(store, "deck.key")) as f:
+        document = json.load(f)
+    assert [s["estimated_time_seconds"] for s in document["slides"]] == [30, 30, 30]
+    with open(store.journal_path) as f:
+        assert f.read() == ''
+
+
+def test_torn_journal_line_is_ignored(store):
+    store.patch_slide("deck.key", 1, {"actual_time_seconds": 5})
+    with open(store.journal_path, 'a') as f:
+        f.write('{"presentation": "deck.key", "ind')
+
+    reloaded = reopen(store).load()
+    assert reloaded["presentations"]["deck.key"]["slides"][1]["actual_time_seconds"] == 5
+
+
+def test_patch_rejects_invalid_changes(store):
+    with pytest.raises(ValueError):
+        store.patch_slide("deck.key", 0, {"name": "other"})
+    with pytest.raises(KeyError):
+        store.patch_slide("other.key", 0, {"actual_time_seconds": 1})
+    with pytest.raises(IndexError):
+        store.patch_slide("deck.key", 9, {"actual_time_seconds": 1})
+
+
+def test_rapid_saves_are_batched_into_one_debounced_flush(tmp_path):
+    store = TimingsStore(str(tmp_path / 'presentations'), legacy_path=None, flush_delay=0.1, max_data_loss=1.0)
+    for slide_count in range(1, 6):
+        document = json.loads(json.dumps(DOCUMENT))
+        document["presentations"]["deck.key"]["slides"] = document["presentations"]["deck.key"]["slides"][:1] * slide_count
+        store.save(document)
+
+    assert store.dirty
+    deadline = time.monotonic() + 2
+    while store.dirty and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert store.flushes == 1
+    with open(shard_path(store, "deck.key")) as f:
+        assert len(json.load(f)["slides"]) == 5
+    store.close()
+
+
+def test_max_data_loss_bounds_debouncing(tmp_path):
+    store = TimingsStore(str(tmp_path / 'presentations'), legacy_path=None, flush_delay=0.2, max_data_loss=0.3)
+    started = time.monotonic()
+    while time.monotonic() - started < 0.6:
+        store.save(DOCUMENT)
+        time.sleep(0.05)
+
+    assert store.flushes >= 1
+    store.close()
+
+
+def test_close_flushes_pending_changes_atomically(tmp_path):
+    directory = tmp_path / 'presentations'
+    store = TimingsStore(str(directory), legacy_path=None, flush_delay=60, max_data_loss=60)
+    store.open_presentation("deck.key", "deck.key", 3)
+    assert not directory.exists()
+
+    store.close()
+
+    assert json.loads((directory / 'index.json').read_text())["current_presentation_id"] == "deck.key"
+    assert [p.name for p in directory.iterdir() if p.suffix == '.tmp'] == []
+
+
+def test_patches_while_dirty_are_not_journalled(store):
+    store.save(DOCUMENT)
+    store.patch_slide("deck.key", 0, {"actual_time_seconds": 3})
+
+    # The pending flush carries the patch, so the journal stays consistent with the file on disk.
+    assert store.journal_entries == 0
+    store.flush()
+    reloaded = reopen(store).load()
+    assert reloaded["presentations"]["deck.key"]["slides"][0]["actual_time_seconds"] == 3
+
+
+def test_flush_rewrites_only_changed_shards(store):
+    other = {"name": "other.key", "slides": [{"slide": 1, "estimated_time_seconds": 10, "actual_time_seconds": None}]}
+    store.put_presentation("other.key", other)
+    store.flush()
+    deck_mtime = os.stat(shard_path(store, "deck.key")).st_mtime_ns
+
+    other["slides"][0]["estimated_time_seconds"] = 20
+    store.put_presentation("other.key", other)
+    store.flush()
+
+    assert os.stat(shard_path(store, "deck.key")).st_mtime_ns == deck_mtime
+    assert reopen(store).get_presentation("other.key")["slides"][0]["estimated_time_seconds"] == 20
+
+
+def test_index_does_not_load_shards(store):
+    reloaded = reopen(store)
+    index = reloaded.index()
+
+    assert index["current_presentation_id"] == "deck.key"
+    assert index["presentations"] == [{"id": "deck.key", "name": "deck.key", "slide_count": 3, "last_opened": None}]
+    assert reloaded._decks == {}
+
+
+def test_save_keeps_presentations_it_does_not_mention(store):
+    store.save({"presentations": {"other.key": {"name": "other.key", "slides": []}}})
+
+    assert store.get_presentation("deck.key") is not None
+    assert store.current_presentation_id == "deck.key"
+
+
+def test_open_and_close_presentation(store):
+    presentation = store.open_presentation("new.key", "new.key", 2)
+    assert [s["slide"] for s in presentation["slides"]] == [1, 2]
+    assert store.current_presentation_id == "new.key"
+    assert store.index()["presentations"][0]["id"] == "new.key"
+
+    presentation_id, exported = store.close_current()
+    assert presentation_id == "new.key"
+    assert exported == presentation
+    assert store.current_presentation_id is None
+
+
+def test_etags_change_with_revisions(store):
+    index_etag = store.index_etag()
+    etag = store.presentation_etag("deck.key")
+
+    store.patch_slide("deck.key", 0, {"actual_time_seconds": 1})
+    assert store.presentation_etag("deck.key") != etag
+    assert store.index_etag() == index_etag
+
+    store.open_presentation("deck.key", "deck.key", 3)
+    assert store.index_etag() != index_etag
+
+
+def test_legacy_document_is_migrated(tmp_path):
+    legacy = tmp_path / 'slide_timings.json'
+    legacy.write_text(json.dumps(DOCUMENT))
+    with open(str(legacy) + '.journal', 'w') as f:
+        f.write(json.dumps({"presentation": "deck.key", "index": 2, "changes": {"actual_time_seconds": 7}}) + "\n")
+
+    store = TimingsStore(str(tmp_path / 'presentations'), legacy_path=str(legacy))
+    assert store.load() == {
+        "current_presentation_id": "deck.key",
+        "presentations": {"deck.key": {"name": "deck.key", "slides": [
+            {"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": None},
+            {"slide": 2, "estimated_time_seconds": 60, "actual_time_seconds": None},
+            {"slide": 3, "estimated_time_seconds": 60, "actual_time_seconds": 7},
+        ]}},
+    }
+    assert (tmp_path / 'presentations' / 'index.json').exists()
+    # The legacy file is left in place as a backup.
+    assert legacy.exists()
+    store.close()
+
+
+def test_warm_loads_and_checks_every_shard(store, tmp_path):
+    store.put_presentation("other.key", {"name": "other.key", "slides": [
+        {"slide": 1, "estimated_time_seconds": 5, "actual_time_seconds": None}]})
+    store.flush()
+    # Edited by hand since.
+    with open(shard_path(store, "other.key"), 'w') as f:
+        json.dump({"name": "other.key", "slides": [{"slide": 1, "estimated_time_seconds": -5}]}, f)
+    fresh = reopen(store)
+
+    report = fresh.warm()
+
+    assert report["presentations"] == 1
+    assert report["slides"] == 3
+    assert report["problems"] == ["other.key: Slide 0: 'estimated_time_seconds' must be a non-negative number."]
+    # Everything is in memory now, invalid decks included.
+    assert set(fresh._decks) == {"deck.key", "other.key"}
+
+
+def test_malformed_presentations_are_refused_without_changes(store):
+    before = store.index()
+
+    with pytest.raises(ValueError):
+        store.save({"presentations": {"new.key": {"name": "new.key", "slides": "not a list"}}})
+    with pytest.raises(ValueError):
+        store.save({"presentations": {"ok.key": {"slides": []}, "bad.key": None}})
+    with pytest.raises(ValueError):
+        store.put_presentation("deck.key", {"slides": [{"slide": 1, "estimated_time_seconds": "soon"}]})
+
+    assert store.index() == before
+    assert store.get_presentation("deck.key") == DOCUMENT["presentations"]["deck.key"]
+    assert store.get_presentation("ok.key") is None
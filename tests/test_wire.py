@@ -0,0 +1,49 @@
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import wire
+
+
+def accept(value):
+    return MIMEAccept([(part.split(';q=')[0], float(part.split(';q=')[1]) if ';q=' in part else 1)
+                       for part in value.split(', ')])
+
+
+@pytest.fixture
+def with_msgpack(monkeypatch):
+    monkeypatch.setattr(wire, 'msgpack', pytest.importorskip('msgpack'))
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("application/msgpack, application/json;q=0.9", True),
+    ("application/x-msgpack", True),
+    ("application/msgpack;q=0.5, application/json", False),
+    ("*/*", False),
+    ("application/json", False),
+])
+def test_prefers_msgpack_only_when_asked_explicitly(with_msgpack, header, expected):
+    assert wire.prefers_msgpack(accept(header)) is expected
+
+
+def test_json_is_the_fallback_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire, 'msgpack', None)
+
+    assert wire.prefers_msgpack(accept("application/msgpack")) is False
+    assert wire.socketio_options('msgpack') == {}
+
+
+def test_msgpack_round_trips_timings(with_msgpack):
+    document = {"presentations": {"deck.key": {"slides": [
+        {"slide": 1, "estimated_time_seconds": 60, "actual_time_seconds": 61.5},
+        {"slide": "BREAK", "estimated_time_seconds": 300, "actual_time_seconds": None}]}}}
+
+    body = wire.packb(document)
+
+    assert wire.unpackb(body) == document
+    assert len(body) < len(wire.dumps_json(document))
+    assert wire.socketio_options('msgpack') == {"serializer": 'msgpack'}
+    assert wire.socketio_options('json') == {}
+
+
+def test_compact_json_has_no_spaces():
+    assert wire.dumps_json({"a": [1, 2]}) == '{"a":[1,2]}'
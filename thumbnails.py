@@ -0,0 +1,306 @@
+"""Slide thumbnails for the remote.
+
+Images are rendered by a pluggable renderer, ``KeynoteRenderer`` on the Mac or
+``PlaceholderRenderer`` in tests and on machines without Keynote, and stored in
+a content-addressed disk cache. Each cache key hashes the document path, its
+mtime, the slide number and the size variant, so editing a deck naturally
+produces new keys while the old images age out of the size-bounded LRU.
+
+``ThumbnailService`` ties the two together: ``get()`` serves from the cache or
+renders on a miss (one render per key even under concurrent requests), and
+``prefetch()`` renders the next few slides on a background task so they are
+ready by the time the presenter gets there.
+
+The server runs on eventlet without monkey-patching, so nothing here may block
+the hub: queues and locks come from ``queue_factory`` (the server passes its
+async mode's queue) and ``sips`` runs through ``offload``.
+"""
+import functools
+import glob
+import hashlib
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import zlib
+
+# Longest edge in pixels for each size variant.
+VARIANTS = {'small': 160, 'medium': 480, 'large': 1280}
+DEFAULT_VARIANT = 'medium'
+
+THUMBNAIL_DIR = os.path.join('static', 'thumbnails')
+
+
+def document_version(document_path):
+    """A token that changes whenever the document is saved."""
+    return f"{os.stat(document_path).st_mtime_ns:x}"
+
+
+def thumbnail_key(document_path, version, slide_number, variant):
+    digest = hashlib.sha256(f"{document_path}\0{version}\0{slide_number}\0{variant}".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def placeholder_png(width, height, shade=0x44):
+    """A valid grey PNG of the given size, without any imaging library."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes([shade]) * (width * 3)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+
+def run_inline(fn, *args):
+    """The default offload: just call fn."""
+    return fn(*args)
+
+
+class QueueLock:
+    """A lock made of a one-token queue, so waiting for it is cooperative with the server's queue_factory."""
+
+    def __init__(self, queue_factory=queue.Queue):
+        self._token = queue_factory()
+        self._token.put(None)
+
+    def __enter__(self):
+        self._token.get()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._token.put(None)
+
+
+class PlaceholderRenderer:
+    """Stand-in renderer that draws a grey 16:9 image per slide."""
+
+    def __init__(self):
+        self.renders = 0
+
+    def needs_keynote(self, document_path):
+        return False
+
+    def render(self, document_path, slide_number, max_size):
+        self.renders += 1
+        return placeholder_png(max_size, max(1, max_size * 9 // 16), shade=(slide_number * 37) % 256)
+
+
+class KeynoteRenderer:
+    """Exports slides through Keynote and resizes them with ``sips``.
+
+    Keynote can only export a whole deck, so the first render of a document
+    version exports every slide once into a work directory and later renders
+    only resize.
+    """
+
+    def __init__(self, export_slides, work_dir=None, keep_exports=2, queue_factory=queue.Queue, offload=run_inline):
+        # export_slides(document_path, out_dir) exports every slide of the document as PNG files; it is
+        # expected to yield while Keynote works, as the server's script library does.
+        self.export_slides = export_slides
+        self.work_dir = work_dir or os.path.join(tempfile.gettempdir(), 'keymote-slide-exports')
+        self.keep_exports = keep_exports
+        self.offload = offload
+        self.renders = 0
+        self._exports = {}
+        # Held across the export, so it has to be cooperative.
+        self._lock = QueueLock(queue_factory)
+
+    def _export(self, document_path):
+        version = (document_path, document_version(document_path))
+        with self._lock:
+            images = self._exports.get(version)
+            if images is not None:
+                return images
+
+            out_dir = os.path.join(self.work_dir, hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:16])
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.makedirs(out_dir)
+            self.export_slides(document_path, out_dir)
+            # Keynote numbers the exported files (Deck.001.png, Deck.002.png, ...).
+            images = sorted(glob.glob(os.path.join(out_dir, '**', '*.png'), recursive=True))
+
+            self._exports[version] = images
+            while len(self._exports) > self.keep_exports:
+                old_version = next(iter(self._exports))
+                old_images = self._exports.pop(old_version)
+                if old_images:
+                    shutil.rmtree(os.path.dirname(old_images[0]), ignore_errors=True)
+            return images
+
+    def needs_keynote(self, document_path):
+        """Whether rendering from this version of the document has to export it first."""
+        return (document_path, document_version(document_path)) not in self._exports
+
+    def render(self, document_path, slide_number, max_size):
+        images = self._export(document_path)
+        if not 1 <= slide_number <= len(images):
+            raise IndexError(slide_number)
+        with tempfile.NamedTemporaryFile(suffix='.png') as out:
+            self.offload(functools.partial(subprocess.run, ['sips', '-Z', str(max_size), images[slide_number - 1], '--out', out.name],
+                                           check=True, capture_output=True, text=True))
+            self.renders += 1
+            with open(out.name, 'rb') as f:
+                return f.read()
+
+
+class ThumbnailCache:
+    """Content-addressed PNG files under directory, evicting least recently used beyond max_bytes."""
+
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._sizes = None
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def _load_sizes(self):
+        # Oldest access first, so eviction can pop from the front.
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*', '*.png')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, os.path.basename(path)[:-4], stat.st_size))
+        entries.sort()
+        self._sizes = {key: size for _, key, size in entries}
+
+    def get(self, key):
+        """Return the file path for key, or None on a miss."""
+        with self._lock:
+            if self._sizes is None:
+                self._load_sizes()
+            if key not in self._sizes:
+                return None
+            path = self.path(key)
+            # Mark as recently used, both in memory and on disk for the next process.
+            self._sizes[key] = self._sizes.pop(key)
+            try:
+                os.utime(path)
+            except OSError:
+                del self._sizes[key]
+                return None
+            return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._sizes is None:
+                self._load_sizes()
+            self._sizes.pop(key, None)
+            self._sizes[key] = len(data)
+            self._evict_locked(keep=key)
+        return path
+
+    def _evict_locked(self, keep):
+        total = sum(self._sizes.values())
+        for key in list(self._sizes):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._sizes.pop(key)
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            if self._sizes is None:
+                self._load_sizes()
+            return {"entries": len(self._sizes), "bytes": sum(self._sizes.values()), "evictions": self.evictions}
+
+
+class ThumbnailService:
+    def __init__(self, renderer, cache, prefetch_variants=(DEFAULT_VARIANT,), spawn=None, queue_factory=queue.Queue):
+        self.renderer = renderer
+        self.cache = cache
+        self.prefetch_variants = prefetch_variants
+        self.spawn = spawn
+        self.queue_factory = queue_factory
+        self.hits = 0
+        self.misses = 0
+        self._rendering = {}
+        # Only held for dict updates; the per-key render locks are held across renders and are cooperative.
+        self._lock = threading.Lock()
+        self._prefetch_queue = queue_factory()
+        self._prefetch_started = False
+
+    def get(self, document_path, slide_number, variant=DEFAULT_VARIANT):
+        """Return (file_path, etag) for one slide thumbnail, rendering it on a cache miss.
+
+        Raises KeyError for an unknown variant, FileNotFoundError for a missing document
+        and IndexError for a slide the document does not have.
+        """
+        max_size = VARIANTS[variant]
+        key = thumbnail_key(document_path, document_version(document_path), slide_number, variant)
+        path = self.cache.get(key)
+        if path is not None:
+            self.hits += 1
+            return path, key
+
+        # Single-flight: concurrent requests for the same thumbnail wait for one render.
+        with self._lock:
+            render_lock = self._rendering.get(key)
+            if render_lock is None:
+                render_lock = self._rendering[key] = QueueLock(self.queue_factory)
+        with render_lock:
+            path = self.cache.get(key)
+            if path is None:
+                self.misses += 1
+                path = self.cache.put(key, self.renderer.render(document_path, slide_number, max_size))
+        with self._lock:
+            self._rendering.pop(key, None)
+        return path, key
+
+    def prefetch(self, document_path, slide_number, count, slide_count=None):
+        """Render the count slides after slide_number in the background."""
+        last = slide_number + count
+        if slide_count:
+            last = min(last, slide_count)
+        for number in range(slide_number + 1, last + 1):
+            for variant in self.prefetch_variants:
+                self._prefetch_queue.put((document_path, number, variant))
+        self._ensure_prefetcher()
+
+    def _ensure_prefetcher(self):
+        if self.spawn is None or self._prefetch_started:
+            return
+        self._prefetch_started = True
+        self.spawn(self.run_prefetch)
+
+    def run_prefetch(self):
+        """Prefetch worker: render queued thumbnails one at a time, forever."""
+        while True:
+            self.drain_prefetch(block=True)
+
+    def drain_prefetch(self, block=False):
+        """Render everything queued for prefetch. Safe to call directly, e.g. from tests."""
+        while True:
+            try:
+                job = self._prefetch_queue.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            try:
+                self.get(*job)
+            except Exception as e:
+                print(f"Error prefetching thumbnail for slide {job[1]}: {e}")
+
+    def stats(self):
+        return dict(self.cache.stats(), hits=self.hits, misses=self.misses, prefetch_queued=self._prefetch_queue.qsize())
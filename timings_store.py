@@ -0,0 +1,489 @@
+"""Persistence for slide timings.
+
+Timings are sharded: each presentation lives in its own file under
+``static/presentations/``, next to a small ``index.json`` holding the current
+presentation and, per presentation, its name, slide count, last-opened time and
+shard file. Startup and opening a deck only read the index and the shards they
+need, so their cost stays flat as the library grows. A legacy
+``static/slide_timings.json`` is migrated into shards the first time the store
+loads without an index.
+
+The store keeps what it has loaded in memory and owns the files as the single
+writer: every endpoint goes through it instead of opening the files itself.
+Writes are cheap and crash-safe:
+
+* Per-slide updates are appended to a small journal, so their cost scales with
+  the change rather than with the deck. The journal is replayed on load; a torn
+  final line is ignored.
+* Other changes are written behind: rapid updates are batched into one
+  debounced flush, at most ``max_data_loss`` seconds after the first unsaved
+  change. A flush rewrites only the shards that changed, each through a
+  temporary file, fsync and atomic rename, so a crash mid-write never leaves
+  truncated JSON behind. The journal is folded into the shards on every flush.
+
+Call ``close()`` on shutdown to flush anything still pending.
+"""
+import copy
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from metrics import REGISTRY, SIZE_BUCKETS
+
+TIMINGS_DIR = os.path.join('static', 'presentations')
+LEGACY_TIMINGS_PATH = os.path.join('static', 'slide_timings.json')
+EMPTY_TIMINGS = {"presentations": {}, "current_presentation_id": None}
+# Fields that can be changed one slide at a time.
+SLIDE_FIELDS = ('estimated_time_seconds', 'actual_time_seconds')
+
+# file is 'index', 'shard', 'journal' or 'legacy' for the store's own files; other writers name theirs, e.g. 'export'.
+TIMINGS_IO_SECONDS = REGISTRY.histogram('keymote_timings_io_seconds', 'Time spent reading and writing timings files.',
+                                        labels=('operation', 'file'), log_slow=True)
+TIMINGS_IO_BYTES = REGISTRY.histogram('keymote_timings_io_bytes', 'Size of timings file reads and writes.',
+                                      labels=('operation', 'file'), buckets=SIZE_BUCKETS)
+
+
+def validate_slide_changes(changes):
+    """Raise ValueError unless changes only sets known slide fields to sensible values."""
+    if not changes:
+        raise ValueError("No changes provided.")
+    for field, value in changes.items():
+        if field not in SLIDE_FIELDS:
+            raise ValueError(f"Unknown slide field '{field}'.")
+        if value is None and field == 'actual_time_seconds':
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"'{field}' must be a non-negative number.")
+
+
+def validate_presentation(presentation):
+    """Raise ValueError unless presentation has a list of slides with valid timings."""
+    if not isinstance(presentation, dict) or not isinstance(presentation.get("slides"), list):
+        raise ValueError("Expected a presentation with a list of slides.")
+    for position, slide in enumerate(presentation["slides"]):
+        if not isinstance(slide, dict) or "slide" not in slide:
+            raise ValueError(f"Slide {position} has no 'slide' field.")
+        timings = {field: slide[field] for field in SLIDE_FIELDS if field in slide}
+        if timings:
+            try:
+                validate_slide_changes(timings)
+            except ValueError as e:
+                raise ValueError(f"Slide {position}: {e}")
+
+
+def read_json(path, kind):
+    """Load a JSON file, recording how long it took and how big it was."""
+    with TIMINGS_IO_SECONDS.time(operation='read', file=kind):
+        with open(path, 'rb') as f:
+            body = f.read()
+        data = json.loads(body)
+    TIMINGS_IO_BYTES.observe(len(body), operation='read', file=kind)
+    return data
+
+
+def write_json_atomic(path, data, indent=None, kind='document'):
+    """Write JSON to path via a temporary file, fsync and rename; compact unless an indent is given."""
+    with TIMINGS_IO_SECONDS.time(operation='write', file=kind):
+        separators = (',', ':') if indent is None else None
+        body = json.dumps(data, indent=indent, separators=separators).encode('utf-8')
+        _replace_durably(path, body)
+    TIMINGS_IO_BYTES.observe(len(body), operation='write', file=kind)
+
+
+def _replace_durably(path, body):
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Make the rename itself durable.
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def shard_filename(presentation_id):
+    """A readable, collision-free file name for a presentation's shard."""
+    stem = os.path.splitext(os.path.basename(presentation_id))[0]
+    stem = re.sub(r'[^A-Za-z0-9._-]+', '_', stem)[:40] or 'presentation'
+    digest = hashlib.sha1(presentation_id.encode('utf-8')).hexdigest()[:10]
+    return f"{stem}-{digest}.json"
+
+
+def count_slides(presentation):
+    """Number of real slides in a presentation, not counting breaks."""
+    return sum(1 for slide in presentation.get("slides", []) if slide.get("slide") != 'BREAK')
+
+
+class TimingsStore:
+    def __init__(self, directory=TIMINGS_DIR, legacy_path=LEGACY_TIMINGS_PATH, compact_after=500,
+                 flush_delay=0.5, max_data_loss=2.0):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.journal_path = os.path.join(directory, 'journal.jsonl')
+        self.legacy_path = legacy_path
+        self.compact_after = compact_after
+        self.flush_delay = flush_delay
+        self.max_data_loss = max_data_loss
+        self.journal_entries = 0
+        self.flushes = 0
+        # Changes with every process start, so ETags from a previous run never match.
+        self.generation = uuid.uuid4().hex[:8]
+        self._index = None
+        self._decks = {}
+        self._revisions = {}
+        self._index_revision = 0
+        self._dirty_decks = set()
+        self._journalled = set()
+        self._index_dirty = False
+        self._dirty_since = None
+        self._last_change = None
+        self._closed = False
+        self._flusher = None
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+
+    # --- Loading ---
+
+    def _ensure_loaded(self):
+        if self._index is not None:
+            return
+        try:
+            self._index = read_json(self.index_path, 'index')
+        except FileNotFoundError:
+            self._index = {"current_presentation_id": None, "presentations": {}}
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                self._migrate_legacy()
+        self._replay_journal()
+
+    def _migrate_legacy(self):
+        legacy = read_json(self.legacy_path, 'legacy')
+        for presentation_id, presentation in legacy.get("presentations", {}).items():
+            self._store_deck(presentation_id, presentation)
+        # Fold in per-slide updates the legacy store had not yet compacted.
+        try:
+            with open(self.legacy_path + '.journal') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._apply(entry["presentation"], entry["index"], entry["changes"])
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        self._index["current_presentation_id"] = legacy.get("current_presentation_id")
+        self._index_dirty = True
+        self._flush_locked(force=True)
+        print(f"Migrated {len(self._decks)} presentations from {self.legacy_path} to {self.directory}.")
+
+    def _replay_journal(self):
+        self.journal_entries = 0
+        try:
+            with TIMINGS_IO_SECONDS.time(operation='read', file='journal'):
+                with open(self.journal_path, 'rb') as f:
+                    body = f.read()
+        except FileNotFoundError:
+            return
+        TIMINGS_IO_BYTES.observe(len(body), operation='read', file='journal')
+        for line in body.decode('utf-8', errors='replace').splitlines():
+            try:
+                entry = json.loads(line)
+                self._apply(entry["presentation"], entry["index"], entry["changes"])
+            except (ValueError, KeyError, IndexError, TypeError):
+                # A torn final line from a crash mid-append; everything before it is intact.
+                continue
+            self.journal_entries += 1
+            self._journalled.add(entry["presentation"])
+
+    def _deck(self, presentation_id):
+        """The live deck for presentation_id, loading its shard on first use. Raises KeyError."""
+        deck = self._decks.get(presentation_id)
+        if deck is None:
+            entry = self._index["presentations"][presentation_id]
+            deck = read_json(os.path.join(self.directory, entry["file"]), 'shard')
+            self._decks[presentation_id] = deck
+        return deck
+
+    def _apply(self, presentation_id, index, changes):
+        slides = self._deck(presentation_id)["slides"]
+        if index < 0:
+            raise IndexError(index)
+        slide = slides[index]
+        slide.update(changes)
+        self._revisions[presentation_id] = self._revisions.get(presentation_id, 0) + 1
+        return slide
+
+    def _store_deck(self, presentation_id, presentation):
+        entry = self._index["presentations"].setdefault(presentation_id, {
+            "file": shard_filename(presentation_id),
+            "last_opened": None,
+        })
+        entry["name"] = presentation.get("name", os.path.basename(presentation_id))
+        entry["slide_count"] = count_slides(presentation)
+        self._decks[presentation_id] = presentation
+        self._revisions[presentation_id] = self._revisions.get(presentation_id, 0) + 1
+        self._dirty_decks.add(presentation_id)
+        self._index_dirty = True
+
+    def warm(self):
+        """Load the index, the journal and every shard into memory, checking each deck on the way.
+
+        Returns counts for the boot report. Shards that cannot be read or fail validation are reported,
+        not dropped: the files are left as they are.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            presentations, slides, problems = 0, 0, []
+            for presentation_id in self._index["presentations"]:
+                try:
+                    deck = self._deck(presentation_id)
+                    validate_presentation(deck)
+                except (OSError, ValueError) as e:
+                    problems.append(f"{presentation_id}: {e}")
+                    continue
+                presentations += 1
+                slides += count_slides(deck)
+            return {"presentations": presentations, "slides": slides,
+                    "journal_entries": self.journal_entries, "problems": problems}
+
+    # --- Reading ---
+
+    @property
+    def current_presentation_id(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._index.get("current_presentation_id")
+
+    def __contains__(self, presentation_id):
+        with self._lock:
+            self._ensure_loaded()
+            return presentation_id in self._index["presentations"]
+
+    def index(self):
+        """Return the lightweight index: the current presentation and one summary per presentation."""
+        with self._lock:
+            self._ensure_loaded()
+            presentations = [dict(entry, id=presentation_id) for presentation_id, entry in self._index["presentations"].items()]
+            current = self._index.get("current_presentation_id")
+        for entry in presentations:
+            entry.pop("file", None)
+        presentations.sort(key=lambda entry: entry.get("last_opened") or '', reverse=True)
+        return {"current_presentation_id": current, "presentations": presentations}
+
+    def index_etag(self):
+        with self._lock:
+            return f"{self.generation}-i{self._index_revision}"
+
+    def get_presentation(self, presentation_id):
+        """Return a copy of one presentation, or None if it is unknown."""
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                return copy.deepcopy(self._deck(presentation_id))
+            except KeyError:
+                return None
+
+    def presentation_etag(self, presentation_id):
+        with self._lock:
+            return f"{self.generation}-p{self._revisions.get(presentation_id, 0)}"
+
+    def load(self):
+        """Return the full legacy-shaped document with every presentation. Reads every shard."""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "presentations": {pid: copy.deepcopy(self._deck(pid)) for pid in self._index["presentations"]},
+                "current_presentation_id": self._index.get("current_presentation_id"),
+            }
+
+    # --- Updates ---
+
+    def save(self, data):
+        """Store every presentation in a legacy-shaped document and its current presentation.
+
+        Presentations missing from data are kept, so clients can send just the deck they changed.
+        Raises ValueError, without changing anything, if any presentation is malformed.
+        """
+        presentations = data.get("presentations", {})
+        if not isinstance(presentations, dict):
+            raise ValueError("'presentations' must map presentation IDs to presentations.")
+        for presentation_id, presentation in presentations.items():
+            try:
+                validate_presentation(presentation)
+            except ValueError as e:
+                raise ValueError(f"Presentation '{presentation_id}': {e}")
+        with self._lock:
+            self._ensure_loaded()
+            for presentation_id, presentation in presentations.items():
+                self._store_deck(presentation_id, copy.deepcopy(presentation))
+            if "current_presentation_id" in data:
+                self._set_current(data["current_presentation_id"])
+            self._mark_dirty()
+
+    def put_presentation(self, presentation_id, presentation):
+        """Replace one presentation, e.g. after breaks were added or removed. Raises ValueError if it is malformed."""
+        validate_presentation(presentation)
+        with self._lock:
+            self._ensure_loaded()
+            self._store_deck(presentation_id, copy.deepcopy(presentation))
+            self._mark_dirty()
+
+    def open_presentation(self, presentation_id, name, slide_count, estimated_time_seconds=60):
+        """Make presentation_id current, creating default timings if it is new. Returns a copy of it."""
+        with self._lock:
+            self._ensure_loaded()
+            if presentation_id not in self._index["presentations"]:
+                self._store_deck(presentation_id, {
+                    "name": name,
+                    "slides": [{"slide": i, "estimated_time_seconds": estimated_time_seconds, "actual_time_seconds": None}
+                               for i in range(1, slide_count + 1)]
+                })
+            self._index["presentations"][presentation_id]["last_opened"] = datetime.datetime.now().isoformat(timespec='seconds')
+            self._set_current(presentation_id)
+            self._mark_dirty()
+            return copy.deepcopy(self._deck(presentation_id))
+
+    def close_current(self):
+        """Clear the current presentation and return (presentation_id, copy of it), or (None, None)."""
+        with self._lock:
+            self._ensure_loaded()
+            presentation_id = self._index.get("current_presentation_id")
+            presentation = None
+            if presentation_id in self._index["presentations"]:
+                presentation = copy.deepcopy(self._deck(presentation_id))
+            self._set_current(None)
+            self._mark_dirty()
+            return presentation_id, presentation
+
+    def _set_current(self, presentation_id):
+        self._index["current_presentation_id"] = presentation_id
+        self._index_dirty = True
+
+    def patch_slide(self, presentation_id, index, changes):
+        """Update one slide's timing fields and return the updated slide.
+
+        Raises KeyError for an unknown presentation, IndexError for an unknown slide
+        and ValueError for invalid changes.
+        """
+        validate_slide_changes(changes)
+        with self._lock:
+            self._ensure_loaded()
+            if presentation_id not in self._index["presentations"]:
+                raise KeyError(presentation_id)
+            slide = self._apply(presentation_id, index, changes)
+
+            if presentation_id in self._dirty_decks:
+                # The shard on disk is already behind and the pending flush will include this change.
+                self._mark_dirty()
+            else:
+                entry = {"presentation": presentation_id, "index": index, "changes": changes}
+                line = json.dumps(entry, separators=(',', ':')) + "\n"
+                with TIMINGS_IO_SECONDS.time(operation='write', file='journal'):
+                    with open(self.journal_path, 'a') as f:
+                        f.write(line)
+                TIMINGS_IO_BYTES.observe(len(line), operation='write', file='journal')
+                self.journal_entries += 1
+                self._journalled.add(presentation_id)
+                if self.journal_entries >= self.compact_after:
+                    self._mark_dirty()
+            return dict(slide)
+
+    def compact(self):
+        """Fold the journal back into the shards now."""
+        with self._lock:
+            self._ensure_loaded()
+            self._flush_locked(force=True)
+
+    # --- Write-behind ---
+
+    def _mark_dirty(self):
+        if self._index_dirty:
+            self._index_revision += 1
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._last_change = now
+        self._ensure_flusher()
+        self._changed.notify_all()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._closed = False
+            self._flusher = threading.Thread(target=self._flush_loop, name='timings-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_deadline(self):
+        # Debounce rapid changes, but never hold unsaved data longer than max_data_loss.
+        return min(self._last_change + self.flush_delay, self._dirty_since + self.max_data_loss)
+
+    def _flush_loop(self):
+        with self._lock:
+            while True:
+                while self._dirty_since is None and not self._closed:
+                    self._changed.wait()
+                if self._dirty_since is None:
+                    return
+                remaining = self._flush_deadline() - time.monotonic()
+                if remaining > 0 and not self._closed:
+                    self._changed.wait(remaining)
+                    continue
+                try:
+                    self._flush_locked()
+                except OSError as e:
+                    # Keep the changes in memory and try again later.
+                    print(f"Error flushing slide timings: {e}")
+                    self._changed.wait(self.max_data_loss)
+
+    def _flush_locked(self, force=False):
+        if self._dirty_since is None and not force:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Shards first, then the index that points at them, then the journal they now contain.
+        for presentation_id in self._dirty_decks | self._journalled:
+            if presentation_id in self._decks:
+                write_json_atomic(os.path.join(self.directory, self._index["presentations"][presentation_id]["file"]),
+                                  self._decks[presentation_id], kind='shard')
+        if self._index_dirty or force:
+            write_json_atomic(self.index_path, self._index, kind='index')
+        with open(self.journal_path, 'w'):
+            pass
+        self.journal_entries = 0
+        self._dirty_decks.clear()
+        self._journalled.clear()
+        self._index_dirty = False
+        self._dirty_since = None
+        self._last_change = None
+        self.flushes += 1
+
+    def flush(self):
+        """Write any pending changes to disk now."""
+        with self._lock:
+            self._flush_locked()
+
+    @property
+    def dirty(self):
+        return self._dirty_since is not None
+
+    def close(self):
+        """Flush pending changes and stop the background flusher, e.g. on shutdown."""
+        with self._lock:
+            self._flush_locked()
+            self._closed = True
+            self._changed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
@@ -0,0 +1,64 @@
+"""Negotiated wire formats: MessagePack when both sides support it, JSON otherwise.
+
+Clients that prefer MessagePack send ``Accept: application/msgpack`` (and may
+send request bodies as ``Content-Type: application/msgpack``). Everyone else,
+and every client when the ``msgpack`` package is not installed, keeps getting
+JSON. The choice is per request, so responses that can be either vary on
+``Accept``.
+
+Socket.IO packets cannot be negotiated per connection: the whole server uses
+one serializer, and clients must use the matching parser. ``socketio_options``
+turns ``KEYMOTE_SOCKETIO_SERIALIZER=msgpack`` into the server's options.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK = 'application/msgpack'
+# Older clients and proxies use the unregistered name.
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+JSON = 'application/json'
+
+
+def available():
+    return msgpack is not None
+
+
+def prefers_msgpack(accept):
+    """Whether a werkzeug Accept header asks for MessagePack at least as much as JSON, and we can send it."""
+    if msgpack is None:
+        return False
+    # Explicit entries only: '*/*' alone means whatever the server likes, which is JSON.
+    wanted = max((quality for value, quality in accept if value in MSGPACK_TYPES), default=0)
+    return wanted > 0 and wanted >= accept[JSON]
+
+
+def is_msgpack(mimetype):
+    return mimetype in MSGPACK_TYPES
+
+
+def packb(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def unpackb(body):
+    # Slide numbers are map keys in some legacy documents.
+    return msgpack.unpackb(body, raw=False, strict_map_key=False)
+
+
+def dumps_json(payload):
+    """Compact JSON, without the spaces json.dumps adds after separators."""
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def socketio_options(serializer):
+    """SocketIO() keyword arguments for a serializer name ('json' or 'msgpack')."""
+    if serializer == 'msgpack':
+        if msgpack is None:
+            print("KEYMOTE_SOCKETIO_SERIALIZER=msgpack needs the 'msgpack' package; using JSON.")
+            return {}
+        return {"serializer": 'msgpack'}
+    return {}